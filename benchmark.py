@@ -0,0 +1,239 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+from datetime import datetime
+from os import environ
+from re import findall
+from sys import argv
+from sys import exit
+from time import perf_counter
+
+# Replay recorded API responses unless asked to record them or go live.
+environ.setdefault("DJANGO_SETTINGS_MODULE", "settings")
+environ.setdefault("REPLAY_MODE", "replay")
+
+# Look up all company data from the replayed responses, so that every run
+# sends the same requests and measures the same stages.
+environ.setdefault("COMPANY_CACHE_ENABLED", "False")
+environ.setdefault("OWNERSHIP_GRAPH_ENABLED", "False")
+
+import django  # noqa: E402
+django.setup()
+
+from holidays import UnitedStates  # noqa: E402
+from pytz import timezone  # noqa: E402
+
+from tweets2cash.base.analysis import Analysis  # noqa: E402
+from tweets2cash.base.replay import ReplayError  # noqa: E402
+
+# The report whose events to benchmark.
+BENCHMARK_PATH = "benchmark.md"
+
+# The pattern of the tweet links in the report.
+STATUS_URL_PATTERN = r"\(https://twitter\.com/\w+/status/(\d+)\)"
+
+# The format of the created_at timestamps of tweets.
+TWEET_TIME_FORMAT = "%a %b %d %H:%M:%S %z %Y"
+
+# The timezone of the stock exchanges.
+MARKET_TIMEZONE = timezone("US/Eastern")
+
+# The analysis stages in order.
+STAGES = ["tweet", "text", "entities", "sentiment", "companies"]
+
+# The report header.
+HEADER = """## Benchmark Report
+
+This breakdown of the analysis results validates the current implementation
+against historical data, with the time spent in each analysis stage. The API
+responses are replayed from the recorded fixtures.
+
+Use this command to regenerate the benchmark report after changes to the algorithm or data:
+```shell
+$ ./benchmark.py > benchmark.tmp && mv benchmark.tmp benchmark.md
+```
+
+### Events overview
+
+Here's each tweet with the results of its analysis and the time spent in each stage."""
+
+
+def get_tweet_ids(path):
+    """Reads the IDs of all tweets linked from a benchmark report in order."""
+
+    with open(path, "r", encoding="utf-8") as report_file:
+        report = report_file.read()
+
+    tweet_ids = []
+    for tweet_id in findall(STATUS_URL_PATTERN, report):
+        if tweet_id not in tweet_ids:
+            tweet_ids.append(tweet_id)
+    return tweet_ids
+
+
+def get_market_time(tweet):
+    """Returns the time of a tweet in the timezone of the stock exchanges."""
+
+    created_at = datetime.strptime(tweet["created_at"], TWEET_TIME_FORMAT)
+    return created_at.astimezone(MARKET_TIMEZONE)
+
+
+def format_time(time):
+    """Formats a time like "12/6/2016 8:52 AM (Tuesday)"."""
+
+    hour = time.hour % 12 or 12
+    return "%d/%d/%d %d:%02d %s (%s)" % (
+        time.month, time.day, time.year, hour, time.minute,
+        time.strftime("%p"), time.strftime("%A"))
+
+
+def is_trading_day(time):
+    """Checks whether the stock exchanges are open on the day of a time."""
+
+    return time.weekday() < 5 and time.date() not in UnitedStates()
+
+
+def get_strategy(company, market_time):
+    """Returns the strategy and the reason for it for one company."""
+
+    if not is_trading_day(market_time):
+        return ("hold", "market closed")
+
+    sentiment = company["sentiment"]
+    if sentiment > 0:
+        return ("bull", "positive sentiment")
+    if sentiment < 0:
+        return ("bear", "negative sentiment")
+    return ("hold", "neutral sentiment")
+
+
+def format_sentiment(sentiment):
+    """Formats a sentiment score with an emoji."""
+
+    if sentiment > 0:
+        emoji = ":thumbsup:"
+    elif sentiment < 0:
+        emoji = ":thumbsdown:"
+    else:
+        emoji = ":neutral_face:"
+    return "%g %s" % (sentiment, emoji)
+
+
+def analyze(analysis, tweet_id):
+    """Runs each analysis stage for one tweet. Returns the tweet, its text,
+    the companies and the time in seconds spent in each stage.
+    """
+
+    timings = {}
+
+    start = perf_counter()
+    tweet = analysis.twitter.get_tweet(tweet_id)
+    timings["tweet"] = perf_counter() - start
+
+    start = perf_counter()
+    text = analysis.get_expanded_text(tweet)
+    timings["text"] = perf_counter() - start
+
+    start = perf_counter()
+    entities, sentiment = analysis.analyze_entities(text)
+    mid_entities = analysis.get_mid_entities(entities)
+    timings["entities"] = perf_counter() - start
+
+    start = perf_counter()
+    if mid_entities and sentiment is None:
+        sentiment = analysis.get_sentiment(text)
+    timings["sentiment"] = perf_counter() - start
+
+    start = perf_counter()
+    mids = [mid for _, mid in mid_entities]
+    companies_data = analysis.get_companies_data(mids) if mids else {}
+    companies = analysis.collect_companies(mid_entities, companies_data,
+                                           sentiment)
+    timings["companies"] = perf_counter() - start
+
+    return (tweet, text, companies, timings)
+
+
+def print_event(tweet, link, text, companies, timings):
+    """Prints the analysis results and stage timings for one tweet."""
+
+    market_time = get_market_time(tweet)
+
+    print()
+    print("##### [%s](%s)" % (format_time(market_time), link))
+    print()
+    print("> %s" % text)
+    print()
+    print("*Strategy*")
+    print()
+    print("Company | Root | Sentiment | Strategy | Reason")
+    print("--------|------|-----------|----------|-------")
+    for company in companies:
+        strategy, reason = get_strategy(company, market_time)
+        print("%s | %s | %s | %s | %s" % (
+            company["name"], company.get("root", "-"),
+            format_sentiment(company["sentiment"]), strategy, reason))
+    print()
+    print("*Timings*")
+    print()
+    print("Stage | Time")
+    print("------|-----")
+    for stage in STAGES:
+        print("%s | %.3f ms" % (stage, timings[stage] * 1000))
+    print("**total** | **%.3f ms**" % (sum(timings.values()) * 1000))
+
+
+def print_summary(all_timings, replay_stats):
+    """Prints the total, mean and maximum time of each stage."""
+
+    print()
+    print("### Stage timings")
+    print()
+    print("Here's the time spent in each stage across all %d events." %
+          len(all_timings))
+    print()
+    print("Stage | Total | Mean | Max")
+    print("------|-------|------|----")
+    for stage in STAGES + ["total"]:
+        if stage == "total":
+            times = [sum(timings.values()) for timings in all_timings]
+        else:
+            times = [timings[stage] for timings in all_timings]
+        if not times:
+            continue
+        print("%s | %.3f ms | %.3f ms | %.3f ms" % (
+            stage, sum(times) * 1000, sum(times) / len(times) * 1000,
+            max(times) * 1000))
+    print()
+    print("Replay mode: %(mode)s (%(replayed)d replayed, %(recorded)d "
+          "recorded responses)" % replay_stats)
+
+
+def main(path):
+    """Reruns the analysis of every event in the report and prints a new
+    report.
+    """
+
+    tweet_ids = get_tweet_ids(path)
+    if not tweet_ids:
+        exit("No events found in: %s" % path)
+
+    try:
+        analysis = Analysis(logs_to_cloud=False)
+    except ReplayError as error:
+        exit("%s\nRecord them with: REPLAY_MODE=record ./benchmark.py" %
+             error)
+
+    print(HEADER)
+    all_timings = []
+    for tweet_id in tweet_ids:
+        tweet, text, companies, timings = analyze(analysis, tweet_id)
+        link = analysis.twitter.get_tweet_link(tweet)
+        print_event(tweet, link, text, companies, timings)
+        all_timings.append(timings)
+
+    print_summary(all_timings, analysis.replay.get_stats())
+
+
+if __name__ == "__main__":
+    main(argv[1] if len(argv) > 1 else BENCHMARK_PATH)
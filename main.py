@@ -5,13 +5,28 @@ from datetime import datetime
 from time import sleep
 
 from analysis import Analysis
+from clients import ClientRegistry
 from logs import Logs
+from pipeline import Stage
 from trading import Trading
 from twitter import Twitter
 
 # Whether to send all logs to the cloud instead of a local file.
 LOGS_TO_CLOUD = True
 
+# The number of worker threads finding companies in tweets. These wait on
+# network requests most of the time.
+ANALYZE_THREADS = 50
+
+# The number of worker threads trading stocks.
+TRADE_THREADS = 10
+
+# The number of worker threads tweeting about trades.
+TWEET_THREADS = 10
+
+# The time in seconds after which each worker thread replaces its clients.
+CLIENT_MAX_AGE_S = 60 * 60
+
 # The duration of the smallest backoff step in seconds.
 BACKOFF_STEP_S = 0.1
 
@@ -32,27 +47,71 @@ class Main:
         self.logs = Logs(name="main", to_cloud=LOGS_TO_CLOUD)
         self.twitter = Twitter(logs_to_cloud=LOGS_TO_CLOUD)
 
-    def twitter_callback(self, tweet):
-        """Analyzes Trump tweets, trades stocks, and tweets about it."""
+        # Create the clients once per worker thread instead of once per tweet,
+        # so that each thread has its own httplib2 instances.
+        self.clients = ClientRegistry()
+        self.clients.register("twitter", self.make_twitter,
+                              max_age_s=CLIENT_MAX_AGE_S)
+        self.clients.register("analysis", self.make_analysis,
+                              max_age_s=CLIENT_MAX_AGE_S)
+        self.clients.register("trading", self.make_trading,
+                              max_age_s=CLIENT_MAX_AGE_S)
+
+    def make_twitter(self):
+        """Creates the Twitter instance for a worker thread."""
+
+        return Twitter(logs_to_cloud=LOGS_TO_CLOUD)
+
+    def make_analysis(self):
+        """Creates the Analysis instance for a worker thread, sharing the
+        thread's Twitter instance.
+        """
+
+        return Analysis(logs_to_cloud=LOGS_TO_CLOUD,
+                        twitter=self.clients.get("twitter"))
 
-        # Initialize the Analysis, Logs, Trading, and Twitter instances inside
-        # the callback to create separate httplib2 instances per thread.
-        analysis = Analysis(logs_to_cloud=LOGS_TO_CLOUD)
-        logs = Logs(name="main-callback", to_cloud=LOGS_TO_CLOUD)
+    def make_trading(self):
+        """Creates the Trading instance for a worker thread."""
+
+        return Trading(logs_to_cloud=LOGS_TO_CLOUD)
+
+    def get_stages(self):
+        """Returns the pipeline stages for processing tweets. Each stage has
+        its own queue and worker threads, so that slow company lookups don't
+        hold up trades for earlier tweets.
+        """
+
+        return [Stage("analyze", self.analyze_tweet, ANALYZE_THREADS),
+                Stage("trade", self.trade_companies, TRADE_THREADS),
+                Stage("tweet", self.tweet_companies, TWEET_THREADS)]
+
+    def analyze_tweet(self, logs, tweet):
+        """Finds the companies in Trump tweets."""
 
         # Analyze the tweet.
-        companies = analysis.find_companies(tweet)
-        logs.info("Using companies: %s" % companies)
+        with self.clients.use("analysis") as analysis:
+            companies = analysis.find_companies(tweet)
+        logs.info("Using companies: %s", companies)
         if not companies:
-            return
+            return None
+
+        return (tweet, companies)
+
+    def trade_companies(self, logs, item):
+        """Trades stocks for the companies found in a tweet."""
+
+        tweet, companies = item
+        with self.clients.use("trading") as trading:
+            trading.make_trades(companies)
+
+        return (tweet, companies)
 
-        # Trade stocks.
-        trading = Trading(logs_to_cloud=LOGS_TO_CLOUD)
-        trading.make_trades(companies)
+    def tweet_companies(self, logs, item):
+        """Tweets about the companies found in a tweet."""
 
-        # Tweet about it.
-        twitter = Twitter(logs_to_cloud=LOGS_TO_CLOUD)
-        twitter.tweet(companies, tweet)
+        tweet, companies = item
+        with self.clients.use("twitter") as twitter:
+            twitter.tweet(companies, tweet)
 
     def run_session(self):
         """Runs a single streaming session. Logs and cleans up after
@@ -61,11 +120,12 @@ class Main:
 
         self.logs.info("Starting new session.")
         try:
-            self.twitter.start_streaming(self.twitter_callback)
+            self.twitter.start_streaming(stages=self.get_stages())
         except:
             self.logs.catch()
         finally:
             self.twitter.stop_streaming()
+            self.logs.debug("Client stats: %s", self.clients.get_stats())
             self.logs.info("Ending session.")
 
     def backoff(self, tries):
@@ -74,7 +134,7 @@ class Main:
         """
 
         delay = BACKOFF_STEP_S * pow(2, tries)
-        self.logs.warn("Waiting for %.1f seconds." % delay)
+        self.logs.warn("Waiting for %.1f seconds.", delay)
         sleep(delay)
 
     def run(self):
@@ -19,3 +19,10 @@ task_queues = (
 task_default_exchange = 'tasks'
 task_default_exchange_type = 'topic'
 task_default_routing_key = 'task.default'
+
+beat_schedule = {
+    "refresh-ownership-graph": {
+        "task": "tweets2cash.base.tasks.refresh_ownership_graph_task",
+        "schedule": 6 * 60 * 60,  # Every 6 hours.
+    },
+}
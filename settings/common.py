@@ -401,6 +401,10 @@ MAX_AGE_AUTH_TOKEN = config('MAX_AGE_AUTH_TOKEN', default=None, cast=int)
 MAX_AGE_CANCEL_ACCOUNT = config('MAX_AGE_CANCEL_ACCOUNT', default=2592000, cast=int)
 
 REST_FRAMEWORK = {
+    "DEFAULT_RENDERER_CLASSES": (
+        "tweets2cash.base.renderers.JSONRenderer",
+        "rest_framework.renderers.BrowsableAPIRenderer",
+    ),
     "DEFAULT_AUTHENTICATION_CLASSES": (
         # Mainly used by front
         "tweets2cash.auth.backends.Token",
@@ -499,12 +503,156 @@ MAX_TWEET_SIZE = config('MAX_TWEET_SIZE', default=140, cast=int)
 NUM_THREADS = config('NUM_THREADS', default=100, cast=int)
 # The maximum time in seconds that workers wait for a new task on the queue.
 QUEUE_TIMEOUT_S = config('QUEUE_TIMEOUT_S', default=1, cast=int)
+# The number of worker threads decoding streamed tweets.
+PIPELINE_DECODE_THREADS = config('PIPELINE_DECODE_THREADS', default=2, cast=int)
+# The maximum number of tweets waiting on the queue of each pipeline stage.
+PIPELINE_QUEUE_SIZE = config('PIPELINE_QUEUE_SIZE', default=1000, cast=int)
+# The maximum number of streamed tweets waiting to be decoded.
+INGEST_QUEUE_SIZE = config('INGEST_QUEUE_SIZE', default=10000, cast=int)
+# What to do when the ingest queue is full: "block" the stream, "drop_oldest",
+# "drop_unfollowed" to drop tweets by authors which aren't followed first, or
+# "spill" to disk.
+INGEST_OVERLOAD_POLICY = config('INGEST_OVERLOAD_POLICY', default="block")
+# The path to the file for tweets spilled from a full ingest queue.
+INGEST_SPILL_PATH = config('INGEST_SPILL_PATH', default="/tmp/tweets2cash-spill.jsonl")
+# Whether to classify streamed data before decoding it, to skip the kinds below.
+STREAM_PREFILTER_ENABLED = config('STREAM_PREFILTER_ENABLED', default=True, cast=bool)
+# The kinds of streamed data to skip before decoding it: "delete", "limit",
+# "notice", "retweet" (by the followed users), "unfollowed" (tweets and
+# retweets by other authors) and "tweet".
+STREAM_PREFILTER_DROP = config('STREAM_PREFILTER_DROP', default="delete,limit,notice,unfollowed", cast=Csv())
+# The JSON library for decoding streamed data and rendering API responses:
+# "orjson", "ujson", "stdlib" or "auto" for the fastest one installed.
+JSON_BACKEND = config('JSON_BACKEND', default="auto")
 # The number of retries to attempt when an error occurs.
 API_RETRY_COUNT = config('API_RETRY_COUNT', default=60, cast=int)
 # The number of seconds to wait between retries.
 API_RETRY_DELAY_S = config('API_RETRY_DELAY_S', default=1, cast=int)
 GOOGLE_APPLICATION_CREDENTIALS = os.path.join(BASE_DIR, "settings", config('GOOGLE_APPLICATION_CREDENTIALS'))
 os.environ.setdefault("GOOGLE_APPLICATION_CREDENTIALS", GOOGLE_APPLICATION_CREDENTIALS)
+# The maximum number of hosts to keep HTTP connection pools for.
+HTTP_POOL_CONNECTIONS = config('HTTP_POOL_CONNECTIONS', default=10, cast=int)
+# The maximum number of keep-alive HTTP connections per host.
+HTTP_POOL_MAXSIZE = config('HTTP_POOL_MAXSIZE', default=20, cast=int)
+# The time in seconds to wait for an HTTP connection to be established.
+HTTP_CONNECT_TIMEOUT_S = config('HTTP_CONNECT_TIMEOUT_S', default=5, cast=float)
+# The time in seconds to wait for an HTTP server to send data.
+HTTP_READ_TIMEOUT_S = config('HTTP_READ_TIMEOUT_S', default=60, cast=float)
+# Whether to cache company data looked up via Wikidata.
+COMPANY_CACHE_ENABLED = config('COMPANY_CACHE_ENABLED', default=True, cast=bool)
+# The path to the company cache database shared by all threads and processes.
+COMPANY_CACHE_PATH = config('COMPANY_CACHE_PATH', default="/tmp/tweets2cash-companies.sqlite3")
+# The time in seconds after which cached company data expires.
+COMPANY_CACHE_TTL_S = config('COMPANY_CACHE_TTL_S', default=7 * 24 * 60 * 60, cast=int)
+# The time in seconds after which a cached "no company" result expires.
+COMPANY_CACHE_NEGATIVE_TTL_S = config('COMPANY_CACHE_NEGATIVE_TTL_S', default=24 * 60 * 60, cast=int)
+# The maximum number of entries in the company cache.
+COMPANY_CACHE_MAX_ENTRIES = config('COMPANY_CACHE_MAX_ENTRIES', default=100000, cast=int)
+# The number of company cache writes after which to evict expired and excess
+# entries.
+COMPANY_CACHE_EVICT_INTERVAL = config('COMPANY_CACHE_EVICT_INTERVAL', default=100, cast=int)
+# The engine for company lookups: "wikidata" for live SPARQL queries only or
+# "offline_index" for the local index with live fallback on misses.
+COMPANY_DATA_ENGINE = config('COMPANY_DATA_ENGINE', default="wikidata")
+# The path to the local company index built by the build_company_index command.
+COMPANY_INDEX_PATH = config('COMPANY_INDEX_PATH', default="/tmp/tweets2cash-companies.idx")
+# Whether to resolve root companies via the precomputed ownership graph.
+OWNERSHIP_GRAPH_ENABLED = config('OWNERSHIP_GRAPH_ENABLED', default=True, cast=bool)
+# The path to the ownership graph written by the refresh_ownership_graph job.
+OWNERSHIP_GRAPH_PATH = config('OWNERSHIP_GRAPH_PATH', default="/tmp/tweets2cash-ownership.json")
+# The minimum time in seconds between checks for a refreshed ownership graph.
+OWNERSHIP_GRAPH_RELOAD_S = config('OWNERSHIP_GRAPH_RELOAD_S', default=60, cast=int)
+# The maximum number of ownership levels below a listed company to fetch.
+OWNERSHIP_GRAPH_MAX_DEPTH = config('OWNERSHIP_GRAPH_MAX_DEPTH', default=6, cast=int)
+# The maximum number of companies per ownership edges query.
+OWNERSHIP_GRAPH_BATCH_SIZE = config('OWNERSHIP_GRAPH_BATCH_SIZE', default=200, cast=int)
+# The maximum number of sentiment scores kept in memory, keyed by text hash.
+SENTIMENT_CACHE_MAX_ENTRIES = config('SENTIMENT_CACHE_MAX_ENTRIES', default=10000, cast=int)
+# Whether to get entities and sentiment from one combined NL request.
+ANALYSIS_COMBINED_ANNOTATE = config('ANALYSIS_COMBINED_ANNOTATE', default=True, cast=bool)
+# The number of threads per process for blocking analysis requests.
+ANALYSIS_THREADS = config('ANALYSIS_THREADS', default=20, cast=int)
+# The maximum number of concurrent blocking analysis requests per tweet.
+ANALYSIS_MAX_CONCURRENCY = config('ANALYSIS_MAX_CONCURRENCY', default=4, cast=int)
+# The maximum number of Freebase IDs per Wikidata request.
+WIKIDATA_BATCH_SIZE = config('WIKIDATA_BATCH_SIZE', default=10, cast=int)
+# The mode for external API responses: "off" for live requests, "record" to
+# save live responses to the fixtures or "replay" to only use saved responses.
+REPLAY_MODE = config('REPLAY_MODE', default="off")
+# The path to the versioned fixture file with the recorded API responses.
+REPLAY_FIXTURES_PATH = config('REPLAY_FIXTURES_PATH', default=os.path.join(BASE_DIR, "tests", "replay", "fixtures.json"))
+# The minimum level of logs: DEBUG, INFO, WARNING, ERROR or CRITICAL.
+LOG_LEVEL = config('LOG_LEVEL', default="DEBUG")
+# The minimum levels of logs by name prefix, like
+# "pipeline-analyze=INFO,analysis=WARNING". The longest matching prefix wins.
+LOG_LEVELS = config('LOG_LEVELS', default="", cast=Csv())
+# The maximum number of cloud log entries waiting to be uploaded before new
+# ones go to the local fallback log.
+CLOUD_LOG_BUFFER_SIZE = config('CLOUD_LOG_BUFFER_SIZE', default=10000, cast=int)
+# The number of cloud log entries which triggers an upload.
+CLOUD_LOG_BATCH_SIZE = config('CLOUD_LOG_BATCH_SIZE', default=100, cast=int)
+# The maximum time in seconds a cloud log entry waits to be uploaded.
+CLOUD_LOG_FLUSH_S = config('CLOUD_LOG_FLUSH_S', default=5, cast=float)
+# The length in seconds of a Twitter API rate limit window.
+RATE_LIMIT_WINDOW_S = config('RATE_LIMIT_WINDOW_S', default=15 * 60, cast=int)
+# The number of threads paging timelines and looking up tweets for backfills.
+BACKFILL_THREADS = config('BACKFILL_THREADS', default=4, cast=int)
+# The number of user timeline requests backfills may make per rate limit
+# window.
+BACKFILL_TIMELINE_BUDGET = config('BACKFILL_TIMELINE_BUDGET', default=900, cast=int)
+# The number of status lookup requests backfills may make per rate limit
+# window.
+BACKFILL_LOOKUP_BUDGET = config('BACKFILL_LOOKUP_BUDGET', default=900, cast=int)
+# Whether to checkpoint the newest tweet of each followed user and catch up on
+# missed tweets when streaming starts.
+CHECKPOINT_ENABLED = config('CHECKPOINT_ENABLED', default=True, cast=bool)
+# The path to the log of the newest processed tweet of each followed user.
+CHECKPOINT_PATH = config('CHECKPOINT_PATH', default="/tmp/tweets2cash-checkpoints.log")
+# The number of checkpoint updates after which to sync the log to disk.
+CHECKPOINT_SYNC_COUNT = config('CHECKPOINT_SYNC_COUNT', default=100, cast=int)
+# The maximum time in seconds between syncs of the checkpoint log to disk.
+CHECKPOINT_SYNC_S = config('CHECKPOINT_SYNC_S', default=1, cast=float)
+# The maximum number of live messages held back while catching up, beyond
+# which the oldest are dropped and fetched again by the next catch-up.
+CHECKPOINT_HOLD_SIZE = config('CHECKPOINT_HOLD_SIZE', default=10000, cast=int)
+# Whether to skip tweets which were already seen, like after reconnects.
+DEDUPE_ENABLED = config('DEDUPE_ENABLED', default=True, cast=bool)
+# The time in seconds for which seen tweet IDs are remembered.
+DEDUPE_WINDOW_S = config('DEDUPE_WINDOW_S', default=24 * 60 * 60, cast=int)
+# The number of tweet IDs each dedupe bloom filter is sized for.
+DEDUPE_CAPACITY = config('DEDUPE_CAPACITY', default=100000, cast=int)
+# The target false positive rate of each dedupe bloom filter.
+DEDUPE_ERROR_RATE = config('DEDUPE_ERROR_RATE', default=0.001, cast=float)
+# The number of most recent tweet IDs which are remembered exactly.
+DEDUPE_LRU_SIZE = config('DEDUPE_LRU_SIZE', default=10000, cast=int)
+# The name of the Django cache to share seen tweet IDs across processes, or
+# empty to keep them in each process.
+DEDUPE_CACHE = config('DEDUPE_CACHE', default="")
+# The steady number of alert tweets per second to post, within the limit of
+# 300 tweets per 3 hours.
+PUBLISHER_RATE_PER_S = config('PUBLISHER_RATE_PER_S', default=300 / (3 * 60 * 60), cast=float)
+# The number of alert tweets which may be posted in a burst.
+PUBLISHER_BURST = config('PUBLISHER_BURST', default=5, cast=int)
+# The path to the outbox of alert tweets waiting to be posted.
+PUBLISHER_OUTBOX_PATH = config('PUBLISHER_OUTBOX_PATH', default="/tmp/tweets2cash-outbox.jsonl")
+# The time in seconds to wait before retrying a failed alert tweet.
+PUBLISHER_RETRY_S = config('PUBLISHER_RETRY_S', default=60, cast=float)
+# The number of times to try posting an alert tweet before dropping it.
+PUBLISHER_MAX_ATTEMPTS = config('PUBLISHER_MAX_ATTEMPTS', default=5, cast=int)
+# The number of posted or dropped alert tweets after which the outbox is
+# compacted.
+PUBLISHER_COMPACT_COUNT = config('PUBLISHER_COMPACT_COUNT', default=1000, cast=int)
+# The maximum number of users to follow on one stream connection. Larger
+# follow lists are split across several connections.
+STREAM_SHARD_SIZE = config('STREAM_SHARD_SIZE', default=5000, cast=int)
+# The "access_token:access_token_secret" pairs of the accounts to stream on
+# when sharding, one per stream connection, as an account may only have one.
+STREAM_SHARD_CREDENTIALS = config('STREAM_SHARD_CREDENTIALS', default="", cast=Csv())
+# The time in seconds to wait before restarting a failed stream connection.
+STREAM_SHARD_RESTART_S = config('STREAM_SHARD_RESTART_S', default=5, cast=float)
+# The maximum time in seconds to wait before restarting a failed stream
+# connection.
+STREAM_SHARD_MAX_RESTART_S = config('STREAM_SHARD_MAX_RESTART_S', default=320, cast=float)
 
 
 if "test" in sys.argv:
@@ -21,3 +21,13 @@ REST_FRAMEWORK["DEFAULT_THROTTLE_RATES"] = {
     "user-detail": None,
     "user-update": None,
 }
+
+# Call the live APIs unless asked to replay the recorded responses with
+# REPLAY_MODE=replay, so that tests run offline and deterministically. Record
+# them with REPLAY_MODE=record. Tests which need them are skipped when
+# replaying without any.
+REPLAY_MODE = config('REPLAY_MODE', default="off")
+
+# Look up all company data through the replay layer instead of the caches.
+COMPANY_CACHE_ENABLED = False
+OWNERSHIP_GRAPH_ENABLED = False
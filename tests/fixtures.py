@@ -49,3 +49,16 @@ def outbox():
     from django.core import mail
 
     return mail.outbox
+
+
+@pytest.fixture
+def replayed():
+    """Skips tests which replay API responses when there are none to replay.
+    """
+    from tweets2cash.base.replay import ReplayError
+    from tweets2cash.base.replay import get_replay
+
+    try:
+        get_replay()
+    except ReplayError as error:
+        pytest.skip(str(error))
@@ -4,11 +4,16 @@ from ast import literal_eval
 from google.cloud.language.entity import Entity
 from django.conf import settings
 from pytest import fixture
+from pytest import mark
 
 from tweets2cash.base.analysis import Analysis
+from tweets2cash.base.analysis import AsyncAnalysis
+from tweets2cash.base.analysis import run_coroutine
 from tweets2cash.base.analysis import MID_TO_TICKER_QUERY
 from tweets2cash.base.twitter import Twitter
 
+pytestmark = mark.usefixtures("replayed")
+
 
 @fixture
 def analysis():
@@ -173,6 +178,15 @@ def test_get_company_data(analysis):
     assert analysis.get_company_data("") is None
 
 
+def test_get_companies_data(analysis):
+    mids = ["/m/0d8c4", "/m/04n3_w4", "/m/017b3j", "/m/0d8c4"]
+    assert analysis.get_companies_data(mids) == {
+        "/m/0d8c4": analysis.get_company_data("/m/0d8c4"),
+        "/m/04n3_w4": analysis.get_company_data("/m/04n3_w4"),
+        "/m/017b3j": None}
+    assert analysis.get_companies_data([]) == {}
+
+
 def test_entity_tostring(analysis):
     assert analysis.entity_tostring(Entity(
         name="General Motors",
@@ -260,6 +274,13 @@ def test_get_sentiment(analysis):
     assert analysis.get_sentiment(None) == 0
 
 
+def test_analyze_entities(analysis):
+    text = get_tweet_text("806134244384899072")
+    entities, sentiment = analysis.analyze_entities(text)
+    assert "Boeing" in [entity.name for entity in entities]
+    assert sentiment == analysis.get_sentiment(text)
+
+
 def test_find_companies(analysis):
     assert analysis.find_companies(get_tweet("806134244384899072")) == [{
         "exchange": "New York Stock Exchange",
@@ -537,6 +558,30 @@ STREAMING_TWEET_SHORT = literal_eval(
     'tr": None, "place": None}')
 
 
+def test_async_find_companies(analysis):
+    async_analysis = AsyncAnalysis(analysis)
+    assert run_coroutine(async_analysis.find_companies(
+        get_tweet("806134244384899072"))) == [{
+            "exchange": "New York Stock Exchange",
+            "name": "Boeing",
+            "sentiment": -0.1,
+            "ticker": "BA"}]
+    assert run_coroutine(async_analysis.find_companies(
+        get_tweet("812061677160202240"))) == [{
+            "exchange": "New York Stock Exchange",
+            "name": "Lockheed Martin Aeronautics",
+            "root": "Lockheed Martin",
+            "sentiment": 0,  # -0.1,
+            "ticker": "LMT"}, {
+            "exchange": "New York Stock Exchange",
+            "name": "Boeing",
+            "sentiment": 0,  # 0.1,
+            "ticker": "BA"}]
+    assert run_coroutine(async_analysis.find_companies(
+        get_tweet("828642511698669569"))) == []
+    assert run_coroutine(async_analysis.find_companies(None)) is None
+
+
 def test_get_expanded_text(analysis):
     assert analysis.get_expanded_text(get_tweet("829410107406614534")) == (
         u"Thank you Brian Krzanich, CEO of Intel. A great investment ($7 BILLI"
@@ -567,6 +612,16 @@ def test_get_expanded_text(analysis):
     assert analysis.get_expanded_text(None) is None
 
 
+def test_get_expanded_text_overlapping(analysis):
+    tweet = {"text": "Thanks @GM and @gmfinancial, not @GMC!",
+             "entities": {"user_mentions": [
+                 {"screen_name": "GM", "name": "General Motors"},
+                 {"screen_name": "GMFinancial", "name": "GM Financial"},
+                 {"screen_name": "gm", "name": "Duplicate"}]}}
+    assert analysis.get_expanded_text(tweet) == (
+        "Thanks General Motors and GM Financial, not General MotorsC!")
+
+
 def test_make_wikidata_request(analysis):
     assert analysis.make_wikidata_request(
         MID_TO_TICKER_QUERY % "/m/02y1vz") == [{
@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+
+from pytest import fixture
+from threading import Lock
+
+from tweets2cash.base.backfill import Backfill
+from tweets2cash.base.logs import Logs
+from tweets2cash.base.ratelimit import RateBudget
+
+
+class FakeStatus:
+    def __init__(self, tweet_id, user_id):
+        self.id = tweet_id
+        self._json = {"id": tweet_id, "id_str": str(tweet_id),
+                      "user": {"id": user_id}}
+
+
+class FakeTwitterAPI:
+    """Serves timelines newest first in pages, like the Twitter API."""
+
+    def __init__(self, timelines):
+        self.timelines = timelines
+        self.lock = Lock()
+        self.lookups = []
+
+    def user_timeline(self, user_id, since_id, max_id, count, trim_user):
+        tweet_ids = sorted(self.timelines[user_id], reverse=True)
+        tweet_ids = [tweet_id for tweet_id in tweet_ids if tweet_id > since_id
+                     and (max_id is None or tweet_id <= max_id)]
+        return [FakeStatus(tweet_id, user_id) for tweet_id in
+                tweet_ids[:count]]
+
+    def statuses_lookup(self, tweet_ids, tweet_mode):
+        with self.lock:
+            self.lookups.append(list(tweet_ids))
+        # Leave out a deleted tweet and return the rest in any order.
+        return [FakeStatus(tweet_id, None) for tweet_id in
+                reversed(tweet_ids) if tweet_id != 1150]
+
+
+@fixture
+def logs():
+    return Logs("test-backfill", to_cloud=False)
+
+
+def test_get_tweets(logs):
+    twitter_api = FakeTwitterAPI({"1": range(1000, 1500, 2),
+                                  "2": range(1001, 1500, 2),
+                                  "3": range(100, 200)})
+    backfill = Backfill(twitter_api, logs, num_threads=3,
+                        timeline_budget=RateBudget(100),
+                        lookup_budget=RateBudget(100))
+
+    tweets = backfill.get_tweets({"1": 1100, "2": 1200}, tweet_ids=[150])
+    tweet_ids = [tweet["id"] for tweet in tweets]
+
+    expected = [150] + list(range(1100, 1150, 2)) + list(range(1152, 1200, 2))
+    expected += list(range(1200, 1500))
+    assert tweet_ids == expected
+    assert [len(batch) for batch in twitter_api.lookups] == [100, 100, 100, 51]
+    assert backfill.timeline_budget.get_stats()["used"] == 4
+
+
+class FlakyTwitterAPI(FakeTwitterAPI):
+    """Fails the first lookup of each batch, and every lookup of one."""
+
+    def __init__(self, timelines):
+        FakeTwitterAPI.__init__(self, timelines)
+        self.failed = set()
+
+    def statuses_lookup(self, tweet_ids, tweet_mode):
+        with self.lock:
+            first = tweet_ids[0]
+            if first == 1100 or first not in self.failed:
+                self.failed.add(first)
+                raise Exception("Twitter API error")
+        return FakeTwitterAPI.statuses_lookup(self, tweet_ids, tweet_mode)
+
+
+def test_get_tweets_lookup_failure(logs):
+    twitter_api = FlakyTwitterAPI({"1": range(1000, 1300)})
+    backfill = Backfill(twitter_api, logs, num_threads=2,
+                        timeline_budget=RateBudget(100),
+                        lookup_budget=RateBudget(100))
+    failed_user_ids = set()
+    tweet_ids = [tweet["id"] for tweet in backfill.get_tweets(
+        {"1": 1100}, failed_user_ids=failed_user_ids)]
+    assert tweet_ids == list(range(1200, 1300))
+    assert failed_user_ids == {"1"}
+
+
+def test_get_tweets_nothing_new(logs):
+    twitter_api = FakeTwitterAPI({"1": range(1000, 1010)})
+    backfill = Backfill(twitter_api, logs)
+    assert list(backfill.get_tweets({"1": 2000})) == []
+    assert twitter_api.lookups == []
+
@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+
+from pytest import fixture
+from time import sleep
+
+from tweets2cash.base.cache import CompanyCache
+from tweets2cash.base.cache import LRUCache
+
+
+@fixture
+def company_cache(tmpdir):
+    return CompanyCache(path=str(tmpdir.join("companies.sqlite3")),
+                        ttl_s=60, negative_ttl_s=60, max_entries=2,
+                        evict_interval=1)
+
+
+def test_get_miss(company_cache):
+    assert company_cache.get("/m/0d8c4") == (False, None)
+    assert company_cache.get_stats()["misses"] == 1
+
+
+def test_set_and_get(company_cache):
+    company_cache.set("/m/0d8c4", [{
+        "exchange": "New York Stock Exchange",
+        "name": "Lockheed Martin",
+        "ticker": "LMT"}])
+    assert company_cache.get("/m/0d8c4") == (True, [{
+        "exchange": "New York Stock Exchange",
+        "name": "Lockheed Martin",
+        "ticker": "LMT"}])
+    assert company_cache.get_stats()["hits"] == 1
+
+
+def test_negative_caching(company_cache):
+    company_cache.set("/m/07t21", None)
+    assert company_cache.get("/m/07t21") == (True, None)
+    assert company_cache.get_stats()["negative_hits"] == 1
+
+
+def test_expiration(tmpdir):
+    company_cache = CompanyCache(path=str(tmpdir.join("companies.sqlite3")),
+                                 ttl_s=0.1, negative_ttl_s=0.1, max_entries=10)
+    company_cache.set("/m/0d8c4", [{"name": "Lockheed Martin"}])
+    sleep(0.2)
+    assert company_cache.get("/m/0d8c4") == (False, None)
+
+
+def test_eviction(company_cache):
+    company_cache.set("/m/0d8c4", [{"name": "Lockheed Martin"}])
+    company_cache.set("/m/0hkqn", [{"name": "Lockheed Martin"}])
+    company_cache.set("/m/035nm", [{"name": "General Motors"}])
+    assert company_cache.get("/m/0d8c4") == (False, None)
+    assert company_cache.get("/m/035nm") == (True, [{
+        "name": "General Motors"}])
+    assert company_cache.get_stats()["evictions"] == 1
+
+
+def test_eviction_interval(tmpdir):
+    company_cache = CompanyCache(path=str(tmpdir.join("companies.sqlite3")),
+                                 ttl_s=60, negative_ttl_s=60, max_entries=1,
+                                 evict_interval=3)
+    company_cache.set("/m/0d8c4", [{"name": "Lockheed Martin"}])
+    company_cache.set("/m/0hkqn", [{"name": "Lockheed Martin"}])
+    assert company_cache.get_stats()["evictions"] == 0
+    company_cache.set("/m/035nm", [{"name": "General Motors"}])
+    assert company_cache.get_stats()["evictions"] == 2
+    assert company_cache.get("/m/035nm") == (True, [{
+        "name": "General Motors"}])
+
+
+def test_shared_between_instances(tmpdir):
+    path = str(tmpdir.join("companies.sqlite3"))
+    CompanyCache(path=path).set("/m/0d8c4", [{"name": "Lockheed Martin"}])
+    assert CompanyCache(path=path).get("/m/0d8c4") == (True, [{
+        "name": "Lockheed Martin"}])
+
+
+def test_lru_cache():
+    lru_cache = LRUCache(max_entries=2)
+    assert lru_cache.get("a") == (False, None)
+    lru_cache.set("a", 0.1)
+    lru_cache.set("b", -0.2)
+    assert lru_cache.get("a") == (True, 0.1)
+    lru_cache.set("c", 0)
+    assert lru_cache.get("b") == (False, None)
+    assert lru_cache.get("a") == (True, 0.1)
+    assert lru_cache.get("c") == (True, 0)
+    assert lru_cache.get_stats() == {
+        "hits": 3,
+        "misses": 2,
+        "evictions": 1,
+        "size": 2}
@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+
+from pytest import fixture
+
+from tweets2cash.base.checkpoint import Checkpoints
+
+
+@fixture
+def path(tmpdir):
+    return str(tmpdir.join("checkpoints.log"))
+
+
+def test_update(path):
+    checkpoints = Checkpoints(path=path, sync_count=2, sync_s=60)
+    assert checkpoints.get("25073877") is None
+    assert checkpoints.update("25073877", 806134244384899072)
+    assert not checkpoints.update(25073877, "806134244384899071")
+    assert checkpoints.get_stats() == {"users": 1, "pending": 1, "syncs": 0,
+                                     "in_flight": 0, "frozen": 0}
+    assert checkpoints.update("25073877", 818461467766824961)
+    assert checkpoints.get_stats() == {"users": 1, "pending": 0, "syncs": 1,
+                                     "in_flight": 0, "frozen": 0}
+    assert checkpoints.get(25073877) == 818461467766824961
+
+
+def test_load(path):
+    checkpoints = Checkpoints(path=path, sync_count=100, sync_s=60)
+    checkpoints.update("25073877", 806134244384899072)
+    checkpoints.update("25073877", 818461467766824961)
+    checkpoints.update("822215679726100480", 821697182235496450)
+    checkpoints.sync()
+
+    # Simulate a crash in the middle of writing a line.
+    with open(path, "a", encoding="utf-8") as log_file:
+        log_file.write("822215679726100480 8")
+
+    checkpoints = Checkpoints(path=path)
+    assert checkpoints.get_all() == {"25073877": 818461467766824961,
+                                     "822215679726100480": 821697182235496450}
+    with open(path, "r", encoding="utf-8") as log_file:
+        assert len(log_file.readlines()) == 2
+
+
+def test_begin_end(path):
+    checkpoints = Checkpoints(path=path)
+    for tweet_id in [101, 102, 103]:
+        checkpoints.begin("25073877", tweet_id)
+
+    # The checkpoint waits for earlier tweets which are still in flight.
+    checkpoints.end(102)
+    assert checkpoints.get("25073877") is None
+    checkpoints.end(101)
+    assert checkpoints.get("25073877") == 102
+    assert checkpoints.get_stats()["in_flight"] == 1
+    checkpoints.end(103)
+    assert checkpoints.get("25073877") == 103
+    checkpoints.end(104)
+    assert checkpoints.get("25073877") == 103
+
+
+def test_freeze(path):
+    checkpoints = Checkpoints(path=path)
+    checkpoints.update("25073877", 100)
+    checkpoints.freeze(["25073877"])
+    for tweet_id in range(101, 111):
+        checkpoints.begin("25073877", tweet_id)
+        checkpoints.end(tweet_id)
+    assert checkpoints.get("25073877") == 100
+    assert checkpoints.ended == {"25073877": [110]}
+    checkpoints.thaw(["25073877"])
+    assert checkpoints.get("25073877") == 110
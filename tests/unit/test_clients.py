@@ -0,0 +1,59 @@
+# -*- coding: utf-8 -*-
+
+from pytest import fixture
+from pytest import raises
+from threading import Thread
+
+from tweets2cash.base.clients import ClientRegistry
+
+
+class Client:
+    def __init__(self):
+        self.healthy = True
+
+
+@fixture
+def clients():
+    clients = ClientRegistry()
+    clients.register("client", Client, check=lambda client: client.healthy)
+    return clients
+
+
+def test_get(clients):
+    client = clients.get("client")
+    assert clients.get("client") is client
+
+    # Each thread has its own client.
+    other_clients = []
+    thread = Thread(target=lambda: other_clients.append(clients.get("client")))
+    thread.start()
+    thread.join()
+    assert other_clients[0] is not client
+
+    assert clients.get_stats() == {"client": {
+        "created": 2,
+        "reused": 1,
+        "discarded": 0}}
+
+
+def test_unhealthy(clients):
+    client = clients.get("client")
+    client.healthy = False
+    assert clients.get("client") is not client
+    assert clients.get_stats()["client"]["discarded"] == 1
+
+
+def test_max_age(clients):
+    clients.register("old", Client, max_age_s=0)
+    client = clients.get("old")
+    assert clients.get("old") is not client
+
+
+def test_use(clients):
+    with clients.use("client") as client:
+        pass
+    with raises(ValueError):
+        with clients.use("client") as used_client:
+            assert used_client is client
+            raise ValueError("failed")
+    assert clients.get("client") is not client
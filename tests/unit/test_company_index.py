@@ -0,0 +1,105 @@
+# -*- coding: utf-8 -*-
+
+from pytest import fixture
+from simplejson import dumps
+
+from tweets2cash.base.company_index import CompanyIndex
+from tweets2cash.base.company_index import WikidataExtract
+from tweets2cash.base.company_index import write_company_index
+
+
+def item_claim(prop, qid, rank="normal"):
+    return {"mainsnak": {
+        "snaktype": "value",
+        "property": prop,
+        "datavalue": {"value": {"entity-type": "item", "id": qid}}},
+        "rank": rank}
+
+
+def string_claim(prop, value):
+    return {"mainsnak": {
+        "snaktype": "value",
+        "property": prop,
+        "datavalue": {"value": value, "type": "string"}},
+        "rank": "normal"}
+
+
+def listing_claim(exchange, ticker):
+    claim = item_claim("P414", exchange)
+    claim["qualifiers"] = {"P249": [{
+        "snaktype": "value",
+        "property": "P249",
+        "datavalue": {"value": ticker, "type": "string"}}]}
+    return claim
+
+
+def entity(qid, label, **claims):
+    return {"type": "item",
+            "id": qid,
+            "labels": {"en": {"language": "en", "value": label}},
+            "claims": claims}
+
+
+EXTRACT_ENTITIES = [
+    entity("Q13677", "New York Stock Exchange"),
+    entity("Q483751", "Lockheed Martin",
+           P646=[string_claim("P646", "/m/0d8c4")],
+           P414=[listing_claim("Q13677", "LMT")]),
+    entity("Q6664958", "Lockheed Martin Aeronautics",
+           P646=[string_claim("P646", "/m/0hkqn")],
+           P749=[item_claim("P749", "Q483751")]),
+    entity("Q152491", "Lockheed Martin F-35 Lightning II",
+           P646=[string_claim("P646", "/m/033yz")],
+           P176=[item_claim("P176", "Q6664958")]),
+    entity("Q1616075", "television station"),
+    entity("Q48340", "Lockheed TV",
+           P646=[string_claim("P646", "/m/0tv")],
+           P31=[item_claim("P31", "Q1616075")],
+           P749=[item_claim("P749", "Q483751")]),
+    entity("Q95", "Some Product",
+           P646=[string_claim("P646", "/m/0xyz")])]
+
+
+@fixture
+def extract():
+    extract = WikidataExtract()
+    lines = ["["] + ["%s," % dumps(item) for item in EXTRACT_ENTITIES] + ["]"]
+    extract.load(lines)
+    return extract
+
+
+def test_get_company_data(extract):
+    assert extract.get_company_data("/m/0d8c4") == [{
+        "exchange": "New York Stock Exchange",
+        "name": "Lockheed Martin",
+        "ticker": "LMT"}]
+    assert extract.get_company_data("/m/0hkqn") == [{
+        "exchange": "New York Stock Exchange",
+        "name": "Lockheed Martin Aeronautics",
+        "root": "Lockheed Martin",
+        "ticker": "LMT"}]
+    assert extract.get_company_data("/m/033yz") == [{
+        "exchange": "New York Stock Exchange",
+        "name": "Lockheed Martin Aeronautics",
+        "root": "Lockheed Martin",
+        "ticker": "LMT"}]
+    assert extract.get_company_data("/m/0tv") is None
+    assert extract.get_company_data("/m/0xyz") is None
+    assert extract.get_company_data("/m/missing") is None
+
+
+def test_company_index(extract, tmpdir):
+    path = str(tmpdir.join("companies.idx"))
+    assert write_company_index(path, extract.get_all_company_data()) == 5
+
+    company_index = CompanyIndex(path)
+    try:
+        assert company_index.get("/m/0d8c4") == (True, [{
+            "exchange": "New York Stock Exchange",
+            "name": "Lockheed Martin",
+            "ticker": "LMT"}])
+        assert company_index.get("/m/0xyz") == (True, None)
+        assert company_index.get("/m/missing") == (False, None)
+        assert company_index.get("") == (False, None)
+    finally:
+        company_index.close()
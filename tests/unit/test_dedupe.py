@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+
+from time import sleep
+
+from tweets2cash.base.dedupe import BloomFilter
+from tweets2cash.base.dedupe import DedupeWindow
+
+
+class FakeCache:
+    def __init__(self):
+        self.values = {}
+
+    def add(self, key, value, timeout):
+        if key in self.values:
+            return False
+        self.values[key] = value
+        return True
+
+
+def test_bloom_filter():
+    bloom_filter = BloomFilter(capacity=1000, error_rate=0.01)
+    for tweet_id in range(1000):
+        bloom_filter.add(str(tweet_id))
+    assert all(str(tweet_id) in bloom_filter for tweet_id in range(1000))
+    false_positives = len([tweet_id for tweet_id in range(1000, 11000)
+                           if str(tweet_id) in bloom_filter])
+    assert false_positives < 300
+    assert 0.005 < bloom_filter.get_error_rate() < 0.02
+
+
+def test_check():
+    dedupe_window = DedupeWindow(window_s=60, capacity=1000,
+                                 error_rate=0.001, lru_size=2)
+    assert not dedupe_window.check("806134244384899072")
+    assert not dedupe_window.check(818461467766824961)
+    assert dedupe_window.check("806134244384899072")
+    assert not dedupe_window.check("821697182235496450")
+
+    # Evicted from the exact LRU, but still in the bloom filter.
+    assert dedupe_window.check("818461467766824961")
+
+    stats = dedupe_window.get_stats()
+    assert stats["checked"] == 5
+    assert stats["hits"] == 1
+    assert stats["bloom_hits"] == 1
+
+
+def test_check_window():
+    dedupe_window = DedupeWindow(window_s=0.1, capacity=1000,
+                                 error_rate=0.001, lru_size=0)
+    assert not dedupe_window.check("806134244384899072")
+    sleep(0.06)
+    assert dedupe_window.check("806134244384899072")
+    sleep(0.06)
+    assert not dedupe_window.check("806134244384899072")
+
+
+def test_check_shared():
+    cache = FakeCache()
+    dedupe_window = DedupeWindow(window_s=60, capacity=1000,
+                                 error_rate=0.001, lru_size=10, cache=cache)
+    other_dedupe_window = DedupeWindow(window_s=60, capacity=1000,
+                                       error_rate=0.001, lru_size=10,
+                                       cache=cache)
+    assert not dedupe_window.check("806134244384899072")
+    assert other_dedupe_window.check("806134244384899072")
+
+    # Pretend the bloom filter has a false positive.
+    dedupe_window.current.add("818461467766824961")
+    assert not dedupe_window.check("818461467766824961")
+
+    assert other_dedupe_window.get_stats()["shared_hits"] == 1
+    assert dedupe_window.get_stats()["false_positives"] == 1
@@ -0,0 +1,32 @@
+# -*- coding: utf-8 -*-
+
+from pytest import fixture
+
+from tweets2cash.base.http import HttpSession
+
+WIKIDATA_URL = "https://query.wikidata.org/sparql?query=ASK%7B%7D&format=JSON"
+
+
+@fixture
+def http_session():
+    return HttpSession(pool_connections=1, pool_maxsize=2)
+
+
+def test_get_stats(http_session):
+    assert http_session.get_stats() == {
+        "requests": 0,
+        "errors": 0,
+        "pools": {}}
+
+
+def test_connection_reuse(http_session):
+    for _ in range(3):
+        response = http_session.get(WIKIDATA_URL)
+        assert response.json()["boolean"] is True
+
+    stats = http_session.get_stats()
+    assert stats["requests"] == 3
+    pool_stats = stats["pools"]["https://query.wikidata.org:443"]
+    assert pool_stats["connections"] == 1
+    assert pool_stats["requests"] == 3
+    assert pool_stats["reuse_rate"] > 0.5
@@ -0,0 +1,173 @@
+# -*- coding: utf-8 -*-
+
+from pytest import raises
+from queue import Full
+
+from tweets2cash.base.ingest import IngestQueue
+from tweets2cash.base.ingest import StreamFilter
+from tweets2cash.base.ingest import classify
+from tweets2cash.base.ingest import get_author_id
+
+TWEET = '{"id":%d,"text":"Tweet","user":{"id":%s,"id_str":"%s"}}'
+
+
+def make_tweet(tweet_id, user_id):
+    return TWEET % (tweet_id, user_id, user_id)
+
+
+def get_all(queue):
+    items = []
+    while queue.qsize():
+        items.append(queue.get())
+        queue.task_done()
+    return items
+
+
+def test_get_author_id():
+    assert get_author_id(make_tweet(1, 25073877)) == "25073877"
+    assert get_author_id('{"delete":{"status":{"id":1}}}') is None
+
+
+def test_block():
+    queue = IngestQueue(maxsize=2, policy="block")
+    queue.put("a")
+    queue.put("b")
+    with raises(Full):
+        queue.put("c", timeout=0.01)
+    assert get_all(queue) == ["a", "b"]
+    assert queue.get_stats()["high_water"] == 2
+
+
+def test_drop_oldest():
+    queue = IngestQueue(maxsize=2, policy="drop_oldest")
+    for item in ["a", "b", "c", "d"]:
+        queue.put(item)
+    assert get_all(queue) == ["c", "d"]
+    assert queue.get_stats() == {
+        "policy": "drop_oldest",
+        "depth": 0,
+        "high_water": 2,
+        "dropped": 2,
+        "spilled": 0}
+    queue.join()
+
+
+def test_drop_unfollowed():
+    queue = IngestQueue(maxsize=2, policy="drop_unfollowed",
+                        follow=[25073877])
+    queue.put(make_tweet(1, 25073877))
+    queue.put(make_tweet(2, 1))
+    queue.put(make_tweet(3, 25073877))
+    queue.put(make_tweet(4, 2))
+    queue.put(make_tweet(5, 25073877))
+    assert get_all(queue) == [make_tweet(3, 25073877),
+                              make_tweet(5, 25073877)]
+    assert queue.get_stats()["dropped"] == 3
+    queue.join()
+
+
+def test_drop_unfollowed_order():
+    queue = IngestQueue(maxsize=3, policy="drop_unfollowed",
+                        follow=[25073877])
+    queue.put(make_tweet(1, 1))
+    queue.put(make_tweet(2, 25073877))
+    queue.put(make_tweet(3, 2))
+    queue.put(make_tweet(4, 25073877))
+    assert get_all(queue) == [make_tweet(2, 25073877),
+                              make_tweet(3, 2),
+                              make_tweet(4, 25073877)]
+
+
+def test_spill(tmpdir):
+    queue = IngestQueue(maxsize=2, policy="spill",
+                        spill_path=str(tmpdir.join("spill.jsonl")))
+    for item in ["a", "b", "c", "d", "e"]:
+        queue.put(item)
+    assert queue.qsize() == 5
+    assert get_all(queue) == ["a", "b", "c", "d", "e"]
+
+    # The spill file is reused once it has been read back.
+    for item in ["f", "g", "h"]:
+        queue.put(item)
+    assert get_all(queue) == ["f", "g", "h"]
+    assert queue.get_stats()["spilled"] == 4
+    assert queue.get_stats()["high_water"] == 5
+    queue.join()
+
+
+# Recorded messages from the streaming API, shortened.
+STREAM_DELETE = (
+    '{"delete":{"status":{"id":845334323045765121,"id_str":"84533432304576512'
+    '1","user_id":25073877,"user_id_str":"25073877"},"timestamp_ms":"14903783'
+    '90000"}}\r\n')
+
+STREAM_LIMIT = '{"limit":{"track":1234,"timestamp_ms":"1490378390000"}}\r\n'
+
+STREAM_WARNING = (
+    '{"warning":{"code":"FALLING_BEHIND","message":"Your connection is falli'
+    'ng behind and messages are being queued for delivery to you.","percent_'
+    'full":60}}\r\n')
+
+STREAM_TWEET = (
+    '{"created_at":"Fri Mar 24 18:06:22 +0000 2017","id":845334323045765121,'
+    '"id_str":"845334323045765121","text":"Today, I was thrilled to announce'
+    ' a commitment of $25 BILLION &amp; 20K AMERICAN JOBS over the next 4 yea'
+    'rs. THANK YOU\\u2026 https:\\/\\/t.co\\/nWJ1hNmzoR","truncated":true,"in_'
+    'reply_to_user_id":null,"user":{"id":25073877,"id_str":"25073877","name"'
+    ':"Donald J. Trump","screen_name":"realDonaldTrump","description":"45th '
+    'President of the United States of America{\\ud83c\\uddfa\\ud83c\\uddf8}'
+    '"},"entities":{"user_mentions":[]},"timestamp_ms":"1490378382823"}\r\n')
+
+STREAM_REPLY = (
+    '{"created_at":"Fri Mar 24 18:07:01 +0000 2017","id":845334486388654080,'
+    '"id_str":"845334486388654080","text":"@realDonaldTrump Great news!","in'
+    '_reply_to_status_id":845334323045765121,"in_reply_to_user_id":25073877,'
+    '"user":{"id":1234567,"id_str":"1234567","name":"Someone","screen_name":'
+    '"someone"},"entities":{"user_mentions":[{"screen_name":"realDonaldTrump'
+    '","name":"Donald J. Trump","id":25073877}]}}\r\n')
+
+STREAM_RETWEET = (
+    '{"created_at":"Fri Mar 24 18:08:12 +0000 2017","id":845334784985350144,'
+    '"id_str":"845334784985350144","text":"RT @realDonaldTrump: Today, I was'
+    ' thrilled","user":{"id":25073877,"id_str":"25073877","name":"Donald J. '
+    'Trump","screen_name":"realDonaldTrump"},"retweeted_status":{"created_at'
+    '":"Fri Mar 24 18:06:22 +0000 2017","id":845334323045765121,"user":{"id"'
+    ':25073877}}}\r\n')
+
+
+def test_classify():
+    follow = {"25073877"}
+    assert classify(STREAM_DELETE, follow) == "delete"
+    assert classify(STREAM_LIMIT, follow) == "limit"
+    assert classify(STREAM_WARNING, follow) == "notice"
+    assert classify(STREAM_TWEET, follow) == "tweet"
+    assert classify(STREAM_TWEET.encode("utf-8"), follow) == "tweet"
+    assert classify(STREAM_REPLY, follow) == "unfollowed"
+    assert classify(STREAM_REPLY, set()) == "tweet"
+    assert classify(STREAM_RETWEET, follow) == "retweet"
+    assert classify(STREAM_RETWEET, {"1234567"}) == "unfollowed"
+    assert classify("{}", follow) == "tweet"
+
+
+def test_stream_filter():
+    stream_filter = StreamFilter(follow=[25073877],
+                                 drop=["delete", "limit", "retweet"])
+    assert stream_filter.check(STREAM_DELETE) == ("delete", False)
+    assert stream_filter.check(STREAM_LIMIT) == ("limit", False)
+    assert stream_filter.check(STREAM_TWEET) == ("tweet", True)
+    assert stream_filter.check(STREAM_REPLY) == ("unfollowed", True)
+    assert stream_filter.check(STREAM_RETWEET) == ("retweet", False)
+    assert stream_filter.get_stats() == {
+        "delete": 1,
+        "limit": 1,
+        "notice": 0,
+        "retweet": 1,
+        "unfollowed": 1,
+        "tweet": 1,
+        "dropped": 3}
+
+    disabled_filter = StreamFilter(drop=["delete"], enabled=False)
+    assert disabled_filter.check(STREAM_DELETE) == ("tweet", True)
+
+    with raises(ValueError):
+        StreamFilter(drop=["replies"])
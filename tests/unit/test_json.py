@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+
+from datetime import datetime
+from datetime import timezone
+from decimal import Decimal
+
+from django.core.exceptions import ImproperlyConfigured
+from django.utils.translation import ugettext_lazy as _
+from pytest import fixture
+from pytest import raises
+
+from tweets2cash.base.renderers import JSONRenderer
+from tweets2cash.base.utils.json import get_available_backends
+from tweets2cash.base.utils.json import get_backend
+
+
+@fixture(params=get_available_backends())
+def backend(request):
+    return get_backend(request.param)
+
+
+def test_available_backends():
+    assert "stdlib" in get_available_backends()
+
+
+def test_get_backend():
+    assert get_backend("stdlib").name == "stdlib"
+    assert get_backend("auto").name in get_available_backends()
+    with raises(ImproperlyConfigured):
+        get_backend("nope")
+
+
+def test_loads(backend):
+    data = '{"id_str": "806134244384899072", "text": "Caf\\u00e9 \\ud83d\\udcc8"}'
+    expected = {"id_str": "806134244384899072", "text": "Café 📈"}
+    assert backend.loads(data) == expected
+    assert backend.loads(data.encode("utf-8")) == expected
+
+
+def test_dumps_compatibility(backend):
+    data = {"date_joined": datetime(2017, 1, 2, 3, 4, 5, tzinfo=timezone.utc),
+            "balance": Decimal("1.25"),
+            "role": _("Trader"),
+            "bio": "Café"}
+    expected = {"date_joined": "2017-01-02T03:04:05Z",
+                "balance": 1.25,
+                "role": "Trader",
+                "bio": "Café"}
+    assert backend.loads(backend.dumps(data, ensure_ascii=False)) == expected
+    assert backend.loads(backend.dumpb(data, ensure_ascii=False)) == expected
+    assert backend.loads(backend.dumps(data)) == expected
+
+
+def test_dumps_nan(backend):
+    with raises(ValueError):
+        backend.dumps({"value": float("nan")}, ensure_ascii=False,
+                      allow_nan=False)
+    with raises(ValueError):
+        backend.dumpb({"value": float("inf")}, ensure_ascii=False,
+                      allow_nan=False)
+
+
+def test_renderer():
+    renderer = JSONRenderer()
+    rendered = renderer.render({"text": "a\u2028b\u2029c", "value": 1})
+    assert b"\\u2028" in rendered
+    assert b"\\u2029" in rendered
+    assert get_backend("stdlib").loads(rendered) == {
+        "text": "a\u2028b\u2029c", "value": 1}
+    assert renderer.render(None) == b""
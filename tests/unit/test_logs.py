@@ -1,9 +1,16 @@
 # -*- coding: utf-8 -*-
 
 from pytest import fixture
+from time import sleep
 
+from tweets2cash.base.logs import CloudLogUploader
+from tweets2cash.base.logs import DEBUG
+from tweets2cash.base.logs import INFO
+from tweets2cash.base.logs import WARNING
 from tweets2cash.base.logs import Logs
 from tweets2cash.base.logs import LOG_FILE
+from tweets2cash.base.logs import LogsRegistry
+from tweets2cash.base.logs import get_level
 
 
 @fixture
@@ -47,5 +54,121 @@ def test_catch(logs, capfd):
     except Exception:
         logs.catch()
     assert get_last_logs(4).endswith(
-        'test_logs.py", line 46, in test_catch\n    raise Exception("exceptio'
+        'test_logs.py", line 53, in test_catch\n    raise Exception("exceptio'
         'n")\nException: exception\n')
+
+
+class FakeCloudLogs:
+    def __init__(self):
+        self.batches = []
+        self.reports = []
+
+    def safe_cloud_log_entries(self, entries):
+        self.batches.append(entries)
+
+    def safe_report_exception(self, exception_str):
+        self.reports.append(exception_str)
+
+
+def test_uploader_batch_size():
+    cloud_logs = FakeCloudLogs()
+    uploader = CloudLogUploader(buffer_size=10, batch_size=2, flush_s=60)
+    assert uploader.put(cloud_logs, "one", "DEBUG")
+    assert uploader.put(cloud_logs, "two", "INFO")
+    assert uploader.put(cloud_logs, "exception", None)
+    for _ in range(100):
+        if cloud_logs.batches:
+            break
+        sleep(0.01)
+    assert cloud_logs.batches == [[("one", "DEBUG"), ("two", "INFO")]]
+    assert cloud_logs.reports == []
+
+    uploader.flush()
+    assert cloud_logs.reports == ["exception"]
+    assert uploader.get_stats() == {"queued": 0, "uploaded": 3,
+                                    "overflowed": 0}
+
+
+def test_uploader_flush_age():
+    cloud_logs = FakeCloudLogs()
+    uploader = CloudLogUploader(buffer_size=10, batch_size=100, flush_s=0.05)
+    assert uploader.put(cloud_logs, "old", "DEBUG")
+    for _ in range(100):
+        if cloud_logs.batches:
+            break
+        sleep(0.01)
+    assert cloud_logs.batches == [[("old", "DEBUG")]]
+
+
+def test_uploader_overflow():
+    cloud_logs = FakeCloudLogs()
+    uploader = CloudLogUploader(buffer_size=2, batch_size=100, flush_s=60)
+    assert uploader.put(cloud_logs, "one", "DEBUG")
+    assert uploader.put(cloud_logs, "two", "DEBUG")
+    assert not uploader.put(cloud_logs, "three", "DEBUG")
+    assert uploader.get_stats()["overflowed"] == 1
+
+    uploader.flush()
+    assert cloud_logs.batches == [[("one", "DEBUG"), ("two", "DEBUG")]]
+
+
+class FailingCloudLogs(FakeCloudLogs):
+    def safe_cloud_log_entries(self, entries):
+        if entries == [("fail", "DEBUG")]:
+            raise Exception("upload failed")
+        self.batches.append(entries)
+
+
+def test_uploader_failure():
+    cloud_logs = FailingCloudLogs()
+    uploader = CloudLogUploader(buffer_size=10, batch_size=1, flush_s=60)
+    assert uploader.put(cloud_logs, "fail", "DEBUG")
+    assert uploader.put(cloud_logs, "after", "DEBUG")
+    assert uploader.flush()
+    assert cloud_logs.batches == [[("after", "DEBUG")]]
+
+
+def test_uploader_flush_timeout():
+    cloud_logs = FakeCloudLogs()
+    uploader = CloudLogUploader(buffer_size=10, batch_size=100, flush_s=60)
+    uploader.buffer.append((0, cloud_logs, "stuck", "DEBUG"))
+    assert not uploader.flush(timeout_s=0.05)
+
+
+def test_debug_args(logs, capfd):
+    logs.debug("debug %s %d", "args", 1)
+    assert get_last_logs().endswith(" DEBUG debug args 1\n")
+
+
+def test_suppressed_level(logs, capfd):
+    class Unformattable:
+        def __str__(self):
+            raise AssertionError("Formatted a suppressed log.")
+
+    logs.info("info")
+    logs.level = WARNING
+    logs.info("suppressed: %s", Unformattable())
+    assert get_last_logs().endswith(" INFO info\n")
+
+
+def test_get_level():
+    levels = ["pipeline=INFO", "pipeline-analyze=warning"]
+    assert get_level("analysis", default="DEBUG", levels=levels) == DEBUG
+    assert get_level("pipeline", default="DEBUG", levels=levels) == INFO
+    assert get_level("pipeline-trade-worker-1", default="DEBUG",
+                     levels=levels) == INFO
+    assert get_level("pipeline-analyze-worker-1", default="DEBUG",
+                     levels=levels) == WARNING
+
+
+def test_registry():
+    registry = LogsRegistry()
+    logger = registry.get_local_logger("test-registry", LOG_FILE)
+    assert registry.get_local_logger("test-registry", LOG_FILE) is logger
+    other_logger = registry.get_local_logger("test-registry-other", LOG_FILE)
+    assert other_logger.handlers == logger.handlers
+    assert registry.get_stats() == {"logging_clients": 0,
+                                    "error_clients": 0,
+                                    "cloud_loggers": 0,
+                                    "handlers": 1,
+                                    "local_loggers": 2}
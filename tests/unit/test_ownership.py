@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+
+from pytest import fixture
+
+from tweets2cash.base.ownership import OwnershipGraph
+from tweets2cash.base.ownership import fetch_ownership_data
+from tweets2cash.base.ownership import get_company_data_from_rows
+
+LABELS = {"Q483751": "Lockheed Martin",
+          "Q6664958": "Lockheed Martin Aeronautics",
+          "Q1": "Lockheed Holdings"}
+
+EDGES = {"P749": {"Q6664958": ["Q1"]},
+         "P156": {"Q1": ["Q483751"]}}
+
+LISTINGS = {"Q483751": [("Q13677", "LMT")]}
+
+
+@fixture
+def graph():
+    graph = OwnershipGraph()
+    graph.update(LABELS, EDGES, LISTINGS)
+    return graph
+
+
+def test_get_roots(graph):
+    assert graph.get_roots("Q6664958") == [("Q483751", "Q13677", "LMT")]
+    assert graph.get_roots("Q1") == []
+    assert graph.get_roots("Q483751") == []
+    assert graph.get_root_rows("Q6664958", "Lockheed Martin Aeronautics") == [
+        ("Lockheed Martin Aeronautics", "Lockheed Martin", "LMT",
+         "New York Stock Exchange")]
+
+
+def test_update(graph):
+    # Only the companies depending on the changed listing are recomputed.
+    listings = {"Q483751": [("Q13677", "LMT")], "Q1": [("Q82059", "LHX")]}
+    assert graph.update(LABELS, EDGES, listings) == 2
+    assert graph.get_roots("Q6664958") == [
+        ("Q1", "Q82059", "LHX"), ("Q483751", "Q13677", "LMT")]
+
+    # Removed edges remove the roots as well.
+    assert graph.update(LABELS, {}, listings) == 2
+    assert graph.get_roots("Q6664958") == []
+
+    assert graph.update(LABELS, {}, listings) == 0
+
+
+def test_save_and_load(graph, tmpdir):
+    path = str(tmpdir.join("ownership.json"))
+    graph.save(path)
+    loaded = OwnershipGraph.load(path)
+    assert loaded.roots == graph.roots
+    assert loaded.listings == graph.listings
+    assert loaded.update(LABELS, EDGES, LISTINGS) == 0
+
+
+def test_fetch_ownership_data():
+    def make_wikidata_request(query):
+        if "?child" not in query:
+            return [{
+                "company": {"value": "http://www.wikidata.org/entity/Q483751"},
+                "companyLabel": {"value": "Lockheed Martin"},
+                "exchanges": {
+                    "value": "http://www.wikidata.org/entity/Q13677"},
+                "ticker": {"value": "LMT"}}]
+        if "wd:Q483751" in query:
+            return [{
+                "child": {"value": "http://www.wikidata.org/entity/Q6664958"},
+                "property": {
+                    "value": "http://www.wikidata.org/prop/direct/P749"},
+                "parent": {"value": "http://www.wikidata.org/entity/Q483751"}}]
+        return []
+
+    labels, edges, listings = fetch_ownership_data(make_wikidata_request)
+    assert labels == {"Q483751": "Lockheed Martin"}
+    assert edges == {"P127": {}, "P749": {"Q6664958": ["Q483751"]}, "P156": {}}
+    assert listings == {"Q483751": [("Q13677", "LMT")]}
+
+    assert fetch_ownership_data(lambda query: None) is None
+
+
+def test_get_company_data_from_rows():
+    assert get_company_data_from_rows([
+        ("Lockheed Martin", None, "LMT", "New York Stock Exchange"),
+        ("Detroit Diesel", "PNC Financial Services", "PNC",
+         "New York Stock Exchange"),
+        ("Detroit Diesel", "BlackRock", "BLK", "New York Stock Exchange"),
+        ("Lockheed Martin", "Lockheed Martin", "LMT",
+         "New York Stock Exchange")]) == [{
+            "exchange": "New York Stock Exchange",
+            "name": "Detroit Diesel",
+            "root": "BlackRock",
+            "ticker": "BLK"}, {
+            "exchange": "New York Stock Exchange",
+            "name": "Detroit Diesel",
+            "root": "PNC Financial Services",
+            "ticker": "PNC"}, {
+            "exchange": "New York Stock Exchange",
+            "name": "Lockheed Martin",
+            "ticker": "LMT"}]
+    assert get_company_data_from_rows([]) is None
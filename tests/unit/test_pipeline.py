@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+
+from threading import Event
+from threading import Lock
+
+from tweets2cash.base.pipeline import Pipeline
+from tweets2cash.base.pipeline import Stage
+
+
+def test_pipeline():
+    results = []
+    results_lock = Lock()
+
+    def double(logs, number):
+        return number * 2
+
+    def skip_odd(logs, number):
+        if number % 4:
+            return None
+        return number
+
+    def collect(logs, number):
+        if number == 8:
+            raise ValueError("failed")
+        with results_lock:
+            results.append(number)
+
+    done = []
+
+    def on_done(number):
+        with results_lock:
+            done.append(number)
+
+    pipeline = Pipeline([Stage("double", double, 2),
+                         Stage("skip", skip_odd, 2),
+                         Stage("collect", collect, 1)],
+                        logs_to_cloud=False, on_done=on_done)
+    pipeline.start()
+    for number in range(10):
+        pipeline.put(number)
+    pipeline.stop()
+
+    assert sorted(results) == [0, 4, 12, 16]
+    assert sorted(done) == [0, 2, 4, 6, 8, 10, 12, 14, 16, 18]
+    stats = pipeline.get_stats()
+    assert stats["double"]["processed"] == 10
+    assert stats["skip"]["processed"] == 10
+    assert stats["collect"]["processed"] == 5
+    assert stats["collect"]["errors"] == 1
+    assert stats["collect"]["queue_depth"] == 0
+    assert stats["double"]["throughput"] > 0
+
+
+def test_slow_stage():
+    release = Event()
+    traded = Event()
+
+    def analyze(logs, tweet):
+        # The first tweet waits for a slow lookup.
+        if tweet == "slow":
+            release.wait()
+        return tweet
+
+    def trade(logs, tweet):
+        if tweet == "fast":
+            traded.set()
+
+    pipeline = Pipeline([Stage("analyze", analyze, 2),
+                         Stage("trade", trade, 1)],
+                        logs_to_cloud=False)
+    pipeline.start()
+    pipeline.put("slow")
+    pipeline.put("fast")
+
+    # The later tweet is traded while the earlier one is still analyzed.
+    assert traded.wait(5)
+    release.set()
+    pipeline.stop()
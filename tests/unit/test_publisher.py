@@ -0,0 +1,147 @@
+# -*- coding: utf-8 -*-
+
+from pytest import fixture
+from threading import Event
+from threading import Lock
+from time import time
+
+from tweets2cash.base.publisher import Publisher
+
+BOEING = {"name": "Boeing", "sentiment": -0.1, "ticker": "BA"}
+FORD = {"name": "Ford", "sentiment": 0.3, "ticker": "F"}
+LINK = "https://twitter.com/realDonaldTrump/status/806134244384899072"
+
+
+class FakeResponse:
+    def __init__(self, status_code):
+        self.status_code = status_code
+
+
+class FakeTwitterError(Exception):
+    def __init__(self, status_code):
+        super().__init__("Twitter API error")
+        self.response = FakeResponse(status_code)
+
+
+class FakeTwitter:
+    def __init__(self, fail=False, status_code=None):
+        self.fail = fail
+        self.status_code = status_code
+        self.attempts = 0
+        self.lock = Lock()
+        self.release = Event()
+        self.release.set()
+        self.posted = []
+
+    def post_tweet(self, companies, link):
+        self.release.wait()
+        with self.lock:
+            self.attempts += 1
+        if self.status_code:
+            raise FakeTwitterError(self.status_code)
+        if self.fail:
+            raise Exception("Twitter API error")
+        with self.lock:
+            self.posted.append((companies, link))
+
+
+@fixture
+def path(tmpdir):
+    return str(tmpdir.join("outbox.jsonl"))
+
+
+def test_put(path):
+    twitter = FakeTwitter()
+    twitter.release.clear()
+    publisher = Publisher(lambda: twitter, logs_to_cloud=False, path=path,
+                          rate_per_s=1000, burst=1)
+    start_time = time()
+    publisher.put(806134244384899072, LINK, [BOEING])
+    assert time() - start_time < 0.5
+    twitter.release.set()
+    publisher.flush()
+    assert twitter.posted == [([BOEING], LINK)]
+    stats = publisher.get_stats()
+    assert stats["queued"] == 1
+    assert stats["published"] == 1
+    assert stats["pending"] == 0
+
+
+def test_coalesce(path):
+    twitter = FakeTwitter()
+    twitter.release.clear()
+    publisher = Publisher(lambda: twitter, logs_to_cloud=False, path=path,
+                          rate_per_s=1000, burst=1)
+
+    # Alerts for the same tweet queued up behind a slow post are coalesced.
+    publisher.put(806134244384899072, LINK, [FORD])
+    publisher.put(806134244384899073, LINK, [BOEING])
+    publisher.put(806134244384899073, LINK, [FORD, BOEING])
+    twitter.release.set()
+    publisher.flush()
+    assert twitter.posted == [([FORD], LINK), ([BOEING, FORD], LINK)]
+    assert publisher.get_stats()["coalesced"] == 1
+
+
+def test_load(path):
+    twitter = FakeTwitter(fail=True)
+    publisher = Publisher(lambda: twitter, logs_to_cloud=False, path=path,
+                          rate_per_s=0.001, burst=1, retry_s=60)
+    publisher.put(806134244384899072, LINK, [BOEING])
+    publisher.put(806134244384899073, LINK, [FORD])
+
+    # Nothing was posted, so a new publisher posts both alerts.
+    twitter = FakeTwitter()
+    publisher = Publisher(lambda: twitter, logs_to_cloud=False, path=path,
+                          rate_per_s=1000, burst=1)
+    publisher.put(806134244384899074, LINK, [BOEING])
+    publisher.flush()
+    assert [companies for companies, _ in twitter.posted] == [
+        [BOEING], [FORD], [BOEING]]
+
+    # Everything was posted, so nothing is left for the next one.
+    publisher = Publisher(lambda: twitter, logs_to_cloud=False, path=path)
+    assert publisher.get_stats()["pending"] == 0
+
+
+def test_drop(path):
+    # Client errors are permanent, so the alert is dropped right away.
+    twitter = FakeTwitter(status_code=403)
+    publisher = Publisher(lambda: twitter, logs_to_cloud=False, path=path,
+                          rate_per_s=1000, burst=1, retry_s=0)
+    publisher.put(806134244384899072, LINK, [BOEING])
+    publisher.flush()
+    assert twitter.attempts == 1
+    stats = publisher.get_stats()
+    assert stats["failed"] == 1
+    assert stats["dropped"] == 1
+    assert stats["pending"] == 0
+
+    # Rate limits are retried up to the maximum attempts.
+    twitter = FakeTwitter(status_code=429)
+    publisher = Publisher(lambda: twitter, logs_to_cloud=False, path=path,
+                          rate_per_s=1000, burst=1, retry_s=0,
+                          max_attempts=3)
+    publisher.put(806134244384899073, LINK, [FORD])
+    publisher.put(806134244384899074, LINK, [BOEING])
+    publisher.flush()
+    assert twitter.attempts == 6
+    assert publisher.get_stats()["dropped"] == 2
+
+    # Dropped alerts are done, so nothing is left for the next one.
+    publisher = Publisher(lambda: twitter, logs_to_cloud=False, path=path)
+    assert publisher.get_stats()["pending"] == 0
+
+
+def test_compact(path):
+    twitter = FakeTwitter()
+    publisher = Publisher(lambda: twitter, logs_to_cloud=False, path=path,
+                          rate_per_s=1000, burst=1, compact_count=2)
+    for index in range(5):
+        publisher.put(806134244384899072 + index, LINK, [BOEING])
+        publisher.flush()
+    assert publisher.get_stats()["compactions"] == 3
+
+    # Only the alert posted since the last compaction is left in the outbox.
+    with open(path, "r", encoding="utf-8") as outbox_file:
+        assert len(outbox_file.readlines()) == 2
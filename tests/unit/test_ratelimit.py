@@ -0,0 +1,30 @@
+# -*- coding: utf-8 -*-
+
+from time import time
+
+from tweets2cash.base.ratelimit import RateBudget
+from tweets2cash.base.ratelimit import TokenBucket
+
+
+def test_rate_budget():
+    budget = RateBudget(2, window_s=0.1)
+    start_time = time()
+    for _ in range(5):
+        budget.acquire()
+    assert time() - start_time >= 0.2
+    stats = budget.get_stats()
+    assert stats["limit"] == 2
+    assert stats["used"] == 1
+    assert stats["waited_s"] > 0
+
+
+def test_token_bucket():
+    bucket = TokenBucket(20, 2)
+    start_time = time()
+    for _ in range(4):
+        bucket.acquire()
+    assert time() - start_time >= 0.09
+    stats = bucket.get_stats()
+    assert stats["capacity"] == 2
+    assert stats["tokens"] < 1
+    assert stats["waited_s"] > 0
@@ -0,0 +1,105 @@
+# -*- coding: utf-8 -*-
+
+from google.cloud.language.entity import Entity
+from pytest import fixture
+from pytest import raises
+
+from tweets2cash.base.replay import Replay
+from tweets2cash.base.replay import ReplayError
+from tweets2cash.base.replay import decode_entities
+from tweets2cash.base.replay import encode_entities
+
+
+@fixture
+def path(tmpdir):
+    return str(tmpdir.join("replay", "fixtures.json"))
+
+
+def test_record_and_replay(path):
+    calls = []
+
+    def request():
+        calls.append(1)
+        return {"results": {"bindings": [{"ticker": "GM"}]}}
+
+    recorder = Replay(mode="record", path=path)
+    assert recorder.call("wikidata", "query", request) == {
+        "results": {"bindings": [{"ticker": "GM"}]}}
+    assert recorder.call("wikidata", "failed", lambda: None) is None
+    assert recorder.get_stats()["recorded"] == 1
+    recorder.save()
+
+    player = Replay(mode="replay", path=path)
+    assert player.call("wikidata", "query", request) == {
+        "results": {"bindings": [{"ticker": "GM"}]}}
+    assert len(calls) == 1
+    with raises(ReplayError):
+        player.call("wikidata", "failed", request)
+    with raises(ReplayError):
+        player.call("twitter", "query", request)
+    assert player.get_stats() == {
+        "mode": "replay",
+        "recorded": 0,
+        "replayed": 1,
+        "missed": 2}
+
+
+def test_off(path):
+    replay = Replay(mode="off", path=path)
+    assert replay.call("wikidata", "query", lambda: 42) == 42
+    with raises(ReplayError):
+        Replay(mode="replay", path=path)
+
+
+def test_version(path):
+    recorder = Replay(mode="record", path=path)
+    recorder.call("twitter", "get_tweet 1", lambda: {"id": 1})
+    recorder.save()
+    with open(path, "r") as fixtures_file:
+        fixtures = fixtures_file.read()
+    with open(path, "w") as fixtures_file:
+        fixtures_file.write(fixtures.replace('"version": 1', '"version": 0'))
+
+    with raises(ReplayError):
+        Replay(mode="replay", path=path)
+
+    # Recording starts over with fixtures from another version.
+    recorder = Replay(mode="record", path=path)
+    recorder.call("twitter", "get_tweet 2", lambda: {"id": 2})
+    recorder.save()
+    player = Replay(mode="replay", path=path)
+    assert player.call("twitter", "get_tweet 2", None) == {"id": 2}
+    with raises(ReplayError):
+        player.call("twitter", "get_tweet 1", None)
+
+
+def test_save(path):
+    recorder = Replay(mode="record", path=path)
+    recorder.call("twitter", "get_tweet 1", lambda: {"id": 1})
+    with raises(ReplayError):
+        Replay(mode="replay", path=path)
+    recorder.save()
+    assert Replay(mode="replay", path=path).call(
+        "twitter", "get_tweet 1", None) == {"id": 1}
+
+
+def test_entities(path):
+    entities = [Entity(
+        name="General Motors",
+        entity_type="ORGANIZATION",
+        metadata={"mid": "/m/035nm"},
+        salience=0.1,
+        mentions=["General Motors"])]
+
+    recorder = Replay(mode="record", path=path)
+    recorder.call("language", "analyze_entities text", lambda: entities,
+                  encode_entities, decode_entities)
+    recorder.save()
+    replayed = Replay(mode="replay", path=path).call(
+        "language", "analyze_entities text", None, encode_entities,
+        decode_entities)
+
+    assert len(replayed) == 1
+    assert replayed[0].name == "General Motors"
+    assert replayed[0].metadata == {"mid": "/m/035nm"}
+    assert replayed[0].mentions == ["General Motors"]
@@ -0,0 +1,149 @@
+# -*- coding: utf-8 -*-
+
+from threading import Event
+from threading import Lock
+from pytest import raises
+from time import sleep
+from time import time
+
+from tweets2cash.base.shards import StreamShards
+from tweets2cash.base.shards import partition
+
+
+class FakeListener:
+    def __init__(self):
+        self.lock = Lock()
+        self.stop_event = Event()
+        self.follow = None
+        self.data = []
+
+    def set_follow(self, follow):
+        self.follow = follow
+
+    def on_data(self, data):
+        with self.lock:
+            self.data.append(data)
+        return True
+
+
+class FakeStream:
+    """Streams one message per followed user and then waits to be
+    disconnected. Fails if its account already has a connection open.
+    """
+
+    def __init__(self, account, listener, accounts):
+        self.account = account
+        self.listener = listener
+        self.accounts = accounts
+        self.running = Event()
+
+    def filter(self, follow):
+        with self.accounts["lock"]:
+            if self.account in self.accounts["open"]:
+                self.accounts["shared"] += 1
+            self.accounts["open"].add(self.account)
+        self.running.set()
+        self.listener.on_connect()
+        for user_id in follow:
+            self.listener.on_data(user_id)
+        while self.running.is_set():
+            sleep(0.01)
+        with self.accounts["lock"]:
+            self.accounts["open"].discard(self.account)
+
+    def disconnect(self):
+        self.running.clear()
+
+
+def make_streams(streams, num_accounts):
+    """Returns a stream factory per account which records the streams."""
+
+    accounts = {"lock": Lock(), "open": set(), "shared": 0}
+
+    def make_stream(account, shard_listener):
+        streams.append(FakeStream(account, shard_listener, accounts))
+        return streams[-1]
+
+    return [lambda shard_listener, account=account: make_stream(
+        account, shard_listener) for account in range(num_accounts)], accounts
+
+
+def wait_for(condition):
+    start_time = time()
+    while not condition() and time() - start_time < 5:
+        sleep(0.01)
+    return condition()
+
+
+def test_partition():
+    follow = [str(user_id) for user_id in range(1000, 1250)]
+    shards = partition(follow, shard_size=100)
+    assert len(shards) == 3
+    assert all(len(shard) <= 100 for shard in shards)
+    assert sorted(sum(shards, [])) == follow
+
+    # Adding users moves few of the existing ones.
+    new_shards = partition(follow + ["2000", "2001"], shard_size=100)
+    moved = sum(len(set(shard) - set(new_shard))
+                for shard, new_shard in zip(shards, new_shards))
+    assert moved <= 2
+
+
+def test_set_follow():
+    listener = FakeListener()
+    streams = []
+    stream_factories, accounts = make_streams(streams, 2)
+    shards = StreamShards(listener, stream_factories, logs_to_cloud=False,
+                          shard_size=2)
+    shards.set_follow(["1", "2", "3"])
+    assert len(streams) == 2
+    assert wait_for(lambda: len(listener.data) == 3)
+    assert sorted(listener.data) == ["1", "2", "3"]
+    stats = shards.get_stats()
+    assert [stat["connected"] for stat in stats] == [True, True]
+    assert sum(stat["messages"] for stat in stats) == 3
+    assert sum(stat["users"] for stat in stats) == 3
+
+    # Only the streams whose users changed are replaced.
+    old_follows = [shard.follow for shard in shards.shards]
+    shards.set_follow(["1", "2", "3", "4"])
+    new_follows = [shard.follow for shard in shards.shards]
+    replaced = sum(old != new for old, new in zip(old_follows, new_follows))
+    assert len(streams) == 2 + replaced
+    assert listener.follow == ["1", "2", "3", "4"]
+    restreamed = sum(len(new) for old, new in zip(old_follows, new_follows)
+                     if old != new)
+    assert wait_for(lambda: len(listener.data) == 3 + restreamed)
+    assert accounts["shared"] == 0
+
+    # Following more users than there are accounts is refused.
+    with raises(ValueError):
+        shards.set_follow(["1", "2", "3", "4", "5"])
+    assert listener.follow == ["1", "2", "3", "4"]
+
+    shards.stop()
+    assert wait_for(lambda: not any(shard.is_alive()
+                                    for shard in shards.shards))
+
+
+def test_restart():
+    listener = FakeListener()
+    streams = []
+    stream_factories, _ = make_streams(streams, 1)
+    shards = StreamShards(listener, stream_factories, logs_to_cloud=False,
+                          shard_size=2, restart_s=0, max_restart_s=0)
+    shards.set_follow(["1"])
+    assert wait_for(lambda: streams[0].running.is_set())
+    streams[0].listener.on_error(503)
+    streams[0].disconnect()
+    assert wait_for(lambda: not shards.shards[0].is_alive())
+
+    # The first check schedules the restart and the second one restarts.
+    shards.check()
+    shards.check()
+    assert len(streams) == 2
+    stats = shards.get_stats()[0]
+    assert stats["restarts"] == 1
+    assert stats["errors"] == 1
+    assert stats["last_error"] == 503
+    shards.stop()
@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+
+from pytest import fixture
+from pytest import raises
+from threading import Event
+from threading import Thread
+
+from tweets2cash.base.singleflight import SingleFlight
+
+
+@fixture
+def single_flight():
+    return SingleFlight()
+
+
+def test_do(single_flight):
+    assert single_flight.do("key", lambda value: value * 2, 21) == 42
+    assert single_flight.get_stats() == {
+        "requested": 1,
+        "executed": 1,
+        "coalesced": 0,
+        "in_flight": 0}
+
+
+def test_do_coalesced(single_flight):
+    started = Event()
+    release = Event()
+    calls = []
+
+    def lookup(keys):
+        calls.append(keys)
+        started.set()
+        release.wait()
+        return {key: [{"name": key}] for key in keys}
+
+    results = []
+    leader = Thread(target=lambda: results.append(
+        single_flight.do_many(["/m/0d8c4"], lookup)))
+    leader.start()
+    started.wait()
+
+    followers = [Thread(target=lambda: results.append(
+        single_flight.do_many(["/m/0d8c4", "/m/035nm"], lookup)))
+        for _ in range(3)]
+    for follower in followers:
+        follower.start()
+    while single_flight.get_stats()["coalesced"] < 3:
+        pass
+    release.set()
+    for thread in [leader] + followers:
+        thread.join()
+
+    # The followers share the leader's call and coalesce their own new key.
+    assert calls[0] == ["/m/0d8c4"]
+    assert ["/m/035nm"] in calls
+    assert len(results) == 4
+    for result in results:
+        assert result["/m/0d8c4"] == [{"name": "/m/0d8c4"}]
+
+    # Each caller gets its own copy of the shared result.
+    results[0]["/m/0d8c4"][0]["sentiment"] = 0.5
+    assert "sentiment" not in results[1]["/m/0d8c4"][0]
+
+    stats = single_flight.get_stats()
+    assert stats["requested"] == 7
+    assert stats["coalesced"] >= 3
+    assert stats["in_flight"] == 0
+
+
+def test_do_error(single_flight):
+    def fail():
+        raise ValueError("failed")
+
+    with raises(ValueError):
+        single_flight.do("key", fail)
+    assert single_flight.get_stats()["in_flight"] == 0
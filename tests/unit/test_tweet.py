@@ -0,0 +1,59 @@
+# -*- coding: utf-8 -*-
+
+from pytest import fixture
+from pytest import raises
+
+from tweets2cash.base.logs import Logs
+from tweets2cash.base.tweet import Tweet
+from tweets2cash.base.tweet import to_tweet
+
+TWEET_DATA = {
+    "created_at": "Fri Mar 24 18:06:22 +0000 2017",
+    "id": 845334323045765121,
+    "id_str": "845334323045765121",
+    "text": "THANK YOU… https://t.co/nWJ1hNmzoR",
+    "truncated": True,
+    "user": {"id": 25073877,
+             "id_str": "25073877",
+             "screen_name": "realDonaldTrump"},
+    "entities": {"user_mentions": []},
+    "extended_tweet": {
+        "full_text": "THANK YOU @CharterNews!",
+        "entities": {"user_mentions": [{"screen_name": "CharterNews",
+                                        "name": "Charter"}]}}}
+
+
+@fixture
+def logs():
+    return Logs(name="test-tweet", to_cloud=False)
+
+
+def test_from_data(logs):
+    tweet = Tweet.from_data(TWEET_DATA, logs)
+    assert tweet.id == "845334323045765121"
+    assert tweet.author == "realDonaldTrump"
+    assert tweet.created_at == "Fri Mar 24 18:06:22 +0000 2017"
+    assert tweet.text == "THANK YOU @CharterNews!"
+    assert tweet.mentions == ()
+    assert tweet.link == (
+        "https://twitter.com/realDonaldTrump/status/845334323045765121")
+
+    # Only the slots can be set.
+    with raises(AttributeError):
+        tweet.user = TWEET_DATA["user"]
+
+
+def test_from_data_mentions(logs):
+    tweet = Tweet.from_data({"text": "Thanks @GM!", "entities": {
+        "user_mentions": [{"screen_name": "GM", "name": "General Motors"},
+                          {"screen_name": "malformed"}]}}, logs)
+    assert tweet.mentions == (("GM", "General Motors"),)
+    assert tweet.link is None
+    assert Tweet.from_data({"text": "No entities"}, logs) is None
+
+
+def test_to_tweet(logs):
+    tweet = to_tweet(TWEET_DATA, logs)
+    assert isinstance(tweet, Tweet)
+    assert to_tweet(tweet, logs) is tweet
+    assert to_tweet(None, logs) is None
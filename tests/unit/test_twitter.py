@@ -1,10 +1,16 @@
 # -*- coding: utf-8 -*-
 
+from collections import deque
+from json import dumps
 from pytest import fixture
 from threading import Timer
 from time import sleep
 
+from tweets2cash.base.checkpoint import Checkpoints
+from tweets2cash.base.dedupe import DedupeWindow
+from tweets2cash.base.logs import Logs
 from tweets2cash.base.twitter import Twitter
+from tweets2cash.base.twitter import TwitterListener
 from tweets2cash.base.twitter import TWITTER_CONSUMER_KEY
 from tweets2cash.base.twitter import TWITTER_CONSUMER_SECRET
 from tweets2cash.base.twitter import TWITTER_ACCESS_TOKEN
@@ -12,7 +18,7 @@ from tweets2cash.base.twitter import TWITTER_ACCESS_TOKEN_SECRET
 
 
 @fixture
-def twitter():
+def twitter(replayed):
     return Twitter(logs_to_cloud=False)
 
 
@@ -159,3 +165,133 @@ def test_get_tweet_link(twitter):
     tweet = twitter.get_tweet("828574430800539648")
     assert twitter.get_tweet_link(tweet) == (
         "https://twitter.com/realDonaldTrump/status/828574430800539648")
+
+
+def make_tweet(tweet_id):
+    return {"id": tweet_id,
+            "id_str": str(tweet_id),
+            "created_at": "Fri Mar 24 17:59:42 +0000 2017",
+            "text": "Tweet %d" % tweet_id,
+            "entities": {"user_mentions": []},
+            "user": {"id": 25073877,
+                     "id_str": "25073877",
+                     "screen_name": "realDonaldTrump"}}
+
+
+def test_catch_up(tmpdir):
+    checkpoints = Checkpoints(path=str(tmpdir.join("checkpoints.log")))
+    checkpoints.update("25073877", 100)
+    tweets = []
+    listener = TwitterListener(callback=tweets.append, logs_to_cloud=False,
+                               follow=["25073877"], checkpoints=checkpoints)
+
+    def backfill(since_ids, failed_user_ids):
+        assert since_ids == {"25073877": 100}
+        # Stream a tweet while catching up, which is held back until the
+        # catch-up is done.
+        assert listener.on_data(dumps(make_tweet(102)))
+        assert listener.on_data(dumps(make_tweet(103)))
+        return [make_tweet(100), make_tweet(101), make_tweet(102)]
+
+    listener.start_catch_up(backfill)
+    for _ in range(100):
+        if listener.held is None and not checkpoints.get_stats()["frozen"]:
+            break
+        sleep(0.01)
+    listener.stop_queue()
+
+    assert sorted(tweet.id for tweet in tweets) == ["101", "102", "103"]
+    assert checkpoints.get("25073877") == 103
+
+
+def test_catch_up_failure(tmpdir):
+    checkpoints = Checkpoints(path=str(tmpdir.join("checkpoints.log")))
+    checkpoints.update("25073877", 100)
+    checkpoints.update("822215679726100480", 200)
+    tweets = []
+    listener = TwitterListener(
+        callback=tweets.append, logs_to_cloud=False,
+        follow=["25073877", "822215679726100480"], checkpoints=checkpoints)
+
+    def backfill(since_ids, failed_user_ids):
+        failed_user_ids.add("822215679726100480")
+        assert listener.on_data(dumps(make_tweet(103)))
+        return [make_tweet(101)]
+
+    listener.held = deque()
+    listener.catch_up(backfill, listener.get_since_ids())
+    listener.stop_queue()
+
+    # The tweets of the failed user are fetched again by the next catch-up.
+    assert sorted(tweet.id for tweet in tweets) == ["101", "103"]
+    assert checkpoints.get("25073877") == 103
+    assert checkpoints.get("822215679726100480") == 200
+    assert checkpoints.get_stats()["frozen"] == 1
+
+    def failing_backfill(since_ids, failed_user_ids):
+        raise ValueError("Lookup failed.")
+
+    listener.start_queue()
+    listener.held = deque()
+    listener.catch_up(failing_backfill, listener.get_since_ids())
+    listener.stop_queue()
+
+    assert checkpoints.get_stats()["frozen"] == 2
+
+
+def test_catch_up_hold_size(tmpdir):
+    checkpoints = Checkpoints(path=str(tmpdir.join("checkpoints.log")))
+    checkpoints.update("25073877", 100)
+    tweets = []
+    listener = TwitterListener(callback=tweets.append, logs_to_cloud=False,
+                               follow=["25073877"], checkpoints=checkpoints,
+                               hold_size=1)
+
+    def backfill(since_ids, failed_user_ids):
+        assert listener.on_data(dumps(make_tweet(102)))
+        assert listener.on_data(dumps(make_tweet(103)))
+        return [make_tweet(101)]
+
+    listener.held = deque()
+    listener.catch_up(backfill, listener.get_since_ids())
+    listener.stop_queue()
+
+    # The dropped tweet is fetched again by the next catch-up.
+    assert sorted(tweet.id for tweet in tweets) == ["101", "103"]
+    assert checkpoints.get("25073877") == 100
+    assert checkpoints.get_stats()["frozen"] == 1
+
+
+def test_is_duplicate():
+    listener = TwitterListener(callback=None, logs_to_cloud=False,
+                               hold_size=2)
+    with listener.boundary_lock:
+        for tweet_id in ["101", "102", "103"]:
+            listener.add_boundary(tweet_id)
+    listener.stop_queue()
+
+    # Only the newest caught-up tweets up to the hold size are kept, and
+    # each is forgotten once both copies were seen.
+    assert not listener.is_duplicate("101")
+    assert not listener.is_duplicate("103")
+    assert listener.is_duplicate("103")
+    assert not listener.is_duplicate("103")
+    assert list(listener.boundary_ids) == ["102"]
+    assert not listener.boundary_seen
+
+
+def test_handle_data_duplicate():
+    logs = Logs("test-twitter", to_cloud=False)
+    listener = TwitterListener(callback=None, logs_to_cloud=False,
+                               dedupe_window=DedupeWindow())
+    tweet = make_tweet(806134244384899072)
+    retweet = make_tweet(806134244384899073)
+    retweet["retweeted_status"] = tweet
+    try:
+        assert listener.handle_data(logs, dumps(tweet)).id == (
+            "806134244384899072")
+        assert listener.handle_data(logs, dumps(tweet)) is None
+        assert listener.handle_data(logs, dumps(retweet)) is None
+        assert listener.dedupe_window.get_stats()["hits"] == 2
+    finally:
+        listener.stop_queue()
@@ -1,12 +1,42 @@
 # -*- coding: utf-8 -*-
 
+from asyncio import Semaphore
+from asyncio import gather
+from asyncio import get_event_loop
+from asyncio import new_event_loop
+from asyncio import set_event_loop
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from functools import partial
 from google.cloud import language
+from hashlib import sha256
 from re import compile
+from re import escape
 from re import IGNORECASE
-from requests import get
+from requests import RequestException
+from threading import Lock
+from threading import local
 from urllib.parse import quote_plus
 
+from django.conf import settings
+
+from .cache import get_company_cache
+from .cache import get_sentiment_cache
+from .company_index import get_company_index
+from .http import get_http_session
 from .logs import Logs
+from .ownership import get_binding_id
+from .ownership import get_company_data_from_rows
+from .ownership import get_ownership_graph
+from .replay import decode_annotations
+from .replay import decode_entities
+from .replay import decode_sentiment
+from .replay import encode_annotations
+from .replay import encode_entities
+from .replay import encode_sentiment
+from .replay import get_replay
+from .singleflight import get_single_flight
+from .tweet import to_tweet
 from .twitter import Twitter
 
 # The URL for a GET request to the Wikidata API. The string parameter is the
@@ -41,24 +71,269 @@ MID_TO_TICKER_QUERY = (
     ' ORDER BY ?companyLabel ?rootLabel ?tickerLabel ?exchangeNameLabel'
     )
 
+# A variant of MID_TO_TICKER_QUERY which looks up multiple companies at once.
+# The string parameter is the list of quoted Freebase IDs of the companies.
+MIDS_TO_TICKER_QUERY = (
+    'SELECT ?mid ?companyLabel ?rootLabel ?tickerLabel ?exchangeNameLabel'
+    ' WHERE {'
+    '  VALUES ?mid { %s } .'  # Freebase IDs to look up.
+    '  ?entity wdt:P646 ?mid .'  # Entity with any of the Freebase IDs.
+    '  ?entity wdt:P176* ?manufacturer .'  # Entity may be product.
+    '  ?manufacturer wdt:P156* ?company .'  # Company may have restructured.
+    '  { ?company p:P414 ?exchange } UNION'  # Company traded on exchange or...
+    '  { ?company wdt:P127+ / wdt:P156* ?root .'  # ... company has owner.
+    '    ?root p:P414 ?exchange } UNION'  # Owner traded on exchange or ...
+    '  { ?company wdt:P749+ / wdt:P156* ?root .'  # ... company has parent.
+    '    ?root p:P414 ?exchange } .'  # Parent traded on exchange.
+    '  VALUES ?exchanges { wd:Q13677 wd:Q82059 } .'  # Whitelist NYSE, NASDAQ.
+    '  ?exchange ps:P414 ?exchanges .'  # Stock exchange is whitelisted.
+    '  ?exchange pq:P249 ?ticker .'  # Get ticker symbol.
+    '  ?exchange ps:P414 ?exchangeName .'  # Get name of exchange.
+    '  FILTER NOT EXISTS { ?company wdt:P31 /'
+    '                               wdt:P279* wd:Q1616075 } .'  # Blacklist TV.
+    '  FILTER NOT EXISTS { ?company wdt:P31 /'
+    '                               wdt:P279* wd:Q11032 } .'  # Blacklist news.
+    '  SERVICE wikibase:label {'
+    '   bd:serviceParam wikibase:language "en" .'  # Use English labels.
+    '  }'
+    ' } GROUP BY ?mid ?companyLabel ?rootLabel ?tickerLabel'
+    ' ?exchangeNameLabel'
+    ' ORDER BY ?mid ?companyLabel ?rootLabel ?tickerLabel ?exchangeNameLabel'
+    )
+
+# A variant of MIDS_TO_TICKER_QUERY which only resolves the companies and their
+# own listings, leaving the owners and parents to the local ownership graph.
+# The string parameter is the list of quoted Freebase IDs of the companies.
+MIDS_TO_COMPANY_QUERY = (
+    'SELECT ?mid ?company ?companyLabel ?tickerLabel ?exchangeNameLabel'
+    ' WHERE {'
+    '  VALUES ?mid { %s } .'  # Freebase IDs to look up.
+    '  ?entity wdt:P646 ?mid .'  # Entity with any of the Freebase IDs.
+    '  ?entity wdt:P176* ?manufacturer .'  # Entity may be product.
+    '  ?manufacturer wdt:P156* ?company .'  # Company may have restructured.
+    '  OPTIONAL {'
+    '   VALUES ?exchanges { wd:Q13677 wd:Q82059 } .'  # Whitelist NYSE, NASDAQ.
+    '   ?company p:P414 ?exchange .'  # Company traded on exchange.
+    '   ?exchange ps:P414 ?exchanges .'  # Stock exchange is whitelisted.
+    '   ?exchange pq:P249 ?ticker .'  # Get ticker symbol.
+    '   ?exchange ps:P414 ?exchangeName .'  # Get name of exchange.
+    '  }'
+    '  FILTER NOT EXISTS { ?company wdt:P31 /'
+    '                               wdt:P279* wd:Q1616075 } .'  # Blacklist TV.
+    '  FILTER NOT EXISTS { ?company wdt:P31 /'
+    '                               wdt:P279* wd:Q11032 } .'  # Blacklist news.
+    '  SERVICE wikibase:label {'
+    '   bd:serviceParam wikibase:language "en" .'  # Use English labels.
+    '  }'
+    ' }'
+    )
+
+# Whether to detect entities and analyze sentiment with one combined request
+# instead of two separate ones.
+COMBINED_ANNOTATE = settings.ANALYSIS_COMBINED_ANNOTATE
+
+# The number of threads per process for blocking analysis requests, i.e. entity
+# detection, sentiment analysis and Wikidata lookups.
+ANALYSIS_THREADS = settings.ANALYSIS_THREADS
+
+# The maximum number of concurrent blocking requests per tweet.
+ANALYSIS_MAX_CONCURRENCY = settings.ANALYSIS_MAX_CONCURRENCY
+
+# The maximum number of Freebase IDs per Wikidata request.
+WIKIDATA_BATCH_SIZE = settings.WIKIDATA_BATCH_SIZE
+
+# The maximum number of compiled mention patterns to keep, one per distinct set
+# of mentioned screen names.
+MENTIONS_PATTERN_CACHE_SIZE = 1024
+
+# The thread pool for blocking analysis requests, created on first use.
+_executor = None
+_executor_lock = Lock()
+
+# The event loops and the Google Cloud Natural Language clients of each
+# thread.
+_threads = local()
+
+
+def get_executor():
+    """Returns the process-wide thread pool for blocking analysis requests."""
+
+    global _executor
+
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=ANALYSIS_THREADS)
+        return _executor
+
+
+def run_coroutine(coroutine):
+    """Runs a coroutine to completion on the event loop of the current thread.
+    The loop is also set as the current one, so that get_event_loop returns
+    it on Python versions before 3.5.3, which don't look for the running loop.
+    """
+
+    loop = getattr(_threads, "loop", None)
+    if loop is None:
+        loop = new_event_loop()
+        set_event_loop(loop)
+        _threads.loop = loop
+    return loop.run_until_complete(coroutine)
+
+
+@lru_cache(maxsize=MENTIONS_PATTERN_CACHE_SIZE)
+def get_mentions_pattern(screen_names):
+    """Compiles one case-insensitive pattern which matches any of the given
+    @mentions. Longer mentions come first, so that the leftmost longest one
+    wins where mentions overlap.
+    """
+
+    screen_names = sorted(screen_names, key=lambda name: (-len(name), name))
+    return compile("|".join(escape(name) for name in screen_names), IGNORECASE)
+
+
+def get_sentiment_client():
+    """Returns the Google Cloud Natural Language client for sentiment analysis
+    on the current thread, so that no httplib2 instance is shared across
+    threads.
+    """
+
+    gcnl_client = getattr(_threads, "gcnl_client", None)
+    if gcnl_client is None:
+        gcnl_client = language.Client()
+        _threads.gcnl_client = gcnl_client
+    return gcnl_client
+
 
 class Analysis:
     """A helper for analyzing company data in text."""
 
-    def __init__(self, logs_to_cloud):
+    def __init__(self, logs_to_cloud, twitter=None):
         self.logs = Logs(name="analysis", to_cloud=logs_to_cloud)
         self.gcnl_client = language.Client()
-        self.twitter = Twitter(logs_to_cloud=logs_to_cloud)
+
+        # Share the Twitter instance of the caller if there is one.
+        if twitter:
+            self.twitter = twitter
+        else:
+            self.twitter = Twitter(logs_to_cloud=logs_to_cloud)
+        self.http_session = get_http_session()
+        self.replay = get_replay()
+        self.company_data_flight = get_single_flight("company_data")
+        self.sentiment_flight = get_single_flight("sentiment")
+        self.company_index = get_company_index()
+        self.company_cache = get_company_cache()
+        self.sentiment_cache = get_sentiment_cache()
 
     def get_company_data(self, mid):
         """Looks up stock ticker information for a company via its Freebase ID.
         """
 
-        query = MID_TO_TICKER_QUERY % mid
+        return self.get_companies_data([mid]).get(mid)
+
+    def get_companies_data(self, mids):
+        """Looks up stock ticker information for multiple companies via their
+        Freebase IDs with a single Wikidata request. Returns a dictionary
+        mapping each MID to its company data.
+        """
+
+        companies_data = {}
+
+        # Use local data where possible and only query for the rest.
+        query_mids = []
+        for mid in mids:
+            if mid in companies_data or mid in query_mids:
+                continue
+
+            hit, datas = self.get_local_company_data(mid)
+            if hit:
+                companies_data[mid] = datas
+                continue
+
+            query_mids.append(mid)
+
+        if not query_mids:
+            return companies_data
+
+        # Share the results of any identical lookups already in flight.
+        companies_data.update(self.company_data_flight.do_many(
+            query_mids, self.query_companies_data))
+
+        return companies_data
+
+    def query_companies_data(self, mids):
+        """Looks up stock ticker information for multiple companies via their
+        Freebase IDs with a single Wikidata request and caches the results.
+        Returns a dictionary mapping each MID to its company data.
+        """
+
+        companies_data = {}
+
+        # Resolve the roots via the ownership graph if we have one, which
+        # avoids the slow property paths in the query.
+        ownership_graph = get_ownership_graph()
+        values = " ".join(['"%s"' % mid for mid in mids])
+        if ownership_graph:
+            query = MIDS_TO_COMPANY_QUERY % values
+        else:
+            query = MIDS_TO_TICKER_QUERY % values
         bindings = self.make_wikidata_request(query)
 
+        # Don't cache failed requests, only empty results.
+        if bindings is None:
+            self.logs.debug("No company data found for MIDs: %s", mids)
+            for mid in mids:
+                companies_data[mid] = None
+            return companies_data
+
+        # Split the bindings by MID, keeping their order within each MID.
+        mid_bindings = {}
+        for binding in bindings:
+            try:
+                mid = binding["mid"]["value"]
+            except KeyError:
+                self.logs.warn("Skipping binding without MID: %s", binding)
+                continue
+            mid_bindings.setdefault(mid, []).append(binding)
+
+        for mid in mids:
+            if ownership_graph:
+                datas = self.get_graph_company_datas(
+                    ownership_graph, mid_bindings.get(mid))
+            else:
+                datas = self.get_company_datas(mid_bindings.get(mid))
+            if self.company_cache:
+                self.company_cache.set(mid, datas)
+            companies_data[mid] = datas
+
+        return companies_data
+
+    def get_local_company_data(self, mid):
+        """Looks up company data without a network request, first in the
+        offline index and then in the cache, which also remembers MIDs without
+        a company. Returns a (hit, data) tuple.
+        """
+
+        if self.company_index:
+            hit, datas = self.company_index.get(mid)
+            if hit:
+                self.logs.debug("Using indexed company data for MID: %s %s",
+                                mid, datas)
+                return (True, datas)
+
+        if self.company_cache:
+            hit, datas = self.company_cache.get(mid)
+            if hit:
+                self.logs.debug("Using cached company data for MID: %s %s",
+                                mid, datas)
+                return (True, datas)
+
+        return (False, None)
+
+    def get_company_datas(self, bindings):
+        """Collects the company data from Wikidata response bindings."""
+
         if not bindings:
-            self.logs.debug("No company data found for MID: %s" % mid)
+            self.logs.debug("No company data found in bindings.")
             return None
 
         # Collect the data from the response.
@@ -94,64 +369,93 @@ class Analysis:
 
             # Add to the list unless we already have the same entry.
             if data not in datas:
-                self.logs.debug("Adding company data: %s" % data)
+                self.logs.debug("Adding company data: %s", data)
                 datas.append(data)
             else:
-                self.logs.warn("Skipping duplicate company data: %s" % data)
+                self.logs.warn("Skipping duplicate company data: %s", data)
 
         return datas
 
-    def find_companies(self, tweet):
-        """Finds mentions of companies in a tweet."""
+    def get_graph_company_datas(self, ownership_graph, bindings):
+        """Collects the company data from MIDS_TO_COMPANY_QUERY response
+        bindings, with the roots from the ownership graph.
+        """
 
-        if not tweet:
-            self.logs.warn("No tweet to find companies.")
+        if not bindings:
+            self.logs.debug("No company data found in bindings.")
             return None
 
-        # Use the text of the tweet with any mentions expanded to improve
-        # entity detection.
-        text = self.get_expanded_text(tweet)
-        if not text:
-            self.logs.error("Failed to get text from tweet: %s" % tweet)
-            return None
+        # Collect the (company, root, ticker, exchange) labels.
+        rows = []
+        companies = []
+        for binding in bindings:
+            try:
+                company = get_binding_id(binding, "company")
+                name = binding["companyLabel"]["value"]
+            except KeyError:
+                self.logs.warn("Malformed company binding: %s", binding)
+                continue
 
-        # Run entity detection.
-        document = self.gcnl_client.document_from_text(text)
-        entities = document.analyze_entities()
-        self.logs.debug("Found entities: %s" %
-                        self.entities_tostring(entities))
+            try:
+                ticker = binding["tickerLabel"]["value"]
+                exchange = binding["exchangeNameLabel"]["value"]
+                rows.append((name, None, ticker, exchange))
+            except KeyError:
+                pass
 
-        # Collect all entities which are publicly traded companies, i.e.
-        # entities which have a known stock ticker symbol.
-        companies = []
-        for entity in entities:
+            if company not in companies:
+                companies.append(company)
+                rows.extend(ownership_graph.get_root_rows(company, name))
+
+        datas = get_company_data_from_rows(rows)
+        self.logs.debug("Collected company data: %s", datas)
+
+        return datas
 
-            # Use the Freebase ID of the entity to find company data. Skip any
-            # entity which doesn't have a Freebase ID (unless we find one via
-            # the Twitter handle).
+    def find_companies(self, tweet):
+        """Finds mentions of companies in a tweet record or raw tweet data."""
+
+        return run_coroutine(AsyncAnalysis(self).find_companies(tweet))
+
+    def get_mid_entities(self, entities):
+        """Returns the (name, MID) pairs of all entities which have a Freebase
+        ID.
+        """
+
+        mid_entities = []
+        for entity in entities:
             name = entity.name
             metadata = entity.metadata
             try:
                 mid = metadata["mid"]
             except KeyError:
-                self.logs.debug("No MID found for entity: %s" % name)
+                self.logs.debug("No MID found for entity: %s", name)
                 continue
+            mid_entities.append((name, mid))
 
-            company_data = self.get_company_data(mid)
+        return mid_entities
+
+    def collect_companies(self, mid_entities, companies_data, sentiment):
+        """Collects all entities which are publicly traded companies, i.e.
+        entities which have a known stock ticker symbol, in entity order.
+        """
+
+        companies = []
+        for name, mid in mid_entities:
+            company_data = companies_data.get(mid)
 
             # Skip any entity for which we can't find any company data.
             if not company_data:
-                self.logs.debug("No company data found for entity: %s (%s)" %
-                                (name, mid))
+                self.logs.debug("No company data found for entity: %s (%s)",
+                                name, mid)
                 continue
-            self.logs.debug("Found company data: %s" % company_data)
+            self.logs.debug("Found company data: %s", company_data)
 
             for company in company_data:
 
-                # Extract and add a sentiment score.
-                sentiment = self.get_sentiment(text)
-                self.logs.debug("Using sentiment for company: %s %s" %
-                                (sentiment, company))
+                # Add the sentiment score.
+                self.logs.debug("Using sentiment for company: %s %s",
+                                sentiment, company)
                 company["sentiment"] = sentiment
 
                 # Add the company to the list unless we already have the same
@@ -161,7 +465,7 @@ class Analysis:
                     companies.append(company)
                 else:
                     self.logs.warn(
-                        "Skipping company with duplicate ticker: %s" % company)
+                        "Skipping company with duplicate ticker: %s", company)
 
         return companies
 
@@ -174,13 +478,13 @@ class Analysis:
             self.logs.warn("No tweet to expand text.")
             return None
 
-        try:
-            text = self.twitter.get_tweet_text(tweet)
-            mentions = tweet["entities"]["user_mentions"]
-        except KeyError:
-            self.logs.error("Malformed tweet: %s" % tweet)
+        # Use the tweet record, which is logged if the data is malformed.
+        tweet = to_tweet(tweet, self.logs)
+        if not tweet:
             return None
 
+        text = tweet.text
+        mentions = tweet.mentions
         if not text:
             self.logs.warn("Empty text.")
             return None
@@ -189,40 +493,94 @@ class Analysis:
             self.logs.debug("No mentions.")
             return text
 
-        self.logs.debug("Using mentions: %s" % mentions)
-        for mention in mentions:
-            try:
-                screen_name = "@%s" % mention["screen_name"]
-                name = mention["name"]
-            except KeyError:
-                self.logs.warn("Malformed mention: %s" % mention)
-                continue
+        self.logs.debug("Using mentions: %s", mentions)
+        names = {}
+        for screen_name, name in mentions:
+            screen_name = "@%s" % screen_name
+            self.logs.debug("Expanding mention: %s %s", screen_name, name)
+            names.setdefault(screen_name.lower(), name)
+
+        if not names:
+            return text
+
+        # Replace all mentions in a single pass, so that expanded names are
+        # never expanded again.
+        pattern = get_mentions_pattern(frozenset(names))
+        return pattern.sub(lambda match: names[match.group(0).lower()], text)
+
+    def analyze_entities(self, text):
+        """Detects the entities in text. In combined mode, the document
+        sentiment is analyzed with the same request. Returns a tuple of the
+        entities and the sentiment score, which is None if it wasn't analyzed.
+        """
+
+        document = self.gcnl_client.document_from_text(text)
 
-            self.logs.debug("Expanding mention: %s %s" % (screen_name, name))
-            pattern = compile(screen_name, IGNORECASE)
-            text = pattern.sub(name, text)
+        if COMBINED_ANNOTATE:
+            # Skip the sentiment if we already know it for this text.
+            key = self.get_text_key(text)
+            hit, score = self.sentiment_cache.get(key)
 
-        return text
+            try:
+                annotations = self.replay.call(
+                    "language",
+                    "annotate_text sentiment=%s %s" % (not hit, text),
+                    partial(document.annotate_text, include_syntax=False,
+                            include_entities=True, include_sentiment=not hit),
+                    encode_annotations, decode_annotations)
+            except Exception:
+                # Fall back to separate requests for entities and sentiment.
+                self.logs.warn("Failed to annotate text: %s\n%s",
+                               text, self.logs.format_exception())
+            else:
+                if not hit:
+                    sentiment = annotations.sentiment
+                    self.logs.debug(
+                        "Sentiment score and magnitude for text: %s %s \"%s\"",
+                        sentiment.score, sentiment.magnitude, text)
+                    score = sentiment.score
+                    self.sentiment_cache.set(key, score)
+                return (annotations.entities, score)
+
+        entities = self.replay.call(
+            "language", "analyze_entities %s" % text,
+            document.analyze_entities, encode_entities, decode_entities)
+        return (entities, None)
 
     def make_wikidata_request(self, query):
-        """Makes a request to the Wikidata SPARQL API."""
+        """Makes a request to the Wikidata SPARQL API, or replays a recorded
+        response.
+        """
+
+        return self.replay.call("wikidata", query,
+                                partial(self.request_wikidata, query))
+
+    def request_wikidata(self, query):
+        """Sends a query to the Wikidata SPARQL API and returns the bindings.
+        """
 
         query_url = WIKIDATA_QUERY_URL % quote_plus(query)
-        self.logs.debug("Wikidata query: %s" % query_url)
+        self.logs.debug("Wikidata query: %s", query_url)
+
+        try:
+            response = self.http_session.get(query_url)
+        except RequestException:
+            self.logs.error("Failed Wikidata request: %s\n%s",
+                            query_url, self.logs.format_exception())
+            return None
 
-        response = get(query_url)
         try:
             response_json = response.json()
         except ValueError:
-            self.logs.error("Failed to decode JSON response: %s" % response)
+            self.logs.error("Failed to decode JSON response: %s", response)
             return None
-        self.logs.debug("Wikidata response: %s" % response_json)
+        self.logs.debug("Wikidata response: %s", response_json)
 
         try:
             results = response_json["results"]
             bindings = results["bindings"]
         except KeyError:
-            self.logs.error("Malformed Wikidata response: %s" % response_json)
+            self.logs.error("Malformed Wikidata response: %s", response_json)
             return None
 
         return bindings
@@ -259,18 +617,134 @@ class Analysis:
             entity.salience,
             mentions)
 
-    def get_sentiment(self, text):
+    def get_sentiment(self, text, get_client=None):
         """Extracts a sentiment score [-1, 1] from text."""
 
         if not text:
             self.logs.warn("No sentiment for empty text.")
             return 0
 
-        document = self.gcnl_client.document_from_text(text)
-        sentiment = document.analyze_sentiment()
+        # Reuse the score for identical texts, e.g. from retweets.
+        key = self.get_text_key(text)
+        hit, score = self.sentiment_cache.get(key)
+        if hit:
+            self.logs.debug("Using cached sentiment score for text: %s \"%s\"",
+                            score, text)
+            return score
+
+        # Share the result of an identical request already in flight.
+        return self.sentiment_flight.do(key, self.analyze_sentiment, text,
+                                        get_client)
+
+    def analyze_sentiment(self, text, get_client=None):
+        """Requests the sentiment score for text and caches it."""
+
+        gcnl_client = get_client() if get_client else self.gcnl_client
+        document = gcnl_client.document_from_text(text)
+        sentiment = self.replay.call(
+            "language", "analyze_sentiment %s" % text,
+            document.analyze_sentiment, encode_sentiment, decode_sentiment)
 
         self.logs.debug(
-            "Sentiment score and magnitude for text: %s %s \"%s\"" %
-            (sentiment.score, sentiment.magnitude, text))
+            "Sentiment score and magnitude for text: %s %s \"%s\"",
+            sentiment.score, sentiment.magnitude, text)
 
+        self.sentiment_cache.set(self.get_text_key(text), sentiment.score)
         return sentiment.score
+
+    def get_text_key(self, text):
+        """Returns the key for caching results by text."""
+
+        return sha256(text.encode("utf-8")).hexdigest()
+
+
+class AsyncAnalysis:
+    """An asyncio variant of the analysis pipeline which runs sentiment
+    analysis and Wikidata lookups concurrently.
+    """
+
+    def __init__(self, analysis, max_concurrency=ANALYSIS_MAX_CONCURRENCY):
+        self.analysis = analysis
+        self.logs = analysis.logs
+        self.max_concurrency = max_concurrency
+        self.semaphore = None
+
+    async def run(self, function, *args):
+        """Runs a blocking function on the analysis thread pool, limiting the
+        number of concurrent calls.
+        """
+
+        # Create the semaphore lazily so that it uses the loop of the thread.
+        if self.semaphore is None:
+            self.semaphore = Semaphore(self.max_concurrency)
+
+        async with self.semaphore:
+            return await get_event_loop().run_in_executor(
+                get_executor(), partial(function, *args))
+
+    async def get_companies_data(self, mids):
+        """Looks up company data for multiple Freebase IDs with concurrent
+        batched Wikidata requests.
+        """
+
+        unique_mids = []
+        for mid in mids:
+            if mid not in unique_mids:
+                unique_mids.append(mid)
+
+        batches = [unique_mids[start:start + WIKIDATA_BATCH_SIZE] for
+                   start in range(0, len(unique_mids), WIKIDATA_BATCH_SIZE)]
+        results = await gather(*[
+            self.run(self.analysis.get_companies_data, batch)
+            for batch in batches])
+
+        companies_data = {}
+        for result in results:
+            companies_data.update(result)
+
+        return companies_data
+
+    async def get_sentiment(self, text):
+        """Extracts a sentiment score from text on the analysis thread pool."""
+
+        return await self.run(self.analysis.get_sentiment, text,
+                              get_sentiment_client)
+
+    async def find_companies(self, tweet):
+        """Finds mentions of companies in a tweet."""
+
+        if not tweet:
+            self.logs.warn("No tweet to find companies.")
+            return None
+        tweet = to_tweet(tweet, self.logs)
+
+        # Use the text of the tweet with any mentions expanded to improve
+        # entity detection.
+        text = self.analysis.get_expanded_text(tweet)
+        if not text:
+            self.logs.error("Failed to get text from tweet: %s", tweet)
+            return None
+
+        # Run entity detection, which may include sentiment analysis.
+        entities, sentiment = await self.run(self.analysis.analyze_entities,
+                                             text)
+        self.logs.debug("Found entities: %s",
+                        self.analysis.entities_tostring(entities))
+
+        # Use the Freebase IDs of the entities to find company data. Only
+        # pay for a sentiment request if there are any.
+        mid_entities = self.analysis.get_mid_entities(entities)
+        if not mid_entities:
+            return []
+
+        # Look up all companies while waiting for the sentiment, unless we
+        # already have it.
+        mids = [mid for _, mid in mid_entities]
+        if sentiment is None:
+            companies_data, sentiment = await gather(
+                self.get_companies_data(mids), self.get_sentiment(text))
+        else:
+            companies_data = await self.get_companies_data(mids)
+
+        return self.analysis.collect_companies(mid_entities, companies_data,
+                                               sentiment)
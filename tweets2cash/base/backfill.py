@@ -0,0 +1,165 @@
+# -*- coding: utf-8 -*-
+
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import as_completed
+
+from django.conf import settings
+
+from .ratelimit import get_budget
+
+# The number of threads paging timelines and looking up tweets.
+BACKFILL_THREADS = settings.BACKFILL_THREADS
+
+# The number of user timeline requests allowed per rate limit window.
+BACKFILL_TIMELINE_BUDGET = settings.BACKFILL_TIMELINE_BUDGET
+
+# The number of status lookup requests allowed per rate limit window.
+BACKFILL_LOOKUP_BUDGET = settings.BACKFILL_LOOKUP_BUDGET
+
+# The maximum number of tweets per user timeline page.
+TIMELINE_PAGE_SIZE = 200
+
+# The maximum number of tweets per status lookup request.
+LOOKUP_BATCH_SIZE = 100
+
+# The number of times to retry a failed status lookup request.
+LOOKUP_RETRIES = 1
+
+
+class Backfill:
+    """Fetches the tweets of several users since given IDs. The timelines are
+    paged concurrently for tweet IDs only, and the tweets are then looked up
+    in batches in ID order, so that only the IDs are held in memory.
+    """
+
+    def __init__(self, twitter_api, logs, num_threads=BACKFILL_THREADS,
+                 timeline_budget=None, lookup_budget=None):
+        self.twitter_api = twitter_api
+        self.logs = logs
+        self.num_threads = num_threads
+        self.timeline_budget = timeline_budget or get_budget(
+            "user_timeline", BACKFILL_TIMELINE_BUDGET)
+        self.lookup_budget = lookup_budget or get_budget(
+            "statuses_lookup", BACKFILL_LOOKUP_BUDGET)
+
+    def get_timeline_ids(self, user_id, since_id):
+        """Pages through the timeline of a user and returns the IDs of all
+        tweets since the specified ID, including it.
+        """
+
+        # Include the first ID by passing along an earlier one.
+        since_id = int(since_id) - 1
+
+        tweet_ids = []
+        max_id = None
+        while True:
+            self.timeline_budget.acquire()
+            statuses = self.twitter_api.user_timeline(
+                user_id=user_id, since_id=since_id, max_id=max_id,
+                count=TIMELINE_PAGE_SIZE, trim_user=True)
+            if not statuses:
+                break
+
+            tweet_ids.extend(status.id for status in statuses)
+            max_id = min(tweet_ids) - 1
+
+        self.logs.debug("Found %d tweets by user: %s", len(tweet_ids),
+                        user_id)
+        return tweet_ids
+
+    def lookup(self, tweet_ids):
+        """Looks up a batch of tweets by ID and returns their raw JSON in ID
+        order. Deleted tweets are left out.
+        """
+
+        self.lookup_budget.acquire()
+
+        # Use tweet_mode=extended so we get the full text.
+        statuses = self.twitter_api.statuses_lookup(tweet_ids,
+                                                    tweet_mode="extended")
+
+        # Use the raw JSON, just like the streaming API.
+        tweets = [status._json for status in statuses]
+        return sorted(tweets, key=lambda tweet: tweet["id"])
+
+    def safe_lookup(self, tweet_ids):
+        """Looks up a batch of tweets and retries if that fails. Returns None
+        for batches which keep failing, after logging them.
+        """
+
+        for _ in range(LOOKUP_RETRIES + 1):
+            try:
+                return self.lookup(tweet_ids)
+            except Exception:
+                self.logs.error("Failed to look up %d tweets from: %s",
+                                len(tweet_ids), tweet_ids[0])
+                self.logs.catch()
+        return None
+
+    def get_tweet_ids(self, executor, since_ids, failed_user_ids):
+        """Pages the timelines concurrently and returns the users of all
+        tweets found by ID. Users whose timelines fail are logged, added to
+        the failed users and skipped.
+        """
+
+        futures = {executor.submit(self.get_timeline_ids, user_id,
+                                   since_id): user_id
+                   for user_id, since_id in since_ids.items()}
+
+        user_ids = {}
+        for future in as_completed(futures):
+            user_id = futures[future]
+            try:
+                for tweet_id in future.result():
+                    user_ids[tweet_id] = user_id
+            except Exception:
+                self.logs.error("Failed to page timeline of user: %s",
+                                user_id)
+                self.logs.catch()
+                failed_user_ids.add(user_id)
+        return user_ids
+
+    def get_results(self, batch, future, user_ids, failed_user_ids):
+        """Returns the tweets of a looked up batch. The users of the tweets in
+        a failed batch are added to the failed users and the batch is
+        skipped, so that the rest of the backfill goes on.
+        """
+
+        tweets = future.result()
+        if tweets is None:
+            failed_user_ids.update(user_ids[tweet_id] for tweet_id in batch
+                                   if user_ids.get(tweet_id) is not None)
+            return []
+        return tweets
+
+    def get_tweets(self, since_ids, tweet_ids=(), failed_user_ids=None):
+        """Yields the raw JSON of the tweets since the IDs by user, and of the
+        tweets with the known IDs, in ID order. A few batches are looked up
+        ahead while the earlier ones are consumed. Users some of whose
+        tweets couldn't be fetched are added to the failed users.
+        """
+
+        if failed_user_ids is None:
+            failed_user_ids = set()
+
+        with ThreadPoolExecutor(max_workers=self.num_threads) as executor:
+            user_ids = self.get_tweet_ids(executor, since_ids,
+                                          failed_user_ids)
+            for tweet_id in tweet_ids:
+                user_ids.setdefault(int(tweet_id), None)
+            all_ids = sorted(user_ids)
+            self.logs.info("Backfilling %d tweets.", len(all_ids))
+
+            pending = deque()
+            for start in range(0, len(all_ids), LOOKUP_BATCH_SIZE):
+                batch = all_ids[start:start + LOOKUP_BATCH_SIZE]
+                pending.append((batch, executor.submit(self.safe_lookup,
+                                                       batch)))
+                if len(pending) >= self.num_threads:
+                    yield from self.get_results(*pending.popleft(), user_ids,
+                                                failed_user_ids)
+
+            while pending:
+                yield from self.get_results(*pending.popleft(), user_ids,
+                                            failed_user_ids)
@@ -0,0 +1,254 @@
+# -*- coding: utf-8 -*-
+
+from collections import OrderedDict
+from simplejson import dumps
+from simplejson import loads
+from sqlite3 import connect
+from threading import Lock
+from threading import local
+from time import time
+
+from django.conf import settings
+
+# Whether to cache company data looked up via Wikidata.
+COMPANY_CACHE_ENABLED = settings.COMPANY_CACHE_ENABLED
+
+# The path to the SQLite database shared by all threads and processes.
+COMPANY_CACHE_PATH = settings.COMPANY_CACHE_PATH
+
+# The time in seconds after which cached company data expires.
+COMPANY_CACHE_TTL_S = settings.COMPANY_CACHE_TTL_S
+
+# The time in seconds after which a cached "no company" result expires.
+COMPANY_CACHE_NEGATIVE_TTL_S = settings.COMPANY_CACHE_NEGATIVE_TTL_S
+
+# The maximum number of entries to keep before evicting the oldest ones.
+COMPANY_CACHE_MAX_ENTRIES = settings.COMPANY_CACHE_MAX_ENTRIES
+
+# The number of writes after which to evict expired and excess entries.
+COMPANY_CACHE_EVICT_INTERVAL = settings.COMPANY_CACHE_EVICT_INTERVAL
+
+# The maximum number of sentiment scores to keep in memory.
+SENTIMENT_CACHE_MAX_ENTRIES = settings.SENTIMENT_CACHE_MAX_ENTRIES
+
+# The time in seconds to wait for a lock held by another process.
+SQLITE_TIMEOUT_S = 5
+
+CREATE_TABLE_QUERY = (
+    "CREATE TABLE IF NOT EXISTS companies ("
+    " mid TEXT PRIMARY KEY,"
+    " data TEXT,"
+    " created_at REAL NOT NULL,"
+    " expires_at REAL NOT NULL)")
+
+CREATE_INDEX_QUERY = (
+    "CREATE INDEX IF NOT EXISTS companies_created_at"
+    " ON companies (created_at)")
+
+
+class CompanyCache:
+    """A persistent on-disk cache mapping Freebase IDs to company data.
+
+    Entries expire after a TTL. A lookup which found no company is cached as
+    well (with its own, usually shorter, TTL) so that entities which aren't
+    companies don't trigger repeated queries. The oldest entries are evicted
+    once the cache grows beyond its maximum size, checked every number of
+    writes so that the table isn't counted on each one.
+    """
+
+    def __init__(self, path=COMPANY_CACHE_PATH, ttl_s=COMPANY_CACHE_TTL_S,
+                 negative_ttl_s=COMPANY_CACHE_NEGATIVE_TTL_S,
+                 max_entries=COMPANY_CACHE_MAX_ENTRIES,
+                 evict_interval=COMPANY_CACHE_EVICT_INTERVAL):
+        self.path = path
+        self.ttl_s = ttl_s
+        self.negative_ttl_s = negative_ttl_s
+        self.max_entries = max_entries
+        self.evict_interval = evict_interval
+        self.connections = local()
+        self.stats_lock = Lock()
+        self.writes = 0
+        self.hits = 0
+        self.negative_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        # Create the schema up front so that readers never see a missing table.
+        connection = self.get_connection()
+        connection.execute(CREATE_TABLE_QUERY)
+        connection.execute(CREATE_INDEX_QUERY)
+
+    def get_connection(self):
+        """Returns the SQLite connection for the current thread."""
+
+        connection = getattr(self.connections, "connection", None)
+        if connection is None:
+            connection = connect(self.path, timeout=SQLITE_TIMEOUT_S,
+                                 isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self.connections.connection = connection
+        return connection
+
+    def get(self, mid):
+        """Looks up the cached company data for a Freebase ID.
+
+        Returns a (hit, data) tuple. The data is None for cached lookups which
+        found no company.
+        """
+
+        row = self.get_connection().execute(
+            "SELECT data FROM companies WHERE mid = ? AND expires_at > ?",
+            (mid, time())).fetchone()
+
+        with self.stats_lock:
+            if row is None:
+                self.misses += 1
+                return (False, None)
+
+            if row[0] is None:
+                self.negative_hits += 1
+                return (True, None)
+
+            self.hits += 1
+
+        return (True, loads(row[0]))
+
+    def set(self, mid, data):
+        """Caches the company data for a Freebase ID. Use None as the data to
+        remember that there is no company.
+        """
+
+        now = time()
+        if data:
+            value = dumps(data)
+            expires_at = now + self.ttl_s
+        else:
+            value = None
+            expires_at = now + self.negative_ttl_s
+
+        connection = self.get_connection()
+        connection.execute(
+            "INSERT OR REPLACE INTO companies (mid, data, created_at,"
+            " expires_at) VALUES (?, ?, ?, ?)", (mid, value, now, expires_at))
+
+        with self.stats_lock:
+            self.writes += 1
+            due = self.writes % self.evict_interval == 0
+        if due:
+            self.evict(connection, now)
+
+    def evict(self, connection, now):
+        """Removes expired entries and the oldest entries beyond the maximum
+        size.
+        """
+
+        evicted = connection.execute(
+            "DELETE FROM companies WHERE expires_at <= ?", (now,)).rowcount
+
+        count = connection.execute(
+            "SELECT COUNT(*) FROM companies").fetchone()[0]
+        if count > self.max_entries:
+            evicted += connection.execute(
+                "DELETE FROM companies WHERE mid IN (SELECT mid FROM companies"
+                " ORDER BY created_at LIMIT ?)",
+                (count - self.max_entries,)).rowcount
+
+        if evicted > 0:
+            with self.stats_lock:
+                self.evictions += evicted
+
+    def clear(self):
+        """Removes all entries."""
+
+        self.get_connection().execute("DELETE FROM companies")
+
+    def get_stats(self):
+        """Returns the hit and miss counters for this process."""
+
+        with self.stats_lock:
+            return {"hits": self.hits,
+                    "negative_hits": self.negative_hits,
+                    "misses": self.misses,
+                    "evictions": self.evictions}
+
+
+class LRUCache:
+    """A thread-safe in-memory cache which evicts the least recently used
+    entries beyond its maximum size.
+    """
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.lock = Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        """Looks up the cached value for a key. Returns a (hit, value) tuple.
+        """
+
+        with self.lock:
+            try:
+                value = self.entries[key]
+            except KeyError:
+                self.misses += 1
+                return (False, None)
+
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return (True, value)
+
+    def set(self, key, value):
+        """Caches the value for a key."""
+
+        with self.lock:
+            self.entries[key] = value
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        """Removes all entries."""
+
+        with self.lock:
+            self.entries.clear()
+
+    def get_stats(self):
+        """Returns the hit and miss counters."""
+
+        with self.lock:
+            return {"hits": self.hits,
+                    "misses": self.misses,
+                    "evictions": self.evictions,
+                    "size": len(self.entries)}
+
+
+# The cache instances shared by all threads in this process.
+_company_cache = None
+_company_cache_lock = Lock()
+_sentiment_cache = LRUCache(SENTIMENT_CACHE_MAX_ENTRIES)
+
+
+def get_company_cache():
+    """Returns the process-wide company cache, or None if it's disabled."""
+
+    global _company_cache
+
+    if not COMPANY_CACHE_ENABLED:
+        return None
+
+    with _company_cache_lock:
+        if _company_cache is None:
+            _company_cache = CompanyCache()
+        return _company_cache
+
+
+def get_sentiment_cache():
+    """Returns the process-wide cache of sentiment scores keyed by text hash.
+    """
+
+    return _sentiment_cache
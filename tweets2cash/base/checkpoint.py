@@ -0,0 +1,229 @@
+# -*- coding: utf-8 -*-
+
+from os import fsync
+from os import replace
+from threading import Lock
+from time import time
+
+from django.conf import settings
+
+# The path to the log of the highest processed tweet ID per user.
+CHECKPOINT_PATH = settings.CHECKPOINT_PATH
+
+# The number of checkpoint updates after which to sync the log to disk.
+CHECKPOINT_SYNC_COUNT = settings.CHECKPOINT_SYNC_COUNT
+
+# The maximum time in seconds between syncs of the log to disk.
+CHECKPOINT_SYNC_S = settings.CHECKPOINT_SYNC_S
+
+
+class Checkpoints:
+    """Durably records the highest processed tweet ID per user. Updates are
+    appended to a log which is synced to disk in batches, after a number of
+    updates or some time. The log is compacted when it's loaded.
+
+    Tweets are tracked from when they begin processing until they end, and a
+    checkpoint only moves past a tweet once it and all earlier tweets of the
+    user have ended. The checkpoints of frozen users don't move, so that the
+    tweets since then are fetched again by the next catch-up.
+    """
+
+    def __init__(self, path=CHECKPOINT_PATH, sync_count=CHECKPOINT_SYNC_COUNT,
+                 sync_s=CHECKPOINT_SYNC_S):
+        self.path = path
+        self.sync_count = sync_count
+        self.sync_s = sync_s
+        self.lock = Lock()
+        self.since_ids = {}
+        self.in_flight = {}
+        self.in_flight_by_user = {}
+        self.ended = {}
+        self.frozen = set()
+        self.log_file = None
+        self.pending = 0
+        self.syncs = 0
+        self.last_sync = time()
+        self.load()
+
+    def load(self):
+        """Reads the highest tweet ID per user from the log and rewrites it
+        with one line per user. Lines cut short by a crash are skipped.
+        """
+
+        try:
+            with open(self.path, "r", encoding="utf-8") as log_file:
+                for line in log_file:
+                    parts = line.split()
+                    if (not line.endswith("\n") or len(parts) != 2 or
+                            not parts[1].isdigit()):
+                        continue
+                    user_id, tweet_id = parts[0], int(parts[1])
+                    if tweet_id > self.since_ids.get(user_id, 0):
+                        self.since_ids[user_id] = tweet_id
+        except FileNotFoundError:
+            pass
+
+        compact_path = "%s.tmp" % self.path
+        with open(compact_path, "w", encoding="utf-8") as compact_file:
+            for user_id, tweet_id in self.since_ids.items():
+                compact_file.write("%s %d\n" % (user_id, tweet_id))
+            compact_file.flush()
+            fsync(compact_file.fileno())
+        replace(compact_path, self.path)
+
+        self.log_file = open(self.path, "a", encoding="utf-8")
+
+    def get(self, user_id):
+        """Returns the highest processed tweet ID of a user, or None."""
+
+        with self.lock:
+            return self.since_ids.get(str(user_id))
+
+    def get_all(self):
+        """Returns the highest processed tweet IDs by user."""
+
+        with self.lock:
+            return dict(self.since_ids)
+
+    def update(self, user_id, tweet_id):
+        """Records a processed tweet if it's newer than the checkpoint of its
+        user. Returns whether the checkpoint moved.
+        """
+
+        with self.lock:
+            return self.record(str(user_id), int(tweet_id))
+
+    def record(self, user_id, tweet_id):
+        """Moves the checkpoint of a user forward to a tweet and appends it to
+        the log. Returns whether the checkpoint moved. Must be called with
+        the lock held.
+        """
+
+        if tweet_id <= self.since_ids.get(user_id, 0):
+            return False
+
+        self.since_ids[user_id] = tweet_id
+        self.log_file.write("%s %d\n" % (user_id, tweet_id))
+        self.pending += 1
+        if (self.pending >= self.sync_count or
+                time() - self.last_sync >= self.sync_s):
+            self.fsync()
+        return True
+
+    def begin(self, user_id, tweet_id):
+        """Tracks a tweet which starts processing."""
+
+        user_id = str(user_id)
+        tweet_id = int(tweet_id)
+        with self.lock:
+            self.in_flight[tweet_id] = user_id
+            self.in_flight_by_user.setdefault(user_id, set()).add(tweet_id)
+
+    def end(self, tweet_id):
+        """Tracks a tweet which finished processing and moves the checkpoint
+        of its user as far as all earlier tweets have ended.
+        """
+
+        tweet_id = int(tweet_id)
+        with self.lock:
+            user_id = self.in_flight.pop(tweet_id, None)
+            if user_id is None:
+                return
+
+            user_in_flight = self.in_flight_by_user[user_id]
+            user_in_flight.discard(tweet_id)
+            if not user_in_flight:
+                del self.in_flight_by_user[user_id]
+            self.ended.setdefault(user_id, []).append(tweet_id)
+            self.advance(user_id)
+
+    def advance(self, user_id):
+        """Moves the checkpoint of a user to the highest ended tweet below
+        any tweet still in flight. For frozen users, only that tweet is kept
+        for when they are thawed. Must be called with the lock held.
+        """
+
+        if user_id not in self.ended:
+            return
+
+        user_in_flight = self.in_flight_by_user.get(user_id)
+        lowest = min(user_in_flight) if user_in_flight else None
+        ended = self.ended[user_id]
+        done = [tweet_id for tweet_id in ended
+                if lowest is None or tweet_id < lowest]
+        if not done:
+            return
+
+        remaining = [tweet_id for tweet_id in ended if tweet_id not in done]
+        if user_id in self.frozen:
+            # Only keep the highest, where the checkpoint moves when thawed.
+            self.ended[user_id] = [max(done)] + remaining
+            return
+
+        self.record(user_id, max(done))
+        if remaining:
+            self.ended[user_id] = remaining
+        else:
+            del self.ended[user_id]
+
+    def freeze(self, user_ids):
+        """Stops the checkpoints of users from moving."""
+
+        with self.lock:
+            self.frozen.update(str(user_id) for user_id in user_ids)
+
+    def thaw(self, user_ids):
+        """Lets the checkpoints of users move again, as far as their tweets
+        have ended.
+        """
+
+        with self.lock:
+            for user_id in user_ids:
+                user_id = str(user_id)
+                self.frozen.discard(user_id)
+                self.advance(user_id)
+
+    def sync(self):
+        """Syncs any pending updates to disk."""
+
+        with self.lock:
+            if self.pending:
+                self.fsync()
+
+    def fsync(self):
+        """Flushes the log and syncs it to disk. Must be called with the lock
+        held.
+        """
+
+        self.log_file.flush()
+        fsync(self.log_file.fileno())
+        self.pending = 0
+        self.syncs += 1
+        self.last_sync = time()
+
+    def get_stats(self):
+        """Returns the number of users, pending updates, syncs, tweets in
+        flight and frozen users.
+        """
+
+        with self.lock:
+            return {"users": len(self.since_ids),
+                    "pending": self.pending,
+                    "syncs": self.syncs,
+                    "in_flight": len(self.in_flight),
+                    "frozen": len(self.frozen)}
+
+
+# The process-wide checkpoints, loaded on first use.
+_checkpoints = None
+_checkpoints_lock = Lock()
+
+
+def get_checkpoints():
+    """Returns the process-wide checkpoints."""
+
+    global _checkpoints
+    with _checkpoints_lock:
+        if _checkpoints is None:
+            _checkpoints = Checkpoints()
+        return _checkpoints
@@ -0,0 +1,109 @@
+# -*- coding: utf-8 -*-
+
+from contextlib import contextmanager
+from threading import Lock
+from threading import local
+from time import time
+
+
+class ClientRegistry:
+    """Keeps one instance of each registered client per thread. Clients are
+    created lazily on first use in a thread and reused afterwards, unless
+    they are too old, their health check fails or they raised an error while
+    in use.
+    """
+
+    def __init__(self):
+        self.factories = {}
+        self.checks = {}
+        self.max_ages_s = {}
+        self.threads = local()
+        self.stats_lock = Lock()
+        self.stats = {}
+
+    def register(self, name, factory, check=None, max_age_s=None):
+        """Registers a function which creates a client. The optional check
+        function is called with a client before each use and returns whether
+        the client is still healthy. Clients older than the optional maximum
+        age are replaced.
+        """
+
+        self.factories[name] = factory
+        self.checks[name] = check
+        self.max_ages_s[name] = max_age_s
+        with self.stats_lock:
+            self.stats[name] = {"created": 0, "reused": 0, "discarded": 0}
+
+    def get_clients(self):
+        """Returns the (client, creation time) pairs of the current thread by
+        name.
+        """
+
+        clients = getattr(self.threads, "clients", None)
+        if clients is None:
+            clients = {}
+            self.threads.clients = clients
+        return clients
+
+    def count(self, name, stat):
+        """Increments a counter for a client."""
+
+        with self.stats_lock:
+            self.stats[name][stat] += 1
+
+    def is_healthy(self, name, client, created_at):
+        """Checks whether an existing client can be reused."""
+
+        max_age_s = self.max_ages_s[name]
+        if max_age_s is not None and time() - created_at > max_age_s:
+            return False
+
+        check = self.checks[name]
+        return not check or check(client)
+
+    def get(self, name):
+        """Returns the client of the current thread, creating it if there is
+        none yet or if the existing one isn't healthy.
+        """
+
+        clients = self.get_clients()
+        if name in clients:
+            client, created_at = clients[name]
+            if self.is_healthy(name, client, created_at):
+                self.count(name, "reused")
+                return client
+            self.discard(name)
+
+        client = self.factories[name]()
+        clients[name] = (client, time())
+        self.count(name, "created")
+        return client
+
+    def discard(self, name):
+        """Drops the client of the current thread, so that the next use
+        creates a new one.
+        """
+
+        if self.get_clients().pop(name, None) is not None:
+            self.count(name, "discarded")
+
+    @contextmanager
+    def use(self, name):
+        """Provides the client of the current thread and discards it if an
+        error occurs while using it.
+        """
+
+        client = self.get(name)
+        try:
+            yield client
+        except Exception:
+            self.discard(name)
+            raise
+
+    def get_stats(self):
+        """Returns how many clients were created, reused and discarded by
+        name.
+        """
+
+        with self.stats_lock:
+            return {name: dict(stats) for name, stats in self.stats.items()}
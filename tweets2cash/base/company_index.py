@@ -0,0 +1,297 @@
+# -*- coding: utf-8 -*-
+
+from bz2 import open as bz2_open
+from gzip import open as gzip_open
+from mmap import ACCESS_READ
+from mmap import mmap
+from os import rename
+from simplejson import dumps
+from simplejson import loads
+from struct import Struct
+from threading import Lock
+
+from django.conf import settings
+
+from .ownership import EXCHANGES
+from .ownership import OWNERSHIP_PROPERTIES
+from .ownership import OwnershipGraph
+from .ownership import get_closure
+from .ownership import get_company_data_from_rows
+
+# The engine used to look up company data. Either "wikidata" for live SPARQL
+# queries only or "offline_index" for the local index with live fallback.
+COMPANY_DATA_ENGINE = settings.COMPANY_DATA_ENGINE
+
+# The path to the local company index file.
+COMPANY_INDEX_PATH = settings.COMPANY_INDEX_PATH
+
+# The magic bytes at the start of a company index file, including the version.
+INDEX_MAGIC = b"T2CIDX01"
+
+# The index header: magic bytes and the number of entries.
+HEADER = Struct("<8sI")
+
+# The maximum size in bytes of a MID in the index.
+MAX_MID_SIZE = 24
+
+# An index entry: the padded MID and the offset and size of its JSON data.
+ENTRY = Struct("<%dsQI" % MAX_MID_SIZE)
+
+# The Wikidata properties that MID_TO_TICKER_QUERY traverses.
+FREEBASE_ID = "P646"
+INSTANCE_OF = "P31"
+SUBCLASS_OF = "P279"
+MANUFACTURER = "P176"
+FOLLOWED_BY = "P156"
+STOCK_EXCHANGE = "P414"
+TICKER_SYMBOL = "P249"
+
+# The blacklisted classes of companies (TV channels, news agencies).
+BLACKLISTED_CLASSES = {"Q1616075", "Q11032"}
+
+# The properties with item values to keep from each entity, other than the
+# ones in the ownership graph.
+ITEM_PROPERTIES = [INSTANCE_OF, SUBCLASS_OF, MANUFACTURER]
+
+
+def open_extract(path):
+    """Opens a Wikidata JSON dump or extract, which may be compressed."""
+
+    if path.endswith(".bz2"):
+        return bz2_open(path, "rt", encoding="utf-8")
+    if path.endswith(".gz"):
+        return gzip_open(path, "rt", encoding="utf-8")
+    return open(path, "r", encoding="utf-8")
+
+
+def get_snak_value(snak):
+    """Returns the value of a snak as a string or item ID."""
+
+    if snak.get("snaktype") != "value":
+        return None
+
+    value = snak["datavalue"]["value"]
+    if isinstance(value, dict):
+        return value.get("id")
+    return value
+
+
+def get_truthy_values(claims, prop):
+    """Returns the values of the best-ranked statements for a property, just
+    like the wdt: prefix in SPARQL.
+    """
+
+    statements = [statement for statement in claims.get(prop, [])
+                  if statement.get("rank") != "deprecated"]
+    preferred = [statement for statement in statements
+                 if statement.get("rank") == "preferred"]
+
+    values = []
+    for statement in preferred or statements:
+        value = get_snak_value(statement["mainsnak"])
+        if value is not None:
+            values.append(value)
+    return values
+
+
+def get_listings(claims):
+    """Returns the (exchange, ticker) pairs of all whitelisted stock exchange
+    statements, just like the p:/ps:/pq: prefixes in SPARQL.
+    """
+
+    listings = []
+    for statement in claims.get(STOCK_EXCHANGE, []):
+        exchange = get_snak_value(statement["mainsnak"])
+        if exchange not in EXCHANGES:
+            continue
+
+        qualifiers = statement.get("qualifiers", {})
+        for qualifier in qualifiers.get(TICKER_SYMBOL, []):
+            ticker = get_snak_value(qualifier)
+            if ticker:
+                listings.append((exchange, ticker))
+    return listings
+
+
+class WikidataExtract:
+    """The subset of Wikidata entities and claims needed to resolve Freebase
+    IDs to listed companies.
+    """
+
+    def __init__(self):
+        self.mids = {}
+        self.edges = {prop: {} for prop in ITEM_PROPERTIES}
+        self.blacklisted = {}
+        self.graph = OwnershipGraph()
+
+    def load(self, lines):
+        """Reads entities from the lines of a JSON dump, one entity per line,
+        and precomputes the ownership graph.
+        """
+
+        for line in lines:
+            line = line.strip().rstrip(",")
+            if not line or line in ("[", "]"):
+                continue
+            self.add_entity(loads(line))
+
+        self.graph.build()
+
+    def add_entity(self, entity):
+        """Keeps the relevant parts of one entity."""
+
+        qid = entity["id"]
+        claims = entity.get("claims", {})
+
+        try:
+            self.graph.labels[qid] = entity["labels"]["en"]["value"]
+        except KeyError:
+            pass
+
+        for mid in get_truthy_values(claims, FREEBASE_ID):
+            self.mids[mid] = qid
+
+        for prop in ITEM_PROPERTIES:
+            values = get_truthy_values(claims, prop)
+            if values:
+                self.edges[prop][qid] = values
+
+        for prop in OWNERSHIP_PROPERTIES:
+            values = get_truthy_values(claims, prop)
+            if values:
+                self.graph.edges[prop][qid] = values
+
+        listings = get_listings(claims)
+        if listings:
+            self.graph.listings[qid] = listings
+
+    def is_blacklisted(self, qid):
+        """Checks whether an entity is an instance of a blacklisted class."""
+
+        if qid not in self.blacklisted:
+            classes = get_closure(self.edges[SUBCLASS_OF],
+                                  self.edges[INSTANCE_OF].get(qid, []))
+            self.blacklisted[qid] = not BLACKLISTED_CLASSES.isdisjoint(
+                classes)
+        return self.blacklisted[qid]
+
+    def get_company_data(self, mid):
+        """Resolves a Freebase ID to company data the same way that
+        MID_TO_TICKER_QUERY does.
+        """
+
+        qid = self.mids.get(mid)
+        if not qid:
+            return None
+
+        # Collect the (company, root, ticker, exchange) labels.
+        rows = []
+        manufacturers = get_closure(self.edges[MANUFACTURER], [qid])
+        companies = get_closure(self.graph.edges[FOLLOWED_BY], manufacturers)
+        for company in companies:
+            if self.is_blacklisted(company):
+                continue
+
+            name = self.graph.get_label(company)
+            for exchange, ticker in self.graph.get_listings(company):
+                rows.append((name, None, ticker,
+                             self.graph.get_label(exchange)))
+            rows.extend(self.graph.get_root_rows(company, name))
+
+        return get_company_data_from_rows(rows)
+
+    def get_all_company_data(self):
+        """Generates (MID, company data) pairs for all Freebase IDs."""
+
+        for mid in self.mids:
+            yield (mid, self.get_company_data(mid))
+
+
+def write_company_index(path, items):
+    """Writes (MID, company data) pairs to a sorted binary index file."""
+
+    items = sorted((mid.encode("utf-8"), dumps(datas).encode("utf-8"))
+                   for mid, datas in items)
+
+    # Write to a temporary file first so readers never see a partial index.
+    temp_path = "%s.tmp" % path
+    with open(temp_path, "wb") as index_file:
+        index_file.write(HEADER.pack(INDEX_MAGIC, len(items)))
+        offset = HEADER.size + ENTRY.size * len(items)
+        for mid, value in items:
+            if len(mid) > MAX_MID_SIZE:
+                raise ValueError("MID too long for index: %s" % mid)
+            index_file.write(ENTRY.pack(mid, offset, len(value)))
+            offset += len(value)
+        for _, value in items:
+            index_file.write(value)
+    rename(temp_path, path)
+
+    return len(items)
+
+
+class CompanyIndex:
+    """A read-only, memory-mapped index from Freebase IDs to company data."""
+
+    def __init__(self, path=COMPANY_INDEX_PATH):
+        self.path = path
+        with open(path, "rb") as index_file:
+            self.data = mmap(index_file.fileno(), 0, access=ACCESS_READ)
+
+        magic, self.count = HEADER.unpack_from(self.data, 0)
+        if magic != INDEX_MAGIC:
+            raise ValueError("Not a company index: %s" % path)
+
+    def get_entry(self, position):
+        """Returns the (MID, offset, size) of the entry at a position."""
+
+        mid, offset, size = ENTRY.unpack_from(
+            self.data, HEADER.size + ENTRY.size * position)
+        return (mid.rstrip(b"\0"), offset, size)
+
+    def get(self, mid):
+        """Looks up the company data for a Freebase ID. Returns a (hit, data)
+        tuple. The data is None for MIDs which aren't companies.
+        """
+
+        key = mid.encode("utf-8")
+        low = 0
+        high = self.count
+        while low < high:
+            middle = (low + high) // 2
+            entry_mid, offset, size = self.get_entry(middle)
+            if entry_mid < key:
+                low = middle + 1
+            elif entry_mid > key:
+                high = middle
+            else:
+                return (True, loads(self.data[offset:offset + size].decode(
+                    "utf-8")))
+
+        return (False, None)
+
+    def close(self):
+        """Unmaps the index file."""
+
+        self.data.close()
+
+
+# The index instance shared by all threads in this process.
+_company_index = None
+_company_index_lock = Lock()
+
+
+def get_company_index():
+    """Returns the process-wide company index, or None if the offline index
+    engine isn't used.
+    """
+
+    global _company_index
+
+    if COMPANY_DATA_ENGINE != "offline_index":
+        return None
+
+    with _company_index_lock:
+        if _company_index is None:
+            _company_index = CompanyIndex()
+        return _company_index
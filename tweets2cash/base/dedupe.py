@@ -0,0 +1,180 @@
+# -*- coding: utf-8 -*-
+
+from collections import OrderedDict
+from hashlib import md5
+from math import ceil
+from math import exp
+from math import log
+from threading import Lock
+from time import time
+
+from django.conf import settings
+from django.core.cache import caches
+
+# Whether to skip tweets which were already seen.
+DEDUPE_ENABLED = settings.DEDUPE_ENABLED
+
+# The time in seconds for which tweet IDs are remembered.
+DEDUPE_WINDOW_S = settings.DEDUPE_WINDOW_S
+
+# The number of tweet IDs each bloom filter is sized for.
+DEDUPE_CAPACITY = settings.DEDUPE_CAPACITY
+
+# The target false positive rate of each bloom filter.
+DEDUPE_ERROR_RATE = settings.DEDUPE_ERROR_RATE
+
+# The number of most recent tweet IDs which are remembered exactly.
+DEDUPE_LRU_SIZE = settings.DEDUPE_LRU_SIZE
+
+# The name of the Django cache to share seen tweet IDs across processes, or
+# empty to keep them in this process only.
+DEDUPE_CACHE = settings.DEDUPE_CACHE
+
+# The prefix of the keys for seen tweet IDs in the shared cache.
+CACHE_KEY_PREFIX = "tweets2cash:dedupe:"
+
+
+class BloomFilter:
+    """A fixed-size set of keys which may report false positives, but never
+    false negatives.
+    """
+
+    def __init__(self, capacity, error_rate):
+        self.num_bits = max(
+            int(ceil(-capacity * log(error_rate) / (log(2) ** 2))), 8)
+        self.num_hashes = max(int(round(self.num_bits / capacity * log(2))), 1)
+        self.bits = bytearray((self.num_bits + 7) // 8)
+        self.count = 0
+
+    def get_positions(self, key):
+        """Returns the bit positions of a key, using double hashing."""
+
+        digest = md5(key.encode("utf-8")).digest()
+        first = int.from_bytes(digest[:8], "little")
+        second = int.from_bytes(digest[8:], "little") | 1
+        return [(first + index * second) % self.num_bits
+                for index in range(self.num_hashes)]
+
+    def add(self, key):
+        """Adds a key."""
+
+        for position in self.get_positions(key):
+            self.bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, key):
+        return all(self.bits[position >> 3] & (1 << (position & 7))
+                   for position in self.get_positions(key))
+
+    def get_error_rate(self):
+        """Estimates the current false positive rate from the number of
+        keys.
+        """
+
+        fill = 1 - exp(-self.num_hashes * self.count / self.num_bits)
+        return fill ** self.num_hashes
+
+
+class DedupeWindow:
+    """Remembers the tweet IDs seen within a time window in bounded memory.
+    The most recent IDs are kept exactly, and older ones in two bloom filter
+    generations which rotate every half window, so that each ID is
+    remembered for between half and all of the window after it was first
+    seen. With a shared cache, the
+    cache decides across processes and catches bloom filter false positives.
+    """
+
+    def __init__(self, window_s=DEDUPE_WINDOW_S, capacity=DEDUPE_CAPACITY,
+                 error_rate=DEDUPE_ERROR_RATE, lru_size=DEDUPE_LRU_SIZE,
+                 cache=None):
+        self.window_s = window_s
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.lru_size = lru_size
+        self.cache = cache
+        self.lock = Lock()
+        self.recent = OrderedDict()
+        self.current = BloomFilter(capacity, error_rate)
+        self.previous = BloomFilter(capacity, error_rate)
+        self.rotated_at = time()
+        self.stats = {"checked": 0,
+                      "hits": 0,
+                      "bloom_hits": 0,
+                      "shared_hits": 0,
+                      "false_positives": 0}
+
+    def rotate(self):
+        """Starts a new bloom filter generation every half window. Must be
+        called with the lock held.
+        """
+
+        if time() - self.rotated_at < self.window_s / 2:
+            return
+
+        self.previous = self.current
+        self.current = BloomFilter(self.capacity, self.error_rate)
+        self.rotated_at = time()
+
+    def check(self, tweet_id):
+        """Records a tweet ID and returns whether it was already seen."""
+
+        key = str(tweet_id)
+        with self.lock:
+            self.stats["checked"] += 1
+            if key in self.recent:
+                self.recent.move_to_end(key)
+                self.stats["hits"] += 1
+                return True
+
+            self.rotate()
+            in_bloom = key in self.current or key in self.previous
+            if not in_bloom:
+                self.current.add(key)
+            self.recent[key] = True
+            if len(self.recent) > self.lru_size:
+                self.recent.popitem(last=False)
+
+        if self.cache is not None:
+            is_new = self.cache.add(CACHE_KEY_PREFIX + key, 1,
+                                    timeout=self.window_s)
+            with self.lock:
+                if not is_new:
+                    self.stats["shared_hits"] += 1
+                elif in_bloom:
+                    self.stats["false_positives"] += 1
+            return not is_new
+
+        if in_bloom:
+            with self.lock:
+                self.stats["bloom_hits"] += 1
+        return in_bloom
+
+    def get_stats(self):
+        """Returns the counts of checked IDs, exact, bloom filter and shared
+        cache hits, false positives caught by the shared cache and the
+        estimated false positive rate of the bloom filters.
+        """
+
+        with self.lock:
+            stats = dict(self.stats)
+            stats["error_rate"] = max(self.current.get_error_rate(),
+                                      self.previous.get_error_rate())
+            return stats
+
+
+# The process-wide dedupe window, created on first use.
+_dedupe_window = None
+_dedupe_window_lock = Lock()
+
+
+def get_dedupe_window():
+    """Returns the process-wide dedupe window, sharing seen tweet IDs through
+    the configured cache if there is one.
+    """
+
+    global _dedupe_window
+    with _dedupe_window_lock:
+        if _dedupe_window is None:
+            cache = caches[DEDUPE_CACHE] if DEDUPE_CACHE else None
+            _dedupe_window = DedupeWindow(cache=cache)
+        return _dedupe_window
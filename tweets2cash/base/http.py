@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+
+from requests import Session
+from requests.adapters import HTTPAdapter
+from threading import Lock
+
+from django.conf import settings
+
+# The maximum number of hosts to keep connection pools for.
+HTTP_POOL_CONNECTIONS = settings.HTTP_POOL_CONNECTIONS
+
+# The maximum number of keep-alive connections per host.
+HTTP_POOL_MAXSIZE = settings.HTTP_POOL_MAXSIZE
+
+# The time in seconds to wait for a connection to be established.
+HTTP_CONNECT_TIMEOUT_S = settings.HTTP_CONNECT_TIMEOUT_S
+
+# The time in seconds to wait for the server to send data.
+HTTP_READ_TIMEOUT_S = settings.HTTP_READ_TIMEOUT_S
+
+# The User-Agent header, as required by the Wikimedia User-Agent policy.
+USER_AGENT = "Tweets2Cash/1.0 (https://tweets2cash.com)"
+
+
+class HttpSession:
+    """A thread-safe HTTP session which keeps connections alive in a pool per
+    host and applies default timeouts to every request.
+    """
+
+    def __init__(self, pool_connections=HTTP_POOL_CONNECTIONS,
+                 pool_maxsize=HTTP_POOL_MAXSIZE,
+                 connect_timeout_s=HTTP_CONNECT_TIMEOUT_S,
+                 read_timeout_s=HTTP_READ_TIMEOUT_S):
+        self.timeout = (connect_timeout_s, read_timeout_s)
+        self.adapter = HTTPAdapter(pool_connections=pool_connections,
+                                   pool_maxsize=pool_maxsize)
+        self.session = Session()
+        self.session.mount("https://", self.adapter)
+        self.session.mount("http://", self.adapter)
+        self.session.headers.update({"Accept-Encoding": "gzip, deflate",
+                                     "Connection": "keep-alive",
+                                     "User-Agent": USER_AGENT})
+        self.stats_lock = Lock()
+        self.requests = 0
+        self.errors = 0
+
+    def get(self, url, **kwargs):
+        """Sends a GET request over a pooled connection."""
+
+        kwargs.setdefault("timeout", self.timeout)
+
+        with self.stats_lock:
+            self.requests += 1
+
+        try:
+            return self.session.get(url, **kwargs)
+        except Exception:
+            with self.stats_lock:
+                self.errors += 1
+            raise
+
+    def get_pool_stats(self):
+        """Returns the connection and request counts for each host pool."""
+
+        pools = self.adapter.poolmanager.pools
+        pool_stats = {}
+        for key in pools.keys():
+            pool = pools.get(key)
+            if pool is None:
+                continue
+
+            connections = pool.num_connections
+            requests = pool.num_requests
+            reuse_rate = 1 - connections / requests if requests else 0
+            pool_stats["%s://%s:%s" % (pool.scheme, pool.host, pool.port)] = {
+                "connections": connections,
+                "requests": requests,
+                "idle": pool.pool.qsize() if pool.pool else 0,
+                "reuse_rate": reuse_rate}
+
+        return pool_stats
+
+    def get_stats(self):
+        """Returns the request counters and the statistics of each pool."""
+
+        with self.stats_lock:
+            stats = {"requests": self.requests,
+                     "errors": self.errors}
+        stats["pools"] = self.get_pool_stats()
+
+        return stats
+
+
+# The session instance shared by all threads in this process.
+_http_session = None
+_http_session_lock = Lock()
+
+
+def get_http_session():
+    """Returns the process-wide HTTP session."""
+
+    global _http_session
+
+    with _http_session_lock:
+        if _http_session is None:
+            _http_session = HttpSession()
+        return _http_session
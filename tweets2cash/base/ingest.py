@@ -0,0 +1,304 @@
+# -*- coding: utf-8 -*-
+
+from collections import deque
+from queue import Queue
+from re import compile
+from threading import Lock
+
+from django.conf import settings
+
+# The maximum number of streamed items waiting to be decoded.
+INGEST_QUEUE_SIZE = settings.INGEST_QUEUE_SIZE
+
+# What to do with streamed data when the ingest queue is full.
+INGEST_OVERLOAD_POLICY = settings.INGEST_OVERLOAD_POLICY
+
+# The path to the file for data spilled from a full ingest queue.
+INGEST_SPILL_PATH = settings.INGEST_SPILL_PATH
+
+# The overload policies: block the stream until there is room, drop the
+# oldest item, drop items by authors which aren't followed first, or spill new
+# items to disk until the queue has drained.
+POLICIES = ["block", "drop_oldest", "drop_unfollowed", "spill"]
+
+# Whether to classify streamed data before decoding it.
+STREAM_PREFILTER_ENABLED = settings.STREAM_PREFILTER_ENABLED
+
+# The kinds of streamed data to drop before decoding it.
+STREAM_PREFILTER_DROP = settings.STREAM_PREFILTER_DROP
+
+# The pattern for the ID of the author in raw tweet JSON, which is the first
+# user object in a tweet.
+AUTHOR_ID_PATTERN = compile(r'"user"\s*:\s*\{[^{}]*?"id"\s*:\s*(\d+)')
+
+# The pattern for the first key of a raw JSON message.
+FIRST_KEY_PATTERN = compile(r'^\s*\{\s*"(\w+)"')
+
+# The pattern for a retweet, which embeds the original tweet.
+RETWEET_PATTERN = compile(r'"retweeted_status"\s*:\s*\{')
+
+# The streaming API messages other than tweets by their only key.
+# https://developer.twitter.com/en/docs/tweets/filter-realtime/guides/streaming-message-types
+NOTICE_KINDS = {"delete": "delete",
+                "limit": "limit",
+                "scrub_geo": "notice",
+                "status_withheld": "notice",
+                "user_withheld": "notice",
+                "disconnect": "notice",
+                "warning": "notice"}
+
+# The kinds of streamed data.
+KINDS = ["delete", "limit", "notice", "retweet", "unfollowed", "tweet"]
+
+
+def get_text(data):
+    """Returns raw streamed data as text."""
+
+    if isinstance(data, bytes):
+        return data.decode("utf-8", "replace")
+    return data
+
+
+def get_author_id(data):
+    """Extracts the ID of the author from raw tweet JSON without decoding it.
+    Returns None if there is none.
+    """
+
+    match = AUTHOR_ID_PATTERN.search(get_text(data))
+    if not match:
+        return None
+    return match.group(1)
+
+
+def classify(data, follow):
+    """Classifies raw streamed data without decoding the JSON. Returns one of
+    KINDS. Tweets and retweets by authors other than the followed users count
+    as unfollowed, and those whose author can't be found as followed.
+    """
+
+    data = get_text(data)
+
+    match = FIRST_KEY_PATTERN.match(data)
+    if match and match.group(1) in NOTICE_KINDS:
+        return NOTICE_KINDS[match.group(1)]
+
+    if follow:
+        author_id = get_author_id(data)
+        if author_id and author_id not in follow:
+            return "unfollowed"
+
+    if RETWEET_PATTERN.search(data):
+        return "retweet"
+
+    return "tweet"
+
+
+class StreamFilter:
+    """Drops the kinds of streamed data which don't need to be processed
+    before they are decoded, and counts all kinds.
+    """
+
+    def __init__(self, follow=None, drop=STREAM_PREFILTER_DROP,
+                 enabled=STREAM_PREFILTER_ENABLED):
+        unknown = set(drop) - set(KINDS)
+        if unknown:
+            raise ValueError("Unknown kinds of streamed data: %s" % unknown)
+
+        self.follow = set(str(user_id) for user_id in follow or [])
+        self.drop = set(drop)
+        self.enabled = enabled
+        self.lock = Lock()
+        self.counts = {kind: 0 for kind in KINDS}
+        self.dropped = 0
+
+    def check(self, data):
+        """Classifies raw streamed data. Returns a tuple of its kind and
+        whether to keep it. Everything is kept if the filter is disabled.
+        """
+
+        if not self.enabled:
+            return ("tweet", True)
+
+        kind = classify(data, self.follow)
+        keep = kind not in self.drop
+        with self.lock:
+            self.counts[kind] += 1
+            if not keep:
+                self.dropped += 1
+
+        return (kind, keep)
+
+    def get_stats(self):
+        """Returns the number of streamed messages by kind and how many were
+        dropped.
+        """
+
+        with self.lock:
+            stats = dict(self.counts)
+            stats["dropped"] = self.dropped
+            return stats
+
+
+class IngestQueue(Queue):
+    """A bounded queue for raw streamed data with a policy for when it's full.
+    Counts the dropped and spilled items and the highest queue depth. With
+    the drop_unfollowed policy, items by authors which aren't followed are
+    kept apart when they're put, so that the oldest one can be dropped
+    without scanning the queue.
+    """
+
+    def __init__(self, maxsize=INGEST_QUEUE_SIZE,
+                 policy=INGEST_OVERLOAD_POLICY, follow=None,
+                 spill_path=INGEST_SPILL_PATH):
+        if policy not in POLICIES:
+            raise ValueError("Unknown overload policy: %s" % policy)
+
+        Queue.__init__(self, maxsize=maxsize)
+        self.policy = policy
+        self.follow = set(str(user_id) for user_id in follow or [])
+        self.spill_path = spill_path
+        self.spill_file = None
+        self.spill_offset = 0
+        self.spill_pending = 0
+        self.stats_lock = Lock()
+        self.dropped = 0
+        self.spilled = 0
+        self.high_water = 0
+
+    def _init(self, maxsize):
+        self.queue = deque()
+        self.unfollowed = deque()
+        self.put_count = 0
+
+    def _qsize(self):
+        return len(self.queue) + len(self.unfollowed) + self.spill_pending
+
+    def _put(self, item):
+        if self.policy != "drop_unfollowed":
+            self.queue.append(item)
+            return
+
+        # Number the items to take them from both queues in order.
+        self.put_count += 1
+        if self.is_followed(item):
+            self.queue.append((self.put_count, item))
+        else:
+            self.unfollowed.append((self.put_count, item))
+
+    def _get(self):
+        if self.policy == "drop_unfollowed":
+            if not self.unfollowed or (
+                    self.queue and self.queue[0][0] < self.unfollowed[0][0]):
+                return self.queue.popleft()[1]
+            return self.unfollowed.popleft()[1]
+
+        # Spilled items are older than anything put since, so only read
+        # them back once the queue in memory is empty.
+        if not self.queue and self.spill_pending:
+            self.unspill()
+        return self.queue.popleft()
+
+    def is_followed(self, data):
+        """Checks whether the author of raw tweet data is followed."""
+
+        return get_author_id(data) in self.follow
+
+    def put(self, item, block=True, timeout=None):
+        """Puts an item on the queue, applying the overload policy if the
+        queue is full.
+        """
+
+        if self.policy == "block":
+            Queue.put(self, item, block=block, timeout=timeout)
+        else:
+            with self.not_full:
+                self.unfinished_tasks += 1
+                if (self.spill_pending or
+                        len(self.queue) + len(self.unfollowed) >=
+                        self.maxsize > 0):
+                    item = self.shed(item)
+
+                if item is not None:
+                    self._put(item)
+                    self.not_empty.notify()
+
+        depth = self.qsize()
+        with self.stats_lock:
+            self.high_water = max(self.high_water, depth)
+
+    def shed(self, item):
+        """Makes room for a new item according to the overload policy. Must be
+        called with the mutex held. Returns the item to put on the queue, or
+        None if it was spilled or dropped. Dropped items count as done.
+        """
+
+        if self.policy == "spill":
+            self.spill(item)
+            return None
+
+        if self.policy == "drop_unfollowed":
+            if self.unfollowed:
+                self.unfollowed.popleft()
+                self.drop()
+                return item
+            if not self.is_followed(item):
+                self.drop()
+                return None
+
+        self.queue.popleft()
+        self.drop()
+        return item
+
+    def drop(self):
+        """Counts a dropped item and marks it as done, like task_done. Must be
+        called with the mutex held.
+        """
+
+        unfinished = self.unfinished_tasks - 1
+        if unfinished <= 0:
+            if unfinished < 0:
+                raise ValueError("drop() called too many times")
+            self.all_tasks_done.notify_all()
+        self.unfinished_tasks = unfinished
+        with self.stats_lock:
+            self.dropped += 1
+
+    def spill(self, item):
+        """Appends an item to the spill file."""
+
+        if self.spill_file is None:
+            self.spill_file = open(self.spill_path, "w+", encoding="utf-8")
+
+        self.spill_file.seek(0, 2)
+        self.spill_file.write("%s\n" % item.strip())
+        self.spill_pending += 1
+        with self.stats_lock:
+            self.spilled += 1
+
+    def unspill(self):
+        """Moves the next batch of spilled items back into the queue."""
+
+        self.spill_file.seek(self.spill_offset)
+        while self.spill_pending and len(self.queue) < max(self.maxsize, 1):
+            self.queue.append(self.spill_file.readline().rstrip("\n"))
+            self.spill_pending -= 1
+        self.spill_offset = self.spill_file.tell()
+
+        # Start over once everything has been read back.
+        if not self.spill_pending:
+            self.spill_file.seek(0)
+            self.spill_file.truncate()
+            self.spill_offset = 0
+
+    def get_stats(self):
+        """Returns the counters of dropped and spilled items and the highest
+        queue depth.
+        """
+
+        depth = self.qsize()
+        with self.stats_lock:
+            return {"policy": self.policy,
+                    "depth": depth,
+                    "high_water": self.high_water,
+                    "dropped": self.dropped,
+                    "spilled": self.spilled}
@@ -1,14 +1,25 @@
 # -*- coding: utf-8 -*-
 
+from atexit import register
 from backoff import expo
 from backoff import on_exception
+from collections import deque
+from django.conf import settings
 from google.cloud import error_reporting
 from google.cloud import logging
+from logging import CRITICAL
+from logging import DEBUG
+from logging import ERROR
 from logging import Formatter
+from logging import INFO
+from logging import WARNING
 from logging import getLogger
-from logging import DEBUG
 from logging.handlers import RotatingFileHandler
 from sys import exc_info
+from threading import Condition
+from threading import Lock
+from threading import Thread
+from time import time
 from traceback import format_exception
 
 # The format for local logs.
@@ -28,105 +39,435 @@ FALLBACK_LOG_FILE = "/tmp/tweets2cash-fallback.log"
 # The maximum size in bytes for each local log file.
 MAX_LOG_BYTES = 10 * 1024 * 1024
 
+# The minimum level for logs without a level of their own.
+LOG_LEVEL = settings.LOG_LEVEL
+
+# The minimum levels of logs by name prefix, like "pipeline-analyze=INFO".
+LOG_LEVELS = settings.LOG_LEVELS
+
+# The log levels by name.
+LEVELS = {"DEBUG": DEBUG,
+          "INFO": INFO,
+          "WARNING": WARNING,
+          "ERROR": ERROR,
+          "CRITICAL": CRITICAL}
+
+# The maximum number of cloud log entries waiting to be uploaded.
+CLOUD_LOG_BUFFER_SIZE = settings.CLOUD_LOG_BUFFER_SIZE
+
+# The number of cloud log entries which triggers an upload.
+CLOUD_LOG_BATCH_SIZE = settings.CLOUD_LOG_BATCH_SIZE
+
+# The maximum time in seconds a cloud log entry waits to be uploaded.
+CLOUD_LOG_FLUSH_S = settings.CLOUD_LOG_FLUSH_S
+
+
+class CloudLogUploader:
+    """Buffers cloud log entries and exception reports and uploads them in
+    batches from one background thread, so that logging never waits for the
+    network. A batch is uploaded once it's full or its oldest entry is too
+    old.
+    """
+
+    def __init__(self, buffer_size=CLOUD_LOG_BUFFER_SIZE,
+                 batch_size=CLOUD_LOG_BATCH_SIZE, flush_s=CLOUD_LOG_FLUSH_S):
+        self.buffer_size = buffer_size
+        self.batch_size = batch_size
+        self.flush_s = flush_s
+        self.buffer = deque()
+        self.condition = Condition()
+        self.thread = None
+        self.uploading = False
+        self.flush_requests = 0
+        self.uploaded = 0
+        self.overflowed = 0
+
+    def put(self, logs, text, severity):
+        """Queues a log entry for upload. The severity is None for exception
+        reports. Returns False if the buffer is full.
+        """
 
-class Logs:
-    """A helper for logging locally or in the cloud."""
+        with self.condition:
+            if len(self.buffer) >= self.buffer_size:
+                self.overflowed += 1
+                return False
+
+            self.buffer.append((time(), logs, text, severity))
+            if self.thread is None:
+                self.start()
+            if len(self.buffer) in [1, self.batch_size]:
+                self.condition.notify_all()
+            return True
+
+    def start(self):
+        """Starts the background thread. Must be called with the lock held."""
+
+        self.thread = Thread(target=self.run, name="cloud-log-uploader")
+        self.thread.daemon = True
+        self.thread.start()
+        register(self.flush)
+
+    def is_due(self):
+        """Checks whether a batch should be uploaded now."""
+
+        if not self.buffer:
+            return False
+
+        return (len(self.buffer) >= self.batch_size or
+                self.flush_requests > 0 or
+                time() - self.buffer[0][0] >= self.flush_s)
+
+    def get_wait_s(self):
+        """Returns how long to wait for the oldest entry to be due."""
+
+        if not self.buffer:
+            return None
+        return max(self.flush_s - (time() - self.buffer[0][0]), 0)
+
+    def run(self):
+        """Continuously uploads batches of entries."""
+
+        while True:
+            with self.condition:
+                while not self.is_due():
+                    self.condition.wait(timeout=self.get_wait_s())
+                batch = [self.buffer.popleft() for _ in
+                         range(min(len(self.buffer), self.batch_size))]
+                self.uploading = True
+
+            try:
+                self.upload(batch)
+            except Exception:
+                # Keep the thread alive, since nothing else drains the buffer.
+                getLogger(__name__).exception(
+                    "Failed to upload %d cloud log entries.", len(batch))
+            finally:
+                with self.condition:
+                    self.uploading = False
+                    self.uploaded += len(batch)
+                    self.condition.notify_all()
+
+    def upload(self, batch):
+        """Uploads a batch of entries with one request per logger."""
+
+        entries_by_logs = {}
+        for _, logs, text, severity in batch:
+            if severity is None:
+                logs.safe_report_exception(text)
+            else:
+                entries_by_logs.setdefault(logs, []).append((text, severity))
+
+        for logs, entries in entries_by_logs.items():
+            logs.safe_cloud_log_entries(entries)
+
+    def flush(self, timeout_s=None):
+        """Waits until all queued entries have been uploaded, for at most a
+        timeout which defaults to twice the flush time. Returns whether they
+        were.
+        """
 
-    def __init__(self, name, to_cloud=True):
-        self.to_cloud = to_cloud
+        if timeout_s is None:
+            timeout_s = self.flush_s * 2
+        deadline = time() + timeout_s
+
+        with self.condition:
+            self.flush_requests += 1
+            self.condition.notify_all()
+            try:
+                while self.buffer or self.uploading:
+                    wait_s = deadline - time()
+                    if (wait_s <= 0 or self.thread is None or
+                            not self.thread.is_alive()):
+                        return False
+                    self.condition.wait(timeout=min(wait_s, 1))
+                return True
+            finally:
+                self.flush_requests -= 1
+
+    def get_stats(self):
+        """Returns the number of queued, uploaded and overflowed entries."""
+
+        with self.condition:
+            return {"queued": len(self.buffer),
+                    "uploaded": self.uploaded,
+                    "overflowed": self.overflowed}
+
+
+# The process-wide cloud log uploader, created on first use.
+_uploader = None
+_uploader_lock = Lock()
+
+
+def get_uploader():
+    """Returns the process-wide cloud log uploader."""
+
+    global _uploader
+    with _uploader_lock:
+        if _uploader is None:
+            _uploader = CloudLogUploader()
+        return _uploader
+
+
+def get_level(name, default=LOG_LEVEL, levels=LOG_LEVELS):
+    """Returns the minimum level for logs with a name. The longest matching
+    name prefix of the per-logger levels wins over the default.
+    """
+
+    level_name = default
+    prefix_length = -1
+    for entry in levels:
+        prefix, _, prefix_level_name = entry.partition("=")
+        prefix = prefix.strip()
+        if name.startswith(prefix) and len(prefix) > prefix_length:
+            level_name = prefix_level_name
+            prefix_length = len(prefix)
+
+    try:
+        return LEVELS[level_name.strip().upper()]
+    except KeyError:
+        raise ValueError("Unknown log level: %s" % level_name)
+
+
+class LogsRegistry:
+    """The clients, loggers and file handlers shared by all logs in the
+    process, so that creating logs is cheap. Everything is created on first
+    use. The cloud clients are only used by the cloud log uploader thread.
+    """
+
+    def __init__(self):
+        self.lock = Lock()
+        self.logging_client = None
+        self.error_client = None
+        self.cloud_loggers = {}
+        self.handlers = {}
+        self.local_loggers = {}
+        self.backoff_redirected = False
+        self.stats = {"logging_clients": 0,
+                      "error_clients": 0,
+                      "cloud_loggers": 0,
+                      "handlers": 0,
+                      "local_loggers": 0}
+
+    def get_cloud_logger(self, name):
+        """Returns the Stackdriver logger with a name."""
+
+        with self.lock:
+            if name not in self.cloud_loggers:
+                if self.logging_client is None:
+                    self.logging_client = logging.Client()
+                    self.stats["logging_clients"] += 1
+                self.cloud_loggers[name] = self.logging_client.logger(name)
+                self.stats["cloud_loggers"] += 1
+            return self.cloud_loggers[name]
+
+    def get_error_client(self):
+        """Returns the Stackdriver error reporting client."""
+
+        with self.lock:
+            if self.error_client is None:
+                self.error_client = error_reporting.Client()
+                self.stats["error_clients"] += 1
+            return self.error_client
+
+    def get_handler(self, log_file):
+        """Returns the file handler for a log file. Must be called with the
+        lock held.
+        """
 
-        if self.to_cloud:
-            # Initialize the Stackdriver logging and error reporting clients.
-            self.cloud_logger = logging.Client().logger(name)
-            self.error_client = error_reporting.Client()
+        if log_file not in self.handlers:
+            handler = RotatingFileHandler(log_file, maxBytes=MAX_LOG_BYTES)
+            handler.setFormatter(Formatter(LOGS_FORMAT))
+            handler.setLevel(DEBUG)
+            self.handlers[log_file] = handler
+            self.stats["handlers"] += 1
+        return self.handlers[log_file]
 
-            # Initialize the local fallback logger.
-            self.fallback_logger, fallback_handler = self.get_local_logger(
-                name, FALLBACK_LOG_FILE)
+    def get_local_logger(self, name, log_file):
+        """Returns a local logger with a file handler."""
+
+        with self.lock:
+            key = (name, log_file)
+            if key not in self.local_loggers:
+                logger = getLogger(name)
+                logger.setLevel(DEBUG)
+                logger.handlers = [self.get_handler(log_file)]
+                self.local_loggers[key] = logger
+                self.stats["local_loggers"] += 1
+            return self.local_loggers[key]
+
+    def redirect_backoff(self):
+        """Redirects the backoff logs to the local fallback handler once."""
+
+        with self.lock:
+            if self.backoff_redirected:
+                return
 
-            # Redirect the backoff logs to the local fallback handler.
             backoff_logger = getLogger("backoff")
             backoff_logger.setLevel(DEBUG)
-            backoff_logger.handlers = [fallback_handler]
-        else:
-            # Initialize the local file logger.
-            self.local_logger, _ = self.get_local_logger(name, LOG_FILE)
+            backoff_logger.handlers = [self.get_handler(FALLBACK_LOG_FILE)]
+            self.backoff_redirected = True
 
-    def get_local_logger(self, name, log_file):
-        """Returns a local logger with a file handler."""
+    def get_stats(self):
+        """Returns how many of each shared object were created."""
 
-        handler = RotatingFileHandler(log_file, maxBytes=MAX_LOG_BYTES)
-        handler.setFormatter(Formatter(LOGS_FORMAT))
-        handler.setLevel(DEBUG)
+        with self.lock:
+            return dict(self.stats)
 
-        logger = getLogger(name)
-        logger.setLevel(DEBUG)
-        logger.handlers = [handler]
 
-        return (logger, handler)
+# The process-wide logs registry, created on first use.
+_registry = None
+_registry_lock = Lock()
+
+
+def get_registry():
+    """Returns the process-wide logs registry."""
+
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            _registry = LogsRegistry()
+        return _registry
+
+
+class Logs:
+    """A helper for logging locally or in the cloud. Texts are formatted with
+    optional arguments like in the logging module, and only if their level
+    is enabled. Instances are cheap named views over the shared clients of
+    the logs registry.
+    """
 
-    def debug(self, text):
+    def __init__(self, name, to_cloud=True):
+        self.to_cloud = to_cloud
+        self.level = get_level(name)
+        registry = get_registry()
+
+        if self.to_cloud:
+            self.uploader = get_uploader()
+
+            # Use the shared Stackdriver logging and error reporting clients.
+            self.cloud_logger = registry.get_cloud_logger(name)
+            self.error_client = registry.get_error_client()
+
+            # Use the local fallback logger and redirect the backoff logs to
+            # it.
+            self.fallback_logger = registry.get_local_logger(
+                name, FALLBACK_LOG_FILE)
+            registry.redirect_backoff()
+        else:
+            # Use the local file logger.
+            self.local_logger = registry.get_local_logger(name, LOG_FILE)
+
+    def debug(self, text, *args):
         """Logs at the DEBUG level."""
 
+        if self.level > DEBUG:
+            return
+
+        text = self.format_text(text, args)
         if self.to_cloud:
-            self.safe_cloud_log_text(text, severity="DEBUG")
+            self.cloud_log_text(text, severity="DEBUG")
         else:
             self.local_logger.debug(text)
 
-    def info(self, text):
+    def info(self, text, *args):
         """Logs at the INFO level."""
 
+        if self.level > INFO:
+            return
+
+        text = self.format_text(text, args)
         if self.to_cloud:
-            self.safe_cloud_log_text(text, severity="INFO")
+            self.cloud_log_text(text, severity="INFO")
         else:
             self.local_logger.info(text)
 
-    def warn(self, text):
+    def warn(self, text, *args):
         """Logs at the WARNING level."""
 
+        if self.level > WARNING:
+            return
+
+        text = self.format_text(text, args)
         if self.to_cloud:
-            self.safe_cloud_log_text(text, severity="WARNING")
+            self.cloud_log_text(text, severity="WARNING")
         else:
             self.local_logger.warning(text)
 
-    def error(self, text):
+    def error(self, text, *args):
         """Logs at the ERROR level."""
 
+        if self.level > ERROR:
+            return
+
+        text = self.format_text(text, args)
         if self.to_cloud:
-            self.safe_cloud_log_text(text, severity="ERROR")
+            self.cloud_log_text(text, severity="ERROR")
         else:
             self.local_logger.error(text)
 
+    def format_text(self, text, args):
+        """Formats the text with the arguments, if there are any."""
+
+        if not args:
+            return text
+
+        try:
+            return text % args
+        except (TypeError, ValueError):
+            return "%s %s" % (text, args)
+
     def catch(self):
         """Logs the latest exception."""
 
         exception_str = self.format_exception()
 
         if self.to_cloud:
-            self.safe_report_exception(exception_str)
-            self.safe_cloud_log_text(exception_str, severity="CRITICAL")
+            self.cloud_report_exception(exception_str)
+            self.cloud_log_text(exception_str, severity="CRITICAL")
         else:
             self.local_logger.critical(exception_str)
 
-    def safe_cloud_log_text(self, text, severity):
-        """Logs to the cloud, retries if necessary, and eventually fails over
-        to local logs.
+    def cloud_log_text(self, text, severity):
+        """Queues the text for upload to the cloud, or logs it to the local
+        fallback if the upload buffer is full.
+        """
+
+        if not self.uploader.put(self, text, severity):
+            self.fallback_logger.error("Cloud log buffer full: %s %s" %
+                                       (severity, text))
+
+    def cloud_report_exception(self, exception_str):
+        """Queues the exception for reporting, or logs it to the local
+        fallback if the upload buffer is full.
+        """
+
+        if not self.uploader.put(self, exception_str, None):
+            self.fallback_logger.error("Cloud log buffer full: %s" %
+                                       exception_str)
+
+    def safe_cloud_log_entries(self, entries):
+        """Logs (text, severity) entries to the cloud in one batch, retries
+        if necessary, and eventually fails over to local logs.
         """
 
         try:
-            self.retry_cloud_log_text(text, severity)
+            self.retry_cloud_log_entries(entries)
         except Exception:
             exception_str = self.format_exception()
-            self.fallback_logger.error("Failed to log to cloud: %s %s\n%s" %
-                                       (severity, text, exception_str))
+            for text, severity in entries:
+                self.fallback_logger.error("Failed to log to cloud: %s %s\n%s"
+                                           % (severity, text, exception_str))
 
     @on_exception(expo, Exception, max_tries=8)
-    def retry_cloud_log_text(self, text, severity):
-        """Logs to the cloud and retries up to 10 times with exponential backoff
-        (51.2 seconds max total) if the upload fails.
+    def retry_cloud_log_entries(self, entries):
+        """Logs the entries to the cloud and retries up to 10 times with
+        exponential backoff (51.2 seconds max total) if the upload fails.
         """
 
-        self.cloud_logger.log_text(text, severity=severity)
+        batch = self.cloud_logger.batch()
+        for text, severity in entries:
+            batch.log_text(text, severity=severity)
+        batch.commit()
 
     def safe_report_exception(self, exception_str):
         """Reports the exception, retries if necessary, and eventually fails
@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+
+from datetime import datetime
+from datetime import timezone
+from decimal import Decimal
+from json import load
+from time import perf_counter
+
+from django.core.management.base import BaseCommand
+from django.core.management.base import CommandError
+from django.utils.translation import ugettext_lazy as _
+
+from tweets2cash.base.replay import REPLAY_FIXTURES_PATH
+from tweets2cash.base.utils.json import get_available_backends
+from tweets2cash.base.utils.json import get_backend
+
+
+def get_recorded_tweets(path):
+    """Returns the raw tweets recorded in the replay fixtures."""
+
+    try:
+        with open(path, "r", encoding="utf-8") as fixtures_file:
+            fixtures = load(fixtures_file)
+    except (IOError, ValueError) as exception:
+        raise CommandError("Failed to read fixtures: %s" % exception)
+
+    tweets = []
+    for entry in fixtures.get("responses", {}).get("twitter", {}).values():
+        response = entry["response"]
+        if isinstance(response, list):
+            tweets.extend(response)
+        elif response:
+            tweets.append(response)
+    return tweets
+
+
+def get_users(count):
+    """Returns a list of users like the output of the user serializer, with
+    the values that need the encoder class.
+    """
+
+    return [{"id": user_id,
+             "username": "user%d" % user_id,
+             "email": "user%d@example.com" % user_id,
+             "full_name": "User Número %d" % user_id,
+             "bio": "Trades on tweets about companies. 📈",
+             "is_active": user_id % 10 != 0,
+             "photo": None,
+             "big_photo": None,
+             "gravatar_id": "%032x" % user_id,
+             "date_joined": datetime(2017, 1, 1, tzinfo=timezone.utc),
+             "balance": Decimal("%d.25" % user_id),
+             "role": _("Trader")} for user_id in range(count)]
+
+
+def measure(function, iterations):
+    """Returns the mean time in milliseconds of calling a function."""
+
+    start = perf_counter()
+    for _ in range(iterations):
+        function()
+    return (perf_counter() - start) / iterations * 1000
+
+
+class Command(BaseCommand):
+    help = ("Compares the speed of the installed JSON backends at decoding "
+            "recorded tweets and encoding tweets and user lists.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--fixtures", default=REPLAY_FIXTURES_PATH,
+                            help="The path to the replay fixtures with the "
+                                 "recorded tweets.")
+        parser.add_argument("--users", type=int, default=1000,
+                            help="The number of users in the user list.")
+        parser.add_argument("--iterations", type=int, default=100,
+                            help="The number of times to run each test.")
+
+    def handle(self, *args, **options):
+        tweets = get_recorded_tweets(options["fixtures"])
+        if not tweets:
+            raise CommandError("No recorded tweets in: %s" %
+                               options["fixtures"])
+
+        users = get_users(options["users"])
+        stdlib = get_backend("stdlib")
+        raw_tweets = [stdlib.dumpb(tweet, ensure_ascii=False)
+                      for tweet in tweets]
+        iterations = options["iterations"]
+
+        self.stdout.write("%d tweets, %d users, %d iterations" %
+                          (len(tweets), len(users), iterations))
+        self.stdout.write("")
+        self.stdout.write("Backend | Decode tweets | Encode tweets | "
+                          "Encode users")
+        self.stdout.write("--------|---------------|---------------|"
+                          "-------------")
+        for name in get_available_backends():
+            backend = get_backend(name)
+            decode_ms = measure(
+                lambda: [backend.loads(raw) for raw in raw_tweets], iterations)
+            encode_tweets_ms = measure(
+                lambda: backend.dumpb(tweets, ensure_ascii=False), iterations)
+            encode_users_ms = measure(
+                lambda: backend.dumpb(users, ensure_ascii=False), iterations)
+            self.stdout.write("%s | %.3f ms | %.3f ms | %.3f ms" % (
+                name, decode_ms, encode_tweets_ms, encode_users_ms))
@@ -0,0 +1,48 @@
+# -*- coding: utf-8 -*-
+
+from time import perf_counter
+from tracemalloc import get_traced_memory
+from tracemalloc import start
+from tracemalloc import stop
+
+from django.core.management.base import BaseCommand
+
+from tweets2cash.base.logs import Logs
+from tweets2cash.base.logs import get_registry
+
+
+class Command(BaseCommand):
+    help = ("Measures the time and memory it takes to create the first logs "
+            "instance and each one after it.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--instances", type=int, default=1000,
+                            help="The number of logs instances to create.")
+        parser.add_argument("--cloud", action="store_true",
+                            help="Create cloud logs instead of local ones.")
+
+    def handle(self, *args, **options):
+        count = options["instances"]
+        to_cloud = options["cloud"]
+
+        start()
+        start_time = perf_counter()
+        Logs("benchmark-logs-startup", to_cloud=to_cloud)
+        startup_s = perf_counter() - start_time
+        startup_bytes, _ = get_traced_memory()
+
+        # Keep the instances alive to measure what each one holds on to.
+        logs = []
+        start_time = perf_counter()
+        for index in range(count):
+            logs.append(Logs("benchmark-logs-%d" % (index % 10),
+                             to_cloud=to_cloud))
+        instances_s = perf_counter() - start_time
+        instances_bytes = get_traced_memory()[0] - startup_bytes
+        stop()
+
+        self.stdout.write("Startup: %.3f ms, %d bytes" %
+                          (startup_s * 1000, startup_bytes))
+        self.stdout.write("Per instance: %.3f ms, %d bytes" % (
+            instances_s / count * 1000, instances_bytes / count))
+        self.stdout.write("Shared objects: %s" % get_registry().get_stats())
@@ -0,0 +1,37 @@
+# -*- coding: utf-8 -*-
+
+from django.core.management.base import BaseCommand
+
+from tweets2cash.base.company_index import COMPANY_INDEX_PATH
+from tweets2cash.base.company_index import WikidataExtract
+from tweets2cash.base.company_index import open_extract
+from tweets2cash.base.company_index import write_company_index
+
+
+class Command(BaseCommand):
+    help = ("Builds the local company index from a Wikidata JSON dump or "
+            "extract (one entity per line, optionally gzip or bz2 "
+            "compressed).")
+
+    def add_arguments(self, parser):
+        parser.add_argument("extract",
+                            help="The path to the Wikidata extract.")
+        parser.add_argument("--output", default=COMPANY_INDEX_PATH,
+                            help="The path to the index file to write.")
+        parser.add_argument("--graph-output", default=None,
+                            help="The path to also write the ownership graph "
+                                 "to, if any.")
+
+    def handle(self, *args, **options):
+        extract = WikidataExtract()
+        with open_extract(options["extract"]) as lines:
+            extract.load(lines)
+
+        count = write_company_index(options["output"],
+                                    extract.get_all_company_data())
+        self.stdout.write("Wrote %d MIDs to %s" % (count, options["output"]))
+
+        if options["graph_output"]:
+            extract.graph.save(options["graph_output"])
+            self.stdout.write("Wrote ownership graph to %s" %
+                              options["graph_output"])
@@ -0,0 +1,27 @@
+# -*- coding: utf-8 -*-
+
+from django.core.management.base import BaseCommand
+from django.core.management.base import CommandError
+
+from tweets2cash.base.analysis import Analysis
+from tweets2cash.base.ownership import OWNERSHIP_GRAPH_PATH
+from tweets2cash.base.ownership import refresh_ownership_graph
+
+
+class Command(BaseCommand):
+    help = ("Fetches the latest ownership data from Wikidata and updates the "
+            "precomputed roots in the ownership graph.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--output", default=OWNERSHIP_GRAPH_PATH,
+                            help="The path to the ownership graph file.")
+
+    def handle(self, *args, **options):
+        analysis = Analysis(logs_to_cloud=False)
+        count = refresh_ownership_graph(analysis.make_wikidata_request,
+                                        path=options["output"])
+        if count is None:
+            raise CommandError("Failed to fetch ownership data.")
+
+        self.stdout.write("Recomputed roots of %d companies in %s" %
+                          (count, options["output"]))
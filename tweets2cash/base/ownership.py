@@ -0,0 +1,420 @@
+# -*- coding: utf-8 -*-
+
+from os import rename
+from os import stat
+from simplejson import dump
+from simplejson import load
+from threading import Lock
+from time import time
+
+from django.conf import settings
+
+# Whether to resolve root companies via the local ownership graph instead of
+# property path queries.
+OWNERSHIP_GRAPH_ENABLED = settings.OWNERSHIP_GRAPH_ENABLED
+
+# The path to the ownership graph file written by the refresh job.
+OWNERSHIP_GRAPH_PATH = settings.OWNERSHIP_GRAPH_PATH
+
+# The minimum time in seconds between checks for a refreshed graph file.
+OWNERSHIP_GRAPH_RELOAD_S = settings.OWNERSHIP_GRAPH_RELOAD_S
+
+# The maximum number of ownership levels below a listed company to fetch.
+OWNERSHIP_GRAPH_MAX_DEPTH = settings.OWNERSHIP_GRAPH_MAX_DEPTH
+
+# The maximum number of companies per ownership edges query.
+OWNERSHIP_GRAPH_BATCH_SIZE = settings.OWNERSHIP_GRAPH_BATCH_SIZE
+
+# The version of the ownership graph file format.
+GRAPH_VERSION = 1
+
+# The Wikidata properties linking a company to its owners and parents, and to
+# the company it was restructured into.
+OWNED_BY = "P127"
+PARENT_ORGANIZATION = "P749"
+FOLLOWED_BY = "P156"
+OWNERSHIP_PROPERTIES = [OWNED_BY, PARENT_ORGANIZATION, FOLLOWED_BY]
+
+# The whitelisted stock exchanges (NYSE, NASDAQ) with fallback labels.
+EXCHANGES = {"Q13677": "New York Stock Exchange",
+             "Q82059": "NASDAQ"}
+
+# A Wikidata SPARQL query to find all companies listed on a whitelisted stock
+# exchange with their ticker symbols.
+LISTED_COMPANIES_QUERY = (
+    'SELECT ?company ?companyLabel ?exchanges ?ticker'
+    ' WHERE {'
+    '  VALUES ?exchanges { wd:Q13677 wd:Q82059 } .'  # Whitelist NYSE, NASDAQ.
+    '  ?company p:P414 ?exchange .'  # Company traded on exchange.
+    '  ?exchange ps:P414 ?exchanges .'  # Stock exchange is whitelisted.
+    '  ?exchange pq:P249 ?ticker .'  # Get ticker symbol.
+    '  SERVICE wikibase:label {'
+    '   bd:serviceParam wikibase:language "en" .'  # Use English labels.
+    '  }'
+    ' }'
+    )
+
+# A Wikidata SPARQL query to find the direct ownership edges pointing at a set
+# of companies. The string parameter is the list of company IDs.
+OWNERSHIP_EDGES_QUERY = (
+    'SELECT ?child ?property ?parent'
+    ' WHERE {'
+    '  VALUES ?parent { %s } .'  # Companies to find the children of.
+    '  VALUES ?property { wdt:P127 wdt:P749 wdt:P156 } .'  # Ownership edges.
+    '  ?child ?property ?parent .'
+    ' }'
+    )
+
+
+def get_closure(edges, qids):
+    """Returns the entities reachable via zero or more edges."""
+
+    seen = list(qids)
+    found = set(seen)
+    index = 0
+    while index < len(seen):
+        for value in edges.get(seen[index], []):
+            if value not in found:
+                found.add(value)
+                seen.append(value)
+        index += 1
+    return seen
+
+
+def get_binding_id(binding, name):
+    """Returns the Wikidata ID (e.g. Q123 or P127) of an IRI in a binding."""
+
+    return binding[name]["value"].rsplit("/", 1)[-1]
+
+
+def get_company_data_from_rows(rows):
+    """Converts (company, root, ticker, exchange) label rows to company data,
+    sorted and deduplicated the same way as the results of
+    MID_TO_TICKER_QUERY.
+    """
+
+    if not rows:
+        return None
+
+    # Sort like the query, where an unbound root comes first.
+    rows = sorted(set(rows), key=lambda row: (
+        row[0], row[1] is not None, row[1] or "", row[2], row[3]))
+
+    datas = []
+    for name, root, ticker, exchange in rows:
+        data = {"name": name,
+                "ticker": ticker,
+                "exchange": exchange}
+        if root and root != name:
+            data["root"] = root
+        if data not in datas:
+            datas.append(data)
+
+    return datas
+
+
+class OwnershipGraph:
+    """A graph of company ownership with the listed root companies of every
+    company precomputed.
+
+    The roots of a company are the listed companies reachable via one or more
+    "owned by" or one or more "parent organization" steps, followed by zero or
+    more "followed by" steps. This is the transitive part of
+    MID_TO_TICKER_QUERY, which is slow to resolve on every request.
+    """
+
+    def __init__(self):
+        self.labels = {}
+        self.edges = {prop: {} for prop in OWNERSHIP_PROPERTIES}
+        self.listings = {}
+        self.roots = {}
+
+    def get_label(self, qid):
+        """Returns the English label of an entity, or its ID if there is none.
+        """
+
+        return self.labels.get(qid) or EXCHANGES.get(qid) or qid
+
+    def get_listings(self, qid):
+        """Returns the (exchange, ticker) pairs of a company."""
+
+        return self.listings.get(qid, [])
+
+    def get_roots(self, qid):
+        """Returns the precomputed (root, exchange, ticker) entries of a
+        company.
+        """
+
+        return self.roots.get(qid, [])
+
+    def get_root_rows(self, qid, name):
+        """Returns the (company, root, ticker, exchange) label rows for the
+        roots of a company.
+        """
+
+        return [(name, self.get_label(root), ticker, self.get_label(exchange))
+                for root, exchange, ticker in self.get_roots(qid)]
+
+    def compute_roots(self, qid):
+        """Computes the (root, exchange, ticker) entries of a company."""
+
+        roots = []
+        for prop in [OWNED_BY, PARENT_ORGANIZATION]:
+            edges = self.edges[prop]
+            owners = get_closure(edges, edges.get(qid, []))
+            for root in get_closure(self.edges[FOLLOWED_BY], owners):
+                for exchange, ticker in self.get_listings(root):
+                    entry = (root, exchange, ticker)
+                    if entry not in roots:
+                        roots.append(entry)
+        return roots
+
+    def get_nodes(self):
+        """Returns all entities with outgoing edges."""
+
+        nodes = set()
+        for edges in self.edges.values():
+            nodes.update(edges)
+        return nodes
+
+    def get_dependents(self, qids):
+        """Returns the entities from which any of the given ones are reachable,
+        including themselves. Their roots may depend on the given entities.
+        """
+
+        reverse_edges = {}
+        for edges in self.edges.values():
+            for source, targets in edges.items():
+                for target in targets:
+                    reverse_edges.setdefault(target, []).append(source)
+
+        return set(get_closure(reverse_edges, qids))
+
+    def recompute(self, qids):
+        """Recomputes the roots of the given companies."""
+
+        for qid in qids:
+            roots = self.compute_roots(qid)
+            if roots:
+                self.roots[qid] = roots
+            else:
+                self.roots.pop(qid, None)
+
+    def build(self):
+        """Computes the roots of all companies."""
+
+        self.roots = {}
+        self.recompute(self.get_nodes())
+
+    def update(self, labels, edges, listings):
+        """Replaces the graph data and recomputes the roots of only those
+        companies affected by changed edges or listings. Returns the number of
+        recomputed companies.
+        """
+
+        changed = set()
+        for prop in OWNERSHIP_PROPERTIES:
+            old_edges = self.edges[prop]
+            new_edges = edges.get(prop, {})
+            for qid in set(old_edges) | set(new_edges):
+                if old_edges.get(qid) != new_edges.get(qid):
+                    changed.add(qid)
+        for qid in set(self.listings) | set(listings):
+            if self.listings.get(qid) != listings.get(qid):
+                changed.add(qid)
+
+        # Find the dependents in both the old and new graph, so that removed
+        # edges are accounted for as well.
+        affected = self.get_dependents(changed)
+        self.labels = labels
+        self.edges = {prop: edges.get(prop, {})
+                      for prop in OWNERSHIP_PROPERTIES}
+        self.listings = listings
+        affected |= self.get_dependents(changed)
+
+        self.recompute(affected)
+        return len(affected)
+
+    def save(self, path=OWNERSHIP_GRAPH_PATH):
+        """Writes the graph, including the precomputed roots, to a file."""
+
+        data = {"version": GRAPH_VERSION,
+                "labels": self.labels,
+                "edges": self.edges,
+                "listings": self.listings,
+                "roots": self.roots}
+
+        # Write to a temporary file first so readers never see a partial graph.
+        temp_path = "%s.tmp" % path
+        with open(temp_path, "w") as graph_file:
+            dump(data, graph_file)
+        rename(temp_path, path)
+
+    @classmethod
+    def load(cls, path=OWNERSHIP_GRAPH_PATH):
+        """Reads a graph written by save()."""
+
+        with open(path, "r") as graph_file:
+            data = load(graph_file)
+
+        if data.get("version") != GRAPH_VERSION:
+            raise ValueError("Unsupported ownership graph version: %s" %
+                             data.get("version"))
+
+        graph = cls()
+        graph.labels = data["labels"]
+        graph.edges = {prop: data["edges"].get(prop, {})
+                       for prop in OWNERSHIP_PROPERTIES}
+        graph.listings = {qid: [tuple(listing) for listing in listings]
+                          for qid, listings in data["listings"].items()}
+        graph.roots = {qid: [tuple(root) for root in roots]
+                       for qid, roots in data["roots"].items()}
+        return graph
+
+
+# The graph instance shared by all threads in this process.
+_ownership_graph = None
+_ownership_graph_mtime = None
+_ownership_graph_checked = 0
+_ownership_graph_lock = Lock()
+
+
+def get_ownership_graph():
+    """Returns the process-wide ownership graph, reloading it when the refresh
+    job has written a new one. Returns None if the graph is disabled or hasn't
+    been built yet.
+    """
+
+    global _ownership_graph
+    global _ownership_graph_mtime
+    global _ownership_graph_checked
+
+    if not OWNERSHIP_GRAPH_ENABLED:
+        return None
+
+    with _ownership_graph_lock:
+        now = time()
+        if now - _ownership_graph_checked < OWNERSHIP_GRAPH_RELOAD_S:
+            return _ownership_graph
+        _ownership_graph_checked = now
+
+        try:
+            mtime = stat(OWNERSHIP_GRAPH_PATH).st_mtime
+        except OSError:
+            return _ownership_graph
+
+        if mtime != _ownership_graph_mtime:
+            _ownership_graph = OwnershipGraph.load(OWNERSHIP_GRAPH_PATH)
+            _ownership_graph_mtime = mtime
+
+        return _ownership_graph
+
+
+def parse_listed_companies(bindings):
+    """Collects the labels and the (exchange, ticker) listings by company ID
+    from LISTED_COMPANIES_QUERY response bindings.
+    """
+
+    labels = {}
+    listings = {}
+    for binding in bindings:
+        try:
+            qid = get_binding_id(binding, "company")
+            exchange = get_binding_id(binding, "exchanges")
+            ticker = binding["ticker"]["value"]
+            labels[qid] = binding["companyLabel"]["value"]
+        except KeyError:
+            continue
+        listing = (exchange, ticker)
+        if listing not in listings.setdefault(qid, []):
+            listings[qid].append(listing)
+
+    return (labels, listings)
+
+
+def fetch_edges_level(make_wikidata_request, frontier, edges, visited):
+    """Fetches the ownership edges of the companies on one level in batches
+    and adds them to the edges by property. Returns the companies on the
+    next level which weren't visited yet, or None if any request failed.
+    """
+
+    children = set()
+    for start in range(0, len(frontier), OWNERSHIP_GRAPH_BATCH_SIZE):
+        batch = frontier[start:start + OWNERSHIP_GRAPH_BATCH_SIZE]
+        values = " ".join(["wd:%s" % qid for qid in batch])
+        bindings = make_wikidata_request(OWNERSHIP_EDGES_QUERY % values)
+        if bindings is None:
+            return None
+
+        for binding in bindings:
+            try:
+                child = get_binding_id(binding, "child")
+                prop = get_binding_id(binding, "property")
+                parent = get_binding_id(binding, "parent")
+            except KeyError:
+                continue
+            if prop not in edges or not child.startswith("Q"):
+                continue
+            edges[prop].setdefault(child, []).append(parent)
+            if child not in visited:
+                visited.add(child)
+                children.add(child)
+
+    return children
+
+
+def fetch_ownership_data(make_wikidata_request):
+    """Fetches the listed companies and, level by level, the ownership edges
+    below them from Wikidata. Returns a (labels, edges, listings) tuple, or
+    None if any request failed.
+    """
+
+    bindings = make_wikidata_request(LISTED_COMPANIES_QUERY)
+    if bindings is None:
+        return None
+
+    labels, listings = parse_listed_companies(bindings)
+
+    edges = {prop: {} for prop in OWNERSHIP_PROPERTIES}
+    visited = set(listings)
+    frontier = sorted(listings)
+    for _ in range(OWNERSHIP_GRAPH_MAX_DEPTH):
+        children = fetch_edges_level(make_wikidata_request, frontier, edges,
+                                     visited)
+        if children is None:
+            return None
+        if not children:
+            break
+        frontier = sorted(children)
+
+    # Use a stable order so that unchanged data compares equal on refresh.
+    for prop_edges in edges.values():
+        for child, parents in prop_edges.items():
+            prop_edges[child] = sorted(set(parents))
+    for qid, company_listings in listings.items():
+        listings[qid] = sorted(company_listings)
+
+    return (labels, edges, listings)
+
+
+def refresh_ownership_graph(make_wikidata_request,
+                            path=OWNERSHIP_GRAPH_PATH):
+    """Fetches the latest ownership data, updates the roots of the affected
+    companies in the saved graph, and saves it again. Returns the number of
+    recomputed companies, or None if fetching the data failed.
+    """
+
+    data = fetch_ownership_data(make_wikidata_request)
+    if data is None:
+        return None
+
+    try:
+        graph = OwnershipGraph.load(path)
+    except (OSError, ValueError):
+        graph = OwnershipGraph()
+
+    labels, edges, listings = data
+    count = graph.update(labels, edges, listings)
+    graph.save(path)
+
+    return count
@@ -0,0 +1,184 @@
+# -*- coding: utf-8 -*-
+
+from queue import Empty
+from queue import Queue
+from threading import Event
+from threading import Lock
+from threading import Thread
+from time import time
+
+from django.conf import settings
+
+from .logs import Logs
+
+# The maximum number of items waiting on the queue of each pipeline stage.
+PIPELINE_QUEUE_SIZE = settings.PIPELINE_QUEUE_SIZE
+
+# The maximum time in seconds that workers wait for a new item on the queue.
+QUEUE_TIMEOUT_S = settings.QUEUE_TIMEOUT_S
+
+
+class Stage:
+    """One step of a pipeline with its own bounded queue and pool of worker
+    threads. The function is called with the logs of the worker and an item.
+    Its return value is passed on to the next stage unless it's None. A queue
+    with its own overload handling may be passed in instead of the default
+    bounded queue. Items which leave the pipeline at this stage, because
+    it's the last one or returned None or failed, are passed to the done
+    callback if there is one.
+    """
+
+    def __init__(self, name, function, num_threads,
+                 queue_size=PIPELINE_QUEUE_SIZE, queue=None):
+        self.name = name
+        self.function = function
+        self.num_threads = num_threads
+        self.queue = queue if queue is not None else Queue(maxsize=queue_size)
+        self.next_stage = None
+        self.on_done = None
+        self.logs_to_cloud = False
+        self.stop_event = Event()
+        self.workers = []
+        self.stats_lock = Lock()
+        self.processed = 0
+        self.errors = 0
+        self.busy_s = 0
+        self.start_time = None
+
+    def start(self, logs_to_cloud):
+        """Starts the worker threads."""
+
+        self.logs_to_cloud = logs_to_cloud
+        self.stop_event.clear()
+        self.start_time = time()
+        self.workers = []
+        for worker_id in range(self.num_threads):
+            worker = Thread(target=self.process_queue, args=[worker_id])
+            worker.daemon = True
+            worker.start()
+            self.workers.append(worker)
+
+    def stop(self):
+        """Waits for the queued items to be processed and shuts down the
+        worker threads.
+        """
+
+        self.queue.join()
+        self.stop_event.set()
+        for worker in self.workers:
+            # Block until the thread terminates.
+            worker.join()
+        self.workers = []
+
+    def put(self, item):
+        """Puts an item on the queue. A full queue blocks, unless it has its
+        own overload policy.
+        """
+
+        self.queue.put(item)
+
+    def process_queue(self, worker_id):
+        """Continuously processes items on the queue."""
+
+        # Create a new logs instance (with its own httplib2 instance) so that
+        # there is a separate one for each thread.
+        logs = Logs("pipeline-%s-worker-%s" % (self.name, worker_id),
+                    to_cloud=self.logs_to_cloud)
+
+        logs.debug("Started %s worker thread: %s", self.name, worker_id)
+        while not self.stop_event.is_set():
+            try:
+                item = self.queue.get(block=True, timeout=QUEUE_TIMEOUT_S)
+            except Empty:
+                # Timed out on an empty queue.
+                continue
+
+            start_time = time()
+            result = None
+            try:
+                result = self.function(logs, item)
+                if result is not None and self.next_stage:
+                    self.next_stage.put(result)
+            except Exception:
+                # The main loop doesn't catch and report exceptions from
+                # background threads, so do that here.
+                logs.catch()
+                with self.stats_lock:
+                    self.errors += 1
+            finally:
+                # Report the item before marking it as done, so that it's
+                # reported by the time the pipeline has drained.
+                if self.on_done and (result is None or not self.next_stage):
+                    self.on_done(item)
+                self.queue.task_done()
+
+            duration_s = time() - start_time
+            with self.stats_lock:
+                self.processed += 1
+                self.busy_s += duration_s
+            logs.debug("%s worker %s took %.f ms with %d items remaining.",
+                       self.name, worker_id, duration_s * 1000,
+                       self.queue.qsize())
+        logs.debug("Stopped %s worker thread: %s", self.name, worker_id)
+
+    def get_stats(self):
+        """Returns the queue depth and the throughput of the stage."""
+
+        with self.stats_lock:
+            processed = self.processed
+            errors = self.errors
+            busy_s = self.busy_s
+
+        elapsed_s = time() - self.start_time if self.start_time else 0
+        return {"queue_depth": self.queue.qsize(),
+                "queue_size": self.queue.maxsize,
+                "workers": len(self.workers),
+                "processed": processed,
+                "errors": errors,
+                "throughput": processed / elapsed_s if elapsed_s else 0,
+                "mean_ms": busy_s / processed * 1000 if processed else 0}
+
+
+class Pipeline:
+    """A chain of stages where each stage hands its results to the next one,
+    so that a slow stage only holds up its own queue. The done callback is
+    called with each item which leaves the pipeline, as it was put on the
+    stage where it left.
+    """
+
+    def __init__(self, stages, logs_to_cloud, on_done=None):
+        self.stages = stages
+        self.logs_to_cloud = logs_to_cloud
+        self.logs = Logs(name="pipeline", to_cloud=logs_to_cloud)
+        for stage, next_stage in zip(stages, stages[1:]):
+            stage.next_stage = next_stage
+        for stage in stages:
+            stage.on_done = on_done
+
+    def start(self):
+        """Starts the worker threads of all stages."""
+
+        for stage in self.stages:
+            self.logs.debug("Starting %d %s worker threads.",
+                            stage.num_threads, stage.name)
+            stage.start(self.logs_to_cloud)
+
+    def stop(self):
+        """Drains and stops the stages in order, so that items already in the
+        pipeline reach the last stage.
+        """
+
+        for stage in self.stages:
+            self.logs.debug("Stopping %s stage.", stage.name)
+            stage.stop()
+        self.logs.info("Pipeline stats: %s", self.get_stats())
+
+    def put(self, item):
+        """Puts an item on the queue of the first stage."""
+
+        self.stages[0].put(item)
+
+    def get_stats(self):
+        """Returns the statistics of each stage by name."""
+
+        return {stage.name: stage.get_stats() for stage in self.stages}
@@ -0,0 +1,299 @@
+# -*- coding: utf-8 -*-
+
+from collections import OrderedDict
+from os import fsync
+from os import replace
+from threading import Condition
+from threading import Lock
+from threading import Thread
+from time import sleep
+
+from django.conf import settings
+
+from .logs import Logs
+from .ratelimit import TokenBucket
+from .utils.json import dumps
+from .utils.json import loads
+
+# The path to the outbox of tweets waiting to be posted.
+PUBLISHER_OUTBOX_PATH = settings.PUBLISHER_OUTBOX_PATH
+
+# The steady number of tweets per second the publisher may post.
+PUBLISHER_RATE_PER_S = settings.PUBLISHER_RATE_PER_S
+
+# The number of tweets the publisher may post in a burst.
+PUBLISHER_BURST = settings.PUBLISHER_BURST
+
+# The time in seconds to wait before retrying a failed tweet.
+PUBLISHER_RETRY_S = settings.PUBLISHER_RETRY_S
+
+# The number of times to try posting a tweet before dropping it.
+PUBLISHER_MAX_ATTEMPTS = settings.PUBLISHER_MAX_ATTEMPTS
+
+# The number of finished tweets after which the outbox is compacted.
+PUBLISHER_COMPACT_COUNT = settings.PUBLISHER_COMPACT_COUNT
+
+# The HTTP status codes of rate limit errors, which are worth retrying.
+RATE_LIMIT_ERRORS = [420, 429]
+
+
+def merge_companies(companies, new_companies):
+    """Returns the companies with the new ones added, leaving out any with the
+    same name and ticker symbol.
+    """
+
+    merged = list(companies)
+    keys = set((company["name"], company["ticker"]) for company in companies)
+    for company in new_companies:
+        key = (company["name"], company["ticker"])
+        if key not in keys:
+            merged.append(company)
+            keys.add(key)
+    return merged
+
+
+def is_permanent(exception):
+    """Checks whether an API error is a client error which won't go away by
+    retrying, unlike rate limits and server errors.
+    """
+
+    response = getattr(exception, "response", None)
+    status = getattr(response, "status_code", None)
+    return (status is not None and 400 <= status < 500 and
+            status not in RATE_LIMIT_ERRORS)
+
+
+class Publisher:
+    """Posts tweets about companies from one background thread within a rate
+    limit, so that callers only wait for the tweet to be queued. Alerts for
+    the same source tweet which queue up are coalesced into one tweet. The
+    queued alerts are kept in an outbox on disk until they are posted, or
+    dropped after a permanent error or too many attempts. The outbox is
+    compacted when it's loaded and after a number of finished alerts.
+    """
+
+    def __init__(self, make_twitter, logs_to_cloud,
+                 path=PUBLISHER_OUTBOX_PATH, rate_per_s=PUBLISHER_RATE_PER_S,
+                 burst=PUBLISHER_BURST, retry_s=PUBLISHER_RETRY_S,
+                 max_attempts=PUBLISHER_MAX_ATTEMPTS,
+                 compact_count=PUBLISHER_COMPACT_COUNT):
+        self.make_twitter = make_twitter
+        self.logs = Logs(name="publisher", to_cloud=logs_to_cloud)
+        self.path = path
+        self.bucket = TokenBucket(rate_per_s, burst)
+        self.retry_s = retry_s
+        self.max_attempts = max_attempts
+        self.compact_count = compact_count
+        self.condition = Condition()
+        self.pending = OrderedDict()
+        self.attempts = {}
+        self.done_count = 0
+        self.outbox_file = None
+        self.publishing = False
+        self.thread = None
+        self.stats = {"queued": 0,
+                      "coalesced": 0,
+                      "published": 0,
+                      "failed": 0,
+                      "dropped": 0,
+                      "compactions": 0}
+        self.load()
+        if self.pending:
+            self.start()
+
+    def load(self):
+        """Reads the alerts which weren't posted yet from the outbox and
+        rewrites it with only those.
+        """
+
+        try:
+            with open(self.path, "r", encoding="utf-8") as outbox_file:
+                for line in outbox_file:
+                    try:
+                        record = loads(line)
+                    except ValueError:
+                        continue
+                    if record["op"] == "put":
+                        self.add(record["id"], record["link"],
+                                 record["companies"])
+                    else:
+                        self.pending.pop(record["id"], None)
+        except FileNotFoundError:
+            pass
+
+        self.compact()
+        if self.pending:
+            self.logs.info("Loaded %d unposted tweets.", len(self.pending))
+
+    def compact(self):
+        """Rewrites the outbox with only the pending alerts. Must be called
+        with the lock held, while no alert is being posted.
+        """
+
+        compact_path = "%s.tmp" % self.path
+        with open(compact_path, "w", encoding="utf-8") as compact_file:
+            for tweet_id, (link, companies) in self.pending.items():
+                compact_file.write("%s\n" % dumps(
+                    {"op": "put", "id": tweet_id, "link": link,
+                     "companies": companies}))
+            compact_file.flush()
+            fsync(compact_file.fileno())
+        if self.outbox_file:
+            self.outbox_file.close()
+        replace(compact_path, self.path)
+
+        self.outbox_file = open(self.path, "a", encoding="utf-8")
+        self.done_count = 0
+        self.stats["compactions"] += 1
+
+    def finish(self, tweet_id):
+        """Records that an alert was posted or dropped, unless more alerts
+        for the same tweet were queued in the meantime, and compacts the
+        outbox every so often. Must be called with the lock held.
+        """
+
+        self.attempts.pop(tweet_id, None)
+        if tweet_id in self.pending:
+            return
+
+        self.write({"op": "done", "id": tweet_id})
+        self.done_count += 1
+        if self.done_count >= self.compact_count:
+            self.compact()
+
+    def write(self, record):
+        """Appends a record to the outbox and syncs it to disk. Must be called
+        with the lock held.
+        """
+
+        self.outbox_file.write("%s\n" % dumps(record))
+        self.outbox_file.flush()
+        fsync(self.outbox_file.fileno())
+
+    def add(self, tweet_id, link, companies):
+        """Adds an alert to the pending ones, coalescing it with a pending
+        alert for the same tweet. Returns whether it was coalesced. Must be
+        called with the lock held.
+        """
+
+        if tweet_id in self.pending:
+            pending_link, pending_companies = self.pending[tweet_id]
+            self.pending[tweet_id] = (
+                pending_link, merge_companies(pending_companies, companies))
+            return True
+
+        self.pending[tweet_id] = (link, companies)
+        return False
+
+    def put(self, tweet_id, link, companies):
+        """Queues an alert about the companies in a tweet and returns right
+        away.
+        """
+
+        with self.condition:
+            self.write({"op": "put", "id": tweet_id, "link": link,
+                        "companies": companies})
+            coalesced = self.add(tweet_id, link, companies)
+            self.stats["queued"] += 1
+            if coalesced:
+                self.stats["coalesced"] += 1
+            if self.thread is None:
+                self.start()
+            self.condition.notify_all()
+
+    def start(self):
+        """Starts the background thread. Must be called with the lock held."""
+
+        self.thread = Thread(target=self.run, name="publisher")
+        self.thread.daemon = True
+        self.thread.start()
+
+    def run(self):
+        """Continuously posts the oldest pending alert."""
+
+        twitter = None
+        while True:
+            with self.condition:
+                while not self.pending:
+                    self.condition.wait()
+
+            # Wait for the rate limit before taking the alert, so that more
+            # alerts for the same tweet can still be coalesced.
+            self.bucket.acquire()
+
+            with self.condition:
+                tweet_id, (link, companies) = self.pending.popitem(last=False)
+                self.publishing = True
+
+            try:
+                if twitter is None:
+                    twitter = self.make_twitter()
+                twitter.post_tweet(companies, link)
+            except Exception as exception:
+                self.logs.catch()
+                twitter = None
+                with self.condition:
+                    self.stats["failed"] += 1
+                    attempts = self.attempts.get(tweet_id, 0) + 1
+                    self.attempts[tweet_id] = attempts
+                    if (is_permanent(exception) or
+                            attempts >= self.max_attempts):
+                        self.logs.error("Dropping tweet after %d attempts: "
+                                        "%s", attempts, link)
+                        self.stats["dropped"] += 1
+                        self.finish(tweet_id)
+                        self.publishing = False
+                        self.condition.notify_all()
+                        continue
+
+                    # Retry later, keeping alerts queued in the meantime.
+                    if tweet_id in self.pending:
+                        self.pending[tweet_id] = (link, merge_companies(
+                            companies, self.pending[tweet_id][1]))
+                    else:
+                        self.pending[tweet_id] = (link, companies)
+                    self.pending.move_to_end(tweet_id, last=False)
+                    self.publishing = False
+                    self.condition.notify_all()
+                sleep(self.retry_s)
+                continue
+
+            with self.condition:
+                self.finish(tweet_id)
+                self.stats["published"] += 1
+                self.publishing = False
+                self.condition.notify_all()
+
+    def flush(self):
+        """Waits until all pending alerts have been posted."""
+
+        with self.condition:
+            while self.pending or self.publishing:
+                self.condition.wait()
+
+    def get_stats(self):
+        """Returns the counts of queued, coalesced, published, failed and
+        dropped alerts and compactions, the pending ones and the rate limit
+        tokens.
+        """
+
+        with self.condition:
+            stats = dict(self.stats)
+            stats["pending"] = len(self.pending)
+        stats["rate_limit"] = self.bucket.get_stats()
+        return stats
+
+
+# The process-wide publisher, created on first use.
+_publisher = None
+_publisher_lock = Lock()
+
+
+def get_publisher(make_twitter, logs_to_cloud):
+    """Returns the process-wide publisher."""
+
+    global _publisher
+    with _publisher_lock:
+        if _publisher is None:
+            _publisher = Publisher(make_twitter, logs_to_cloud)
+        return _publisher
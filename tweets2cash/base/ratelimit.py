@@ -0,0 +1,119 @@
+# -*- coding: utf-8 -*-
+
+from collections import deque
+from threading import Lock
+from time import sleep
+from time import time
+
+from django.conf import settings
+
+# The length in seconds of a Twitter API rate limit window.
+RATE_LIMIT_WINDOW_S = settings.RATE_LIMIT_WINDOW_S
+
+
+class RateBudget:
+    """Allows at most a number of calls in each rolling time window across
+    all threads, like the per-endpoint rate limits of the Twitter API.
+    """
+
+    def __init__(self, limit, window_s=RATE_LIMIT_WINDOW_S):
+        self.limit = limit
+        self.window_s = window_s
+        self.lock = Lock()
+        self.calls = deque()
+        self.waited_s = 0
+
+    def acquire(self):
+        """Takes one call from the budget, waiting until the oldest call in
+        the window expires if there are none left.
+        """
+
+        while True:
+            with self.lock:
+                now = time()
+                while self.calls and now - self.calls[0] >= self.window_s:
+                    self.calls.popleft()
+
+                if len(self.calls) < self.limit:
+                    self.calls.append(now)
+                    return
+
+                wait_s = self.window_s - (now - self.calls[0])
+                self.waited_s += wait_s
+
+            sleep(wait_s)
+
+    def get_stats(self):
+        """Returns the limit, the calls in the current window and the total
+        time spent waiting.
+        """
+
+        with self.lock:
+            now = time()
+            used = len([call for call in self.calls
+                        if now - call < self.window_s])
+            return {"limit": self.limit,
+                    "used": used,
+                    "waited_s": self.waited_s}
+
+
+class TokenBucket:
+    """Allows calls at a steady rate across all threads, with bursts of up to
+    a number of calls after a quiet period.
+    """
+
+    def __init__(self, rate_per_s, capacity):
+        self.rate_per_s = rate_per_s
+        self.capacity = capacity
+        self.lock = Lock()
+        self.tokens = capacity
+        self.updated_at = time()
+        self.waited_s = 0
+
+    def refill(self):
+        """Adds the tokens accrued since the last update. Must be called with
+        the lock held.
+        """
+
+        now = time()
+        self.tokens = min(self.tokens + (now - self.updated_at) *
+                          self.rate_per_s, self.capacity)
+        self.updated_at = now
+
+    def acquire(self):
+        """Takes one token, waiting until there is one."""
+
+        while True:
+            with self.lock:
+                self.refill()
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+
+                wait_s = (1 - self.tokens) / self.rate_per_s
+                self.waited_s += wait_s
+
+            sleep(wait_s)
+
+    def get_stats(self):
+        """Returns the available tokens and the total time spent waiting."""
+
+        with self.lock:
+            self.refill()
+            return {"tokens": self.tokens,
+                    "capacity": self.capacity,
+                    "waited_s": self.waited_s}
+
+
+# The process-wide rate budgets by endpoint, created on first use.
+_budgets = {}
+_budgets_lock = Lock()
+
+
+def get_budget(name, limit):
+    """Returns the process-wide rate budget for an endpoint."""
+
+    with _budgets_lock:
+        if name not in _budgets:
+            _budgets[name] = RateBudget(limit)
+        return _budgets[name]
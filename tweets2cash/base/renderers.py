@@ -0,0 +1,36 @@
+# -*- coding: utf-8 -*-
+
+from rest_framework import renderers
+
+from .utils import json
+
+# The line and paragraph separators, which are valid in JSON strings but not
+# in javascript ones.
+LINE_SEPARATOR = "\u2028".encode("utf-8")
+PARAGRAPH_SEPARATOR = "\u2029".encode("utf-8")
+
+
+class JSONRenderer(renderers.JSONRenderer):
+    """Renders compact JSON with the configured JSON backend. Indented and
+    non-compact output is rendered by the standard library as before.
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return bytes()
+
+        renderer_context = renderer_context or {}
+        indent = self.get_indent(accepted_media_type, renderer_context)
+        if (json.backend.name == "stdlib" or indent is not None or
+                not self.compact):
+            return super().render(data, accepted_media_type=accepted_media_type,
+                                  renderer_context=renderer_context)
+
+        ret = json.backend.dumpb(data, ensure_ascii=self.ensure_ascii,
+                                 encoder_class=self.encoder_class,
+                                 allow_nan=not self.strict)
+
+        # Fully escape \u2028 and \u2029 like the standard renderer, so that
+        # the output is a strict javascript subset.
+        return ret.replace(LINE_SEPARATOR, b"\\u2028").replace(
+            PARAGRAPH_SEPARATOR, b"\\u2029")
@@ -0,0 +1,247 @@
+# -*- coding: utf-8 -*-
+
+from atexit import register
+from copy import deepcopy
+from google.cloud.language.document import Annotations
+from google.cloud.language.entity import Entity
+from google.cloud.language.sentiment import Sentiment
+from hashlib import sha256
+from os import makedirs
+from os import rename
+from os.path import dirname
+from os.path import exists
+from simplejson import dump
+from simplejson import load
+from threading import Lock
+
+from django.conf import settings
+
+# The mode of the replay layer: "off" to always call the live APIs, "record"
+# to call them and save their responses, or "replay" to only use saved
+# responses.
+REPLAY_MODE = settings.REPLAY_MODE
+
+# The path to the fixture file with the recorded responses.
+REPLAY_FIXTURES_PATH = settings.REPLAY_FIXTURES_PATH
+
+# The version of the fixture file format. Fixtures with a different version
+# must be recorded again.
+FIXTURES_VERSION = 1
+
+# The modes of the replay layer.
+MODES = ["off", "record", "replay"]
+
+
+class ReplayError(Exception):
+    """Raised when a response can't be replayed."""
+
+
+class Replay:
+    """Records the responses of the external APIs to a fixture file and
+    replays them deterministically. Responses are stored as JSON by service
+    and request. Recorded responses are saved on request and at exit.
+    """
+
+    def __init__(self, mode=REPLAY_MODE, path=REPLAY_FIXTURES_PATH):
+        if mode not in MODES:
+            raise ValueError("Unknown replay mode: %s" % mode)
+
+        self.mode = mode
+        self.path = path
+        self.lock = Lock()
+        self.responses = {}
+        self.recorded = 0
+        self.replayed = 0
+        self.missed = 0
+        self.dirty = False
+
+        if mode != "off":
+            self.load()
+        if mode == "record":
+            register(self.save)
+
+    def load(self):
+        """Reads the recorded responses from the fixture file. Fixtures from
+        another format version are discarded when recording and rejected when
+        replaying.
+        """
+
+        if not exists(self.path):
+            if self.mode == "replay":
+                raise ReplayError("No replay fixtures: %s" % self.path)
+            return
+
+        with open(self.path, "r", encoding="utf-8") as fixtures_file:
+            fixtures = load(fixtures_file)
+
+        version = fixtures.get("version")
+        if version != FIXTURES_VERSION:
+            if self.mode == "replay":
+                raise ReplayError(
+                    "Replay fixtures have version %s instead of %s: %s" %
+                    (version, FIXTURES_VERSION, self.path))
+            return
+
+        self.responses = fixtures["responses"]
+
+    def save(self):
+        """Writes the recorded responses to the fixture file, if there are
+        any new ones.
+        """
+
+        with self.lock:
+            if not self.dirty:
+                return
+
+            directory = dirname(self.path)
+            if directory and not exists(directory):
+                makedirs(directory)
+
+            # Write to a temporary file first so readers never see partial
+            # data.
+            temp_path = "%s.tmp" % self.path
+            with open(temp_path, "w", encoding="utf-8") as fixtures_file:
+                dump({"version": FIXTURES_VERSION,
+                      "responses": self.responses},
+                     fixtures_file, indent=2, sort_keys=True)
+            rename(temp_path, self.path)
+            self.dirty = False
+
+    def get_request_key(self, request):
+        """Returns the key for storing the response to a request."""
+
+        return sha256(request.encode("utf-8")).hexdigest()
+
+    def call(self, service, request, function, encode=None, decode=None):
+        """Calls the function for a request to a service, or replays its
+        recorded response. The optional encode and decode functions convert
+        the result to and from JSON data. Failed calls, i.e. those which
+        return None, aren't recorded.
+        """
+
+        if self.mode == "off":
+            return function()
+
+        key = self.get_request_key(request)
+
+        if self.mode == "replay":
+            with self.lock:
+                try:
+                    response = self.responses[service][key]["response"]
+                except KeyError:
+                    self.missed += 1
+                    raise ReplayError("No recorded %s response for: %s" %
+                                      (service, request))
+                self.replayed += 1
+            response = deepcopy(response)
+            return decode(response) if decode else response
+
+        result = function()
+        if result is None:
+            return result
+
+        response = encode(result) if encode else deepcopy(result)
+        with self.lock:
+            self.responses.setdefault(service, {})[key] = {
+                "request": request,
+                "response": response}
+            self.recorded += 1
+            self.dirty = True
+
+        return result
+
+    def get_stats(self):
+        """Returns the number of recorded, replayed and missed responses."""
+
+        with self.lock:
+            return {"mode": self.mode,
+                    "recorded": self.recorded,
+                    "replayed": self.replayed,
+                    "missed": self.missed}
+
+
+def encode_entity(entity):
+    """Converts a Natural Language entity to JSON data."""
+
+    return {"name": entity.name,
+            "entity_type": entity.entity_type,
+            "metadata": dict(entity.metadata),
+            "salience": entity.salience,
+            "mentions": [str(mention) for mention in entity.mentions]}
+
+
+def decode_entity(data):
+    """Converts JSON data to a Natural Language entity."""
+
+    return Entity(name=data["name"],
+                  entity_type=data["entity_type"],
+                  metadata=data["metadata"],
+                  salience=data["salience"],
+                  mentions=data["mentions"])
+
+
+def encode_sentiment(sentiment):
+    """Converts a Natural Language sentiment to JSON data."""
+
+    if sentiment is None:
+        return None
+
+    return {"score": sentiment.score,
+            "magnitude": sentiment.magnitude}
+
+
+def decode_sentiment(data):
+    """Converts JSON data to a Natural Language sentiment."""
+
+    if data is None:
+        return None
+
+    return Sentiment(score=data["score"], magnitude=data["magnitude"])
+
+
+def encode_entities(entities):
+    """Converts a list of Natural Language entities to JSON data."""
+
+    return [encode_entity(entity) for entity in entities]
+
+
+def decode_entities(data):
+    """Converts JSON data to a list of Natural Language entities."""
+
+    return [decode_entity(entity) for entity in data]
+
+
+def encode_annotations(annotations):
+    """Converts Natural Language annotations with entities and sentiment to
+    JSON data. Syntax annotations aren't kept.
+    """
+
+    return {"entities": encode_entities(annotations.entities),
+            "sentiment": encode_sentiment(annotations.sentiment),
+            "language": annotations.language}
+
+
+def decode_annotations(data):
+    """Converts JSON data to Natural Language annotations."""
+
+    return Annotations(sentences=[],
+                       tokens=[],
+                       sentiment=decode_sentiment(data["sentiment"]),
+                       entities=decode_entities(data["entities"]),
+                       language=data["language"])
+
+
+# The replay instance shared by all threads in this process.
+_replay = None
+_replay_lock = Lock()
+
+
+def get_replay():
+    """Returns the process-wide replay layer."""
+
+    global _replay
+
+    with _replay_lock:
+        if _replay is None:
+            _replay = Replay()
+        return _replay
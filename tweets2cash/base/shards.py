@@ -0,0 +1,345 @@
+# -*- coding: utf-8 -*-
+
+from collections import deque
+from hashlib import md5
+from math import ceil
+from threading import Lock
+from threading import Thread
+from time import time
+from tweepy.streaming import StreamListener
+
+from django.conf import settings
+
+from .logs import Logs
+
+# The maximum number of users to follow on one stream connection.
+STREAM_SHARD_SIZE = settings.STREAM_SHARD_SIZE
+
+# The time in seconds to wait before restarting a failed stream connection.
+STREAM_SHARD_RESTART_S = settings.STREAM_SHARD_RESTART_S
+
+# The maximum time in seconds to wait before restarting a stream connection,
+# as the wait doubles after each failure.
+STREAM_SHARD_MAX_RESTART_S = settings.STREAM_SHARD_MAX_RESTART_S
+
+# The minimum time in seconds to wait after the API rate limited a stream
+# connection with status 420.
+RATE_LIMITED_RESTART_S = 60
+
+# The time in seconds between checks of the stream connections.
+CHECK_INTERVAL_S = 1
+
+# The maximum time in seconds to wait for a replaced stream connection to
+# close, which may take until the next keep-alive message arrives.
+STOP_TIMEOUT_S = 90
+
+# The time in seconds over which message rates are measured.
+RATE_WINDOW_S = 60
+
+
+def get_score(user_id, index):
+    """Returns the weight of a user for a shard, for rendezvous hashing."""
+
+    key = ("%s:%d" % (user_id, index)).encode("utf-8")
+    return int.from_bytes(md5(key).digest()[:8], "little")
+
+
+def get_num_shards(follow, shard_size=STREAM_SHARD_SIZE):
+    """Returns the number of shards needed to follow the users."""
+
+    num_users = len(set(str(user_id) for user_id in follow))
+    return max(int(ceil(num_users / shard_size)), 1)
+
+
+def partition(follow, shard_size=STREAM_SHARD_SIZE):
+    """Splits the followed users into as few shards as fit them. Each user
+    goes to the shard with the highest weight which isn't full yet, so that
+    few users move between shards when the users change.
+    """
+
+    user_ids = sorted(set(str(user_id) for user_id in follow))
+    num_shards = get_num_shards(user_ids, shard_size)
+    shards = [[] for _ in range(num_shards)]
+    for user_id in user_ids:
+        indexes = sorted(range(num_shards),
+                         key=lambda index: get_score(user_id, index),
+                         reverse=True)
+        for index in indexes:
+            if len(shards[index]) < shard_size:
+                shards[index].append(user_id)
+                break
+    return shards
+
+
+class ShardListener(StreamListener):
+    """Passes the data of one stream connection to the shared listener and
+    tracks the health and message rate of the connection.
+    """
+
+    def __init__(self, index, listener, logs):
+        self.index = index
+        self.listener = listener
+        self.logs = logs
+        self.lock = Lock()
+        self.connected = False
+        self.connects = 0
+        self.errors = 0
+        self.last_error = None
+        self.messages = 0
+        self.last_message_at = None
+        self.rate_counts = deque()
+
+    def on_connect(self):
+        """Records a new connection."""
+
+        with self.lock:
+            self.connected = True
+            self.connects += 1
+        self.logs.debug("Shard %d connected.", self.index)
+
+    def on_data(self, data):
+        """Counts the message and passes it to the shared listener."""
+
+        now = time()
+        with self.lock:
+            self.messages += 1
+            self.last_message_at = now
+            second = int(now)
+            if self.rate_counts and self.rate_counts[-1][0] == second:
+                self.rate_counts[-1][1] += 1
+            else:
+                self.rate_counts.append([second, 1])
+            while self.rate_counts[0][0] <= second - RATE_WINDOW_S:
+                self.rate_counts.popleft()
+
+        return self.listener.on_data(data)
+
+    def on_error(self, status):
+        """Records an API error and disconnects, leaving the restart to the
+        shards.
+        """
+
+        self.logs.warn("Shard %d Twitter error: %s", self.index, status)
+        self.record_error(status)
+        return False
+
+    def record_error(self, error):
+        """Records why the connection ended."""
+
+        with self.lock:
+            self.connected = False
+            self.errors += 1
+            self.last_error = error
+
+    def record_closed(self):
+        """Records that the connection was closed."""
+
+        with self.lock:
+            self.connected = False
+
+    def get_stats(self):
+        """Returns the connection state, counters and message rate."""
+
+        now = time()
+        with self.lock:
+            recent = sum(count for second, count in self.rate_counts
+                         if second > now - RATE_WINDOW_S)
+            idle_s = (now - self.last_message_at
+                      if self.last_message_at is not None else None)
+            return {"connected": self.connected,
+                    "connects": self.connects,
+                    "errors": self.errors,
+                    "last_error": self.last_error,
+                    "messages": self.messages,
+                    "messages_per_s": recent / RATE_WINDOW_S,
+                    "idle_s": idle_s}
+
+
+class StreamShard:
+    """One stream connection following a part of the users."""
+
+    def __init__(self, index, follow, listener, make_stream, logs):
+        self.index = index
+        self.follow = follow
+        self.logs = logs
+        self.shard_listener = ShardListener(index, listener, logs)
+        self.make_stream = make_stream
+        self.stream = None
+        self.thread = None
+        self.restarts = 0
+        self.restart_at = None
+
+    def start(self):
+        """Opens the connection in a background thread."""
+
+        self.stream = self.make_stream(self.shard_listener)
+        self.thread = Thread(target=self.run, name="stream-%d" % self.index)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def run(self):
+        """Streams until the connection ends."""
+
+        try:
+            self.stream.filter(follow=self.follow)
+        except Exception as exception:
+            self.logs.catch()
+            self.shard_listener.record_error(repr(exception))
+        self.shard_listener.record_closed()
+
+    def stop(self):
+        """Closes the connection."""
+
+        if self.stream:
+            self.stream.disconnect()
+
+    def join(self, timeout_s):
+        """Waits for the connection to close. Returns whether it closed."""
+
+        if self.thread is not None:
+            self.thread.join(timeout_s)
+        return not self.is_alive()
+
+    def is_alive(self):
+        """Checks whether the connection is still streaming."""
+
+        return self.thread is not None and self.thread.is_alive()
+
+    def get_stats(self):
+        """Returns the connection stats and the number of followed users and
+        restarts.
+        """
+
+        stats = self.shard_listener.get_stats()
+        stats["users"] = len(self.follow)
+        stats["alive"] = self.is_alive()
+        stats["restarts"] = self.restarts
+        return stats
+
+
+class StreamShards:
+    """Follows a large list of users over several stream connections, each
+    following at most a number of users, and passes all data to one shared
+    listener and its pipeline. Each connection streams on its own account,
+    since an account may only have one connection open, so there have to be
+    as many stream factories as connections. Connections which fail are
+    restarted with backoff. When the users change, only the connections whose
+    users changed are replaced, and each old connection is closed before the
+    new one is opened on its account.
+    """
+
+    def __init__(self, listener, make_streams, logs_to_cloud,
+                 shard_size=STREAM_SHARD_SIZE,
+                 restart_s=STREAM_SHARD_RESTART_S,
+                 max_restart_s=STREAM_SHARD_MAX_RESTART_S):
+        self.listener = listener
+        self.make_streams = make_streams
+        self.logs = Logs(name="stream-shards", to_cloud=logs_to_cloud)
+        self.shard_size = shard_size
+        self.restart_s = restart_s
+        self.max_restart_s = max_restart_s
+        self.lock = Lock()
+        self.follow_lock = Lock()
+        self.shards = []
+        self.wait_s = {}
+
+    def set_follow(self, follow):
+        """Partitions the users across the connections, replacing the ones
+        whose users changed. Raises a ValueError if there are fewer accounts
+        than connections.
+        """
+
+        new_follows = partition(follow, self.shard_size)
+        if len(new_follows) > len(self.make_streams):
+            raise ValueError("Not enough stream accounts for %d shards: %d" %
+                             (len(new_follows), len(self.make_streams)))
+        self.listener.set_follow(follow)
+
+        with self.follow_lock:
+            # Stop checking the connections which are replaced, so that they
+            # aren't restarted while they close.
+            with self.lock:
+                old_shards = self.shards
+                changed = [index for index, shard_follow
+                           in enumerate(new_follows)
+                           if (index >= len(old_shards) or
+                               old_shards[index].follow != shard_follow)]
+                replaced = [old_shards[index] for index in changed
+                            if index < len(old_shards)]
+                replaced.extend(old_shards[len(new_follows):])
+                self.shards = [shard for shard in old_shards
+                               if shard not in replaced]
+
+            for shard in replaced:
+                shard.stop()
+            for shard in replaced:
+                if not shard.join(STOP_TIMEOUT_S):
+                    self.logs.warn("Shard %d didn't close in time.",
+                                   shard.index)
+
+            with self.lock:
+                shards = self.shards
+                for index in changed:
+                    shard = StreamShard(index, new_follows[index],
+                                        self.listener,
+                                        self.make_streams[index], self.logs)
+                    shard.start()
+                    shards.append(shard)
+                    self.wait_s[index] = self.restart_s
+                for index in range(len(new_follows), len(old_shards)):
+                    self.wait_s.pop(index, None)
+                self.shards = sorted(shards, key=lambda shard: shard.index)
+
+        self.logs.info("Following %d users on %d streams, %d replaced.",
+                       sum(len(shard_follow) for shard_follow in new_follows),
+                       len(new_follows), len(replaced))
+
+    def run(self):
+        """Restarts failed connections until the listener stops, then closes
+        all connections.
+        """
+
+        while not self.listener.stop_event.wait(CHECK_INTERVAL_S):
+            self.check()
+        self.stop()
+
+    def check(self):
+        """Schedules restarts of connections which ended and restarts the
+        ones which are due.
+        """
+
+        now = time()
+        with self.lock:
+            for shard in self.shards:
+                if shard.is_alive():
+                    if shard.shard_listener.connected:
+                        self.wait_s[shard.index] = self.restart_s
+                    continue
+
+                if shard.restart_at is None:
+                    wait_s = self.wait_s.get(shard.index, self.restart_s)
+                    if shard.shard_listener.last_error == 420:
+                        wait_s = max(wait_s, RATE_LIMITED_RESTART_S)
+                    shard.restart_at = now + wait_s
+                    self.wait_s[shard.index] = min(wait_s * 2,
+                                                   self.max_restart_s)
+                    self.logs.warn("Restarting shard %d in %.0f seconds.",
+                                   shard.index, wait_s)
+                elif now >= shard.restart_at:
+                    shard.restart_at = None
+                    shard.restarts += 1
+                    shard.start()
+
+    def stop(self):
+        """Closes all connections."""
+
+        with self.lock:
+            shards = list(self.shards)
+        for shard in shards:
+            shard.stop()
+
+    def get_stats(self):
+        """Returns the connection health and message rate of each shard."""
+
+        with self.lock:
+            return [shard.get_stats() for shard in self.shards]
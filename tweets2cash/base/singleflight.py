@@ -0,0 +1,140 @@
+# -*- coding: utf-8 -*-
+
+from copy import deepcopy
+from threading import Event
+from threading import Lock
+
+
+class Call:
+    """An in-flight call whose result is shared with waiting callers."""
+
+    def __init__(self):
+        self.event = Event()
+        self.result = None
+        self.error = None
+
+    def wait(self):
+        """Blocks until the call is done and returns a copy of its result, so
+        that callers can't modify each other's data.
+        """
+
+        self.event.wait()
+        if self.error:
+            raise self.error
+        return deepcopy(self.result)
+
+
+class SingleFlight:
+    """Coalesces concurrent calls for the same key into a single call whose
+    result is shared by all callers.
+    """
+
+    def __init__(self):
+        self.lock = Lock()
+        self.calls = {}
+        self.requested = 0
+        self.executed = 0
+        self.coalesced = 0
+
+    def do(self, key, function, *args):
+        """Calls the function unless a call for the same key is already in
+        flight, in which case it waits for that call's result instead.
+        """
+
+        return self.do_many([key], lambda keys: {key: function(*args)})[key]
+
+    def do_many(self, keys, function):
+        """Calls the function with the keys which aren't already in flight.
+        The function must return a dictionary mapping keys to results. Waits
+        for the results of the other keys. Returns a dictionary of all
+        results.
+        """
+
+        own_calls, other_calls = self._claim(keys)
+
+        results = {}
+        if own_calls:
+            try:
+                values = function(list(own_calls))
+                for key, call in own_calls.items():
+                    call.result = values.get(key)
+                    results[key] = deepcopy(call.result)
+            except BaseException as error:
+                for call in own_calls.values():
+                    call.error = error
+                raise
+            finally:
+                with self.lock:
+                    for key in own_calls:
+                        del self.calls[key]
+                for call in own_calls.values():
+                    call.event.set()
+
+        results.update(self._wait(other_calls))
+        return results
+
+    def _claim(self, keys):
+        """Starts calls for the keys which aren't already in flight. Returns
+        the new calls and the calls in flight for the other keys, by key.
+        """
+
+        own_calls = {}
+        other_calls = {}
+        with self.lock:
+            for key in keys:
+                if key in own_calls or key in other_calls:
+                    continue
+
+                self.requested += 1
+                call = self.calls.get(key)
+                if call:
+                    self.coalesced += 1
+                    other_calls[key] = call
+                else:
+                    call = Call()
+                    self.calls[key] = call
+                    own_calls[key] = call
+            if own_calls:
+                self.executed += 1
+        return own_calls, other_calls
+
+    def _wait(self, calls):
+        """Waits for the calls of other callers and returns their results by
+        key.
+        """
+
+        return {key: call.wait() for key, call in calls.items()}
+
+    def get_stats(self):
+        """Returns the number of requested keys, executed calls and coalesced
+        keys.
+        """
+
+        with self.lock:
+            return {"requested": self.requested,
+                    "executed": self.executed,
+                    "coalesced": self.coalesced,
+                    "in_flight": len(self.calls)}
+
+
+# The named instances shared by all threads in this process.
+_single_flights = {}
+_single_flights_lock = Lock()
+
+
+def get_single_flight(name):
+    """Returns the process-wide single-flight group with the given name."""
+
+    with _single_flights_lock:
+        if name not in _single_flights:
+            _single_flights[name] = SingleFlight()
+        return _single_flights[name]
+
+
+def get_single_flight_stats():
+    """Returns the statistics of all single-flight groups by name."""
+
+    with _single_flights_lock:
+        single_flights = dict(_single_flights)
+    return {name: single_flight.get_stats() for
+            name, single_flight in single_flights.items()}
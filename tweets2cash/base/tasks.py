@@ -0,0 +1,20 @@
+# -*- coding: utf-8 -*-
+
+from tweets2cash.celery import app
+
+from .analysis import Analysis
+from .ownership import refresh_ownership_graph
+
+
+@app.task
+def refresh_ownership_graph_task():
+    """Refreshes the ownership graph used to resolve root companies."""
+
+    analysis = Analysis(logs_to_cloud=True)
+    count = refresh_ownership_graph(analysis.make_wikidata_request)
+    if count is None:
+        analysis.logs.error("Failed to refresh ownership graph.")
+    else:
+        analysis.logs.info("Refreshed ownership graph: %d companies updated.",
+                           count)
+    return count
@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+
+# The URL pattern for links to tweets.
+TWEET_URL = "https://twitter.com/%s/status/%s"
+
+
+def get_tweet_text(data, logs):
+    """Returns the full text of raw tweet data."""
+
+    # The format for getting at the full text is different depending on
+    # whether the tweet came through the REST API or the Streaming API:
+    # https://dev.twitter.com/overview/api/upcoming-changes-to-tweets
+    try:
+        if "extended_tweet" in data:
+            logs.debug("Decoding extended tweet from Streaming API.")
+            return data["extended_tweet"]["full_text"]
+        elif "full_text" in data:
+            logs.debug("Decoding extended tweet from REST API.")
+            return data["full_text"]
+        else:
+            logs.debug("Decoding short tweet.")
+            return data["text"]
+    except KeyError:
+        logs.error("Malformed tweet: %s", data)
+        return None
+
+
+class Tweet:
+    """The parts of a tweet needed for analysis and for tweeting about it,
+    without the rest of the raw data.
+    """
+
+    __slots__ = ["id", "author", "created_at", "text", "mentions", "link"]
+
+    def __init__(self, id, author, created_at, text, mentions, link):
+        self.id = id
+        self.author = author
+        self.created_at = created_at
+        self.text = text
+        self.mentions = mentions
+        self.link = link
+
+    @classmethod
+    def from_data(cls, data, logs):
+        """Extracts a tweet from raw tweet data. The mentions are (screen
+        name, name) pairs. Returns None if the data is malformed.
+        """
+
+        text = get_tweet_text(data, logs)
+
+        try:
+            user_mentions = data["entities"]["user_mentions"]
+        except KeyError:
+            logs.error("Malformed tweet: %s", data)
+            return None
+
+        mentions = []
+        for mention in user_mentions:
+            try:
+                mentions.append((mention["screen_name"], mention["name"]))
+            except KeyError:
+                logs.warn("Malformed mention: %s", mention)
+
+        tweet_id = data.get("id_str")
+        author = data.get("user", {}).get("screen_name")
+        link = TWEET_URL % (author, tweet_id) if author and tweet_id else None
+
+        return cls(id=tweet_id,
+                   author=author,
+                   created_at=data.get("created_at"),
+                   text=text,
+                   mentions=tuple(mentions),
+                   link=link)
+
+    def __repr__(self):
+        return "Tweet(id=%s, author=%s, created_at=%s, text=%r)" % (
+            self.id, self.author, self.created_at, self.text)
+
+
+def to_tweet(tweet, logs):
+    """Returns a tweet record, extracting it first if it's raw tweet data."""
+
+    if tweet is None or isinstance(tweet, Tweet):
+        return tweet
+
+    return Tweet.from_data(tweet, logs)
@@ -1,19 +1,38 @@
 # -*- coding: utf-8 -*-
 
+from collections import OrderedDict
+from collections import deque
+from functools import partial
 from os import getenv
-from simplejson import loads
-from queue import Empty
-from queue import Queue
 from threading import Event
+from threading import Lock
 from threading import Thread
-from time import time
 from tweepy import API
 from tweepy import Cursor
 from tweepy import OAuthHandler
 from tweepy import Stream
 from tweepy.streaming import StreamListener
 from django.conf import settings
+from .backfill import Backfill
+from .checkpoint import get_checkpoints
+from .dedupe import get_dedupe_window
+from .ingest import IngestQueue
+from .ingest import StreamFilter
+from .ingest import get_author_id
 from .logs import Logs
+from .pipeline import Pipeline
+from .pipeline import Stage
+from .publisher import get_publisher
+from .replay import get_replay
+from .shards import STREAM_SHARD_SIZE
+from .shards import StreamShards
+from .shards import get_num_shards
+from .tweet import TWEET_URL
+from .tweet import Tweet
+from .tweet import get_tweet_text
+from .tweet import to_tweet
+from .utils.json import dumps
+from .utils.json import loads
 
 # The keys for the Twitter account we're using for API requests and tweeting
 # alerts (@Tweets2Cash). Read from environment variables.
@@ -25,8 +44,10 @@ TWITTER_ACCESS_TOKEN_SECRET = settings.TWITTER_ACCESS_TOKEN_SECRET
 TWITTER_CONSUMER_KEY = settings.TWITTER_CONSUMER_KEY
 TWITTER_CONSUMER_SECRET = settings.TWITTER_CONSUMER_SECRET
 
-# The URL pattern for links to tweets.
-TWEET_URL = "https://twitter.com/%s/status/%s"
+# The "access_token:access_token_secret" pairs of the accounts to stream on
+# when following users on several streams, one per stream. Read from
+# environment variables.
+STREAM_SHARD_CREDENTIALS = settings.STREAM_SHARD_CREDENTIALS
 
 # Some emoji.
 EMOJI_THUMBS_UP = u"\U0001f44d"
@@ -39,8 +60,8 @@ MAX_TWEET_SIZE = settings.MAX_TWEET_SIZE
 # The number of worker threads processing tweets.
 NUM_THREADS = settings.NUM_THREADS
 
-# The maximum time in seconds that workers wait for a new task on the queue.
-QUEUE_TIMEOUT_S = settings.QUEUE_TIMEOUT_S
+# The number of worker threads decoding streamed data.
+DECODE_THREADS = settings.PIPELINE_DECODE_THREADS
 
 # The number of retries to attempt when an error occurs.
 API_RETRY_COUNT = settings.API_RETRY_COUNT
@@ -51,6 +72,16 @@ API_RETRY_DELAY_S = settings.API_RETRY_DELAY_S
 # The HTTP status codes for which to retry.
 API_RETRY_ERRORS = [400, 401, 500, 502, 503, 504]
 
+# Whether to checkpoint processed tweets and catch up on missed ones when
+# streaming starts.
+CHECKPOINT_ENABLED = settings.CHECKPOINT_ENABLED
+
+# The maximum number of live messages held back while catching up.
+CHECKPOINT_HOLD_SIZE = settings.CHECKPOINT_HOLD_SIZE
+
+# Whether to skip tweets which were already seen.
+DEDUPE_ENABLED = settings.DEDUPE_ENABLED
+
 
 class Twitter:
     """A helper for talking to Twitter APIs."""
@@ -69,22 +100,93 @@ class Twitter:
                                wait_on_rate_limit=True,
                                wait_on_rate_limit_notify=True)
         self.twitter_listener = None
+        self.stream_shards = None
+        self.replay = get_replay()
+
+    def start_streaming(self, callback=None, follow=[], stages=None):
+        """Starts streaming tweets and returning data to the callback, or
+        passing it through the pipeline stages if there are any. Tweets by
+        followed users which were missed since their checkpoints are caught
+        up on first. Following more users than one stream allows takes an
+        account per stream.
+        """
 
-    def start_streaming(self, callback,follow=[]):
-        """Starts streaming tweets and returning data to the callback."""
-
+        # Refuse to share accounts between streams, which Twitter doesn't
+        # allow.
+        sharded = len(follow) > STREAM_SHARD_SIZE
+        if sharded:
+            stream_auths = self.get_stream_auths()
+            num_shards = get_num_shards(follow)
+            if num_shards > len(stream_auths):
+                raise ValueError(
+                    "Following %d users takes %d streams, but only %d stream "
+                    "accounts are configured." %
+                    (len(follow), num_shards, len(stream_auths)))
+
+        checkpoints = get_checkpoints() if CHECKPOINT_ENABLED else None
+        dedupe_window = get_dedupe_window() if DEDUPE_ENABLED else None
         self.twitter_listener = TwitterListener(
-            callback=callback, logs_to_cloud=self.logs_to_cloud)
-        twitter_stream = Stream(self.twitter_auth, self.twitter_listener)
+            callback=callback, logs_to_cloud=self.logs_to_cloud,
+            stages=stages, follow=follow, checkpoints=checkpoints,
+            dedupe_window=dedupe_window)
+        self.twitter_listener.start_catch_up(self.backfill)
+
+        # Follow more users than one stream allows on several streams.
+        if sharded:
+            self.stream_shards = StreamShards(
+                self.twitter_listener,
+                [partial(Stream, auth) for auth in stream_auths],
+                logs_to_cloud=self.logs_to_cloud)
+            self.logs.debug("Starting sharded streams.")
+            self.stream_shards.set_follow(follow)
+            self.stream_shards.run()
+            self.logs.info("Stream shard stats: %s",
+                           self.stream_shards.get_stats())
+            self.stream_shards = None
+        else:
+            twitter_stream = Stream(self.twitter_auth, self.twitter_listener)
 
-        self.logs.debug("Starting stream.")
-        twitter_stream.filter(follow=follow)
+            self.logs.debug("Starting stream.")
+            twitter_stream.filter(follow=follow)
 
         # If we got here because of an API error, raise it.
         if self.twitter_listener and self.twitter_listener.get_error_status():
             raise Exception("Twitter API error: %s" %
                             self.twitter_listener.get_error_status())
 
+    def get_stream_auths(self):
+        """Returns the authentication of each account to stream on when
+        following users on several streams.
+        """
+
+        stream_auths = []
+        for credentials in STREAM_SHARD_CREDENTIALS:
+            access_token, _, access_token_secret = credentials.partition(":")
+            auth = OAuthHandler(TWITTER_CONSUMER_KEY, TWITTER_CONSUMER_SECRET)
+            auth.set_access_token(access_token.strip(),
+                                  access_token_secret.strip())
+            stream_auths.append(auth)
+        return stream_auths
+
+    def set_follow(self, follow):
+        """Changes the users followed by the current sharded streams."""
+
+        if not self.stream_shards:
+            self.logs.warn("No sharded streams to change.")
+            return
+
+        self.stream_shards.set_follow(follow)
+
+    def get_stream_stats(self):
+        """Returns the connection health and message rate of each sharded
+        stream.
+        """
+
+        if not self.stream_shards:
+            return []
+
+        return self.stream_shards.get_stats()
+
     def stop_streaming(self):
         """Stops the current stream."""
 
@@ -97,14 +199,24 @@ class Twitter:
         self.twitter_listener = None
 
     def tweet(self, companies, tweet):
+        """Queues a tweet listing the companies, their ticker symbols, and a
+        quote of the original tweet. It's posted in the background within
+        the rate limit, so this returns right away.
+        """
+
+        tweet = to_tweet(tweet, self.logs)
+        publisher = get_publisher(partial(Twitter, self.logs_to_cloud),
+                                  self.logs_to_cloud)
+        publisher.put(tweet.id, tweet.link, companies)
+
+    def post_tweet(self, companies, link):
         """Posts a tweet listing the companies, their ticker symbols, and a
-        quote of the original tweet.
+        link to the original tweet.
         """
 
-        link = self.get_tweet_link(tweet)
         text = self.make_tweet_text(companies, link)
 
-        self.logs.info("Tweeting: %s" % text)
+        self.logs.info("Tweeting: %s", text)
         self.twitter_api.update_status(text)
 
     def make_tweet_text(self, companies, link):
@@ -142,7 +254,7 @@ class Twitter:
         lines_str = "\n".join(lines)
         size = len(lines_str) + 1 + len(link)
         if size > MAX_TWEET_SIZE:
-            self.logs.warn("Ellipsizing lines: %s" % lines_str)
+            self.logs.warn("Ellipsizing lines: %s", lines_str)
             lines_size = MAX_TWEET_SIZE - len(link) - 2
             lines_str = u"%s\u2026" % lines_str[:lines_size]
 
@@ -163,23 +275,42 @@ class Twitter:
         if sentiment < 0:
             return EMOJI_THUMBS_DOWN
 
-        self.logs.warn("Unknown sentiment: %s" % sentiment)
+        self.logs.warn("Unknown sentiment: %s", sentiment)
         return EMOJI_SHRUG
 
     def get_tweet(self, tweet_id):
-        """Looks up metadata for a single tweet."""
+        """Looks up metadata for a single tweet, or replays a recorded
+        response.
+        """
+
+        return self.replay.call("twitter", "get_tweet %s" % tweet_id,
+                                partial(self.request_tweet, tweet_id))
+
+    def request_tweet(self, tweet_id):
+        """Requests metadata for a single tweet from the Twitter API."""
 
         # Use tweet_mode=extended so we get the full text.
         status = self.twitter_api.get_status(tweet_id, tweet_mode="extended")
         if not status:
-            self.logs.error("Bad status response: %s" % status)
+            self.logs.error("Bad status response: %s", status)
             return None
 
         # Use the raw JSON, just like the streaming API.
         return status._json
 
     def get_tweets(self, since_id, user_id):
-        """Looks up metadata for all tweets since the specified ID."""
+        """Looks up metadata for all tweets since the specified ID, or replays
+        a recorded response.
+        """
+
+        return self.replay.call(
+            "twitter", "get_tweets %s %s" % (since_id, user_id),
+            partial(self.request_tweets, since_id, user_id))
+
+    def request_tweets(self, since_id, user_id):
+        """Requests metadata for all tweets since the specified ID from the
+        Twitter API.
+        """
 
         tweets = []
 
@@ -194,29 +325,27 @@ class Twitter:
             # Use the raw JSON, just like the streaming API.
             tweets.append(status._json)
 
-        self.logs.debug("Got tweets: %s" % tweets)
+        self.logs.debug("Got tweets: %s", tweets)
 
         return tweets
 
+    def backfill(self, since_ids, tweet_ids=(), failed_user_ids=None):
+        """Fetches the tweets of several users since the IDs by user, and the
+        tweets with the known IDs, concurrently. Yields their raw JSON in ID
+        order. Users some of whose tweets couldn't be fetched are added to
+        the failed users.
+        """
+
+        return Backfill(self.twitter_api, self.logs).get_tweets(
+            since_ids, tweet_ids=tweet_ids, failed_user_ids=failed_user_ids)
+
     def get_tweet_text(self, tweet):
         """Returns the full text of a tweet."""
 
-        # The format for getting at the full text is different depending on
-        # whether the tweet came through the REST API or the Streaming API:
-        # https://dev.twitter.com/overview/api/upcoming-changes-to-tweets
-        try:
-            if "extended_tweet" in tweet:
-                self.logs.debug("Decoding extended tweet from Streaming API.")
-                return tweet["extended_tweet"]["full_text"]
-            elif "full_text" in tweet:
-                self.logs.debug("Decoding extended tweet from REST API.")
-                return tweet["full_text"]
-            else:
-                self.logs.debug("Decoding short tweet.")
-                return tweet["text"]
-        except KeyError:
-            self.logs.error("Malformed tweet: %s" % tweet)
-            return None
+        if isinstance(tweet, Tweet):
+            return tweet.text
+
+        return get_tweet_text(tweet, self.logs)
 
     def get_tweet_link(self, tweet):
         """Creates the link URL to a tweet."""
@@ -225,11 +354,14 @@ class Twitter:
             self.logs.error("No tweet to get link.")
             return None
 
+        if isinstance(tweet, Tweet):
+            return tweet.link
+
         try:
             screen_name = tweet["user"]["screen_name"]
             id_str = tweet["id_str"]
         except KeyError:
-            self.logs.error("Malformed tweet for link: %s" % tweet)
+            self.logs.error("Malformed tweet for link: %s", tweet)
             return None
 
         link = TWEET_URL % (screen_name, id_str)
@@ -237,80 +369,223 @@ class Twitter:
 
 
 class TwitterListener(StreamListener):
-    """A listener class for handling streaming Twitter data."""
-
-    def __init__(self, callback, logs_to_cloud):
+    """A listener class for handling streaming Twitter data. The data is
+    decoded and then passed through the pipeline stages. With checkpoints,
+    the newest tweet of each followed user which made it through the last
+    stage is recorded. With a dedupe window, tweets which were already seen
+    are skipped.
+    """
+
+    def __init__(self, callback, logs_to_cloud, stages=None, follow=None,
+                 checkpoints=None, dedupe_window=None,
+                 hold_size=CHECKPOINT_HOLD_SIZE):
         self.logs_to_cloud = logs_to_cloud
         self.logs = Logs(name="twitter-listener", to_cloud=self.logs_to_cloud)
         self.callback = callback
+        self.stages = stages
+        self.follow = follow
+        self.follow_ids = set(str(user_id) for user_id in follow or [])
+        self.stream_filter = StreamFilter(follow=follow)
+        self.checkpoints = checkpoints
+        self.dedupe_window = dedupe_window
+        self.held = None
+        self.hold_size = hold_size
+        self.held_dropped = 0
+        self.held_dropped_ids = set()
+        self.hold_lock = Lock()
+        self.boundary_ids = OrderedDict()
+        self.boundary_seen = set()
+        self.boundary_lock = Lock()
         self.error_status = None
         self.start_queue()
 
+    def set_follow(self, follow):
+        """Changes the followed users for prefiltering, overload handling and
+        checkpoints.
+        """
+
+        self.follow = follow
+        self.follow_ids = set(str(user_id) for user_id in follow or [])
+        self.stream_filter.follow = self.follow_ids
+        self.ingest_queue.follow = self.follow_ids
+
     def start_queue(self):
-        """Creates a queue and starts the worker threads."""
+        """Creates the pipeline and starts the worker threads of each stage.
+        """
+
+        # Without explicit stages, call the callback for each tweet.
+        stages = self.stages
+        if not stages:
+            stages = [Stage("callback", self.handle_tweet, NUM_THREADS)]
 
-        self.queue = Queue()
+        # Bound the raw data waiting to be decoded and apply the overload
+        # policy when it's full.
+        self.ingest_queue = IngestQueue(follow=self.follow)
         self.stop_event = Event()
-        self.logs.debug("Starting %s worker threads." % NUM_THREADS)
-        self.workers = []
-        for worker_id in range(NUM_THREADS):
-            worker = Thread(target=self.process_queue, args=[worker_id])
-            worker.daemon = True
-            worker.start()
-            self.workers.append(worker)
+        self.pipeline = Pipeline(
+            [Stage("decode", self.handle_data, DECODE_THREADS,
+                   queue=self.ingest_queue)] + stages,
+            logs_to_cloud=self.logs_to_cloud, on_done=self.handle_done)
+        self.pipeline.start()
 
     def stop_queue(self):
-        """Shuts down the queue and worker threads."""
-
-        # First stop the queue.
-        if self.queue:
-            self.logs.debug("Stopping queue.")
-            self.queue.join()
-        else:
-            self.logs.warn("No queue to stop.")
-
-        # Then stop the worker threads.
-        if self.workers:
-            self.logs.debug("Stopping %d worker threads." % len(self.workers))
-            self.stop_event.set()
-            for worker in self.workers:
-                # Block until the thread terminates.
-                worker.join()
+        """Shuts down the pipeline and its worker threads."""
+
+        self.stop_event.set()
+        if self.pipeline:
+            self.logs.debug("Stopping pipeline.")
+            self.pipeline.stop()
+            self.logs.info("Ingest queue stats: %s",
+                           self.ingest_queue.get_stats())
+            self.logs.info("Prefilter stats: %s",
+                           self.stream_filter.get_stats())
+            self.pipeline = None
+            if self.checkpoints:
+                self.checkpoints.sync()
+            if self.dedupe_window:
+                self.logs.info("Dedupe stats: %s",
+                               self.dedupe_window.get_stats())
         else:
-            self.logs.warn("No worker threads to stop.")
-
-    def process_queue(self, worker_id):
-        """Continuously processes tasks on the queue."""
-
-        # Create a new logs instance (with its own httplib2 instance) so that
-        # there is a separate one for each thread.
-        logs = Logs("twitter-listener-worker-%s" % worker_id,
-                    to_cloud=self.logs_to_cloud)
-
-        logs.debug("Started worker thread: %s" % worker_id)
-        while not self.stop_event.is_set():
-            try:
-                data = self.queue.get(block=True, timeout=QUEUE_TIMEOUT_S)
-                start_time = time()
-                self.handle_data(logs, data)
-                self.queue.task_done()
-                end_time = time()
-                qsize = self.queue.qsize()
-                logs.debug("Worker %s took %.f ms with %d tasks remaining." %
-                           (worker_id, end_time - start_time, qsize))
-            except Empty:
-                # Timed out on an empty queue.
-                continue
-            except Exception:
-                # The main loop doesn't catch and report exceptions from
-                # background threads, so do that here.
-                logs.catch()
-        logs.debug("Stopped worker thread: %s" % worker_id)
+            self.logs.warn("No pipeline to stop.")
+
+    def get_stats(self):
+        """Returns the queue depth and throughput of each pipeline stage and
+        the overload counters of the ingest queue.
+        """
+
+        if not self.pipeline:
+            return {}
+
+        stats = self.pipeline.get_stats()
+        stats["ingest"] = self.ingest_queue.get_stats()
+        stats["prefilter"] = self.stream_filter.get_stats()
+        if self.dedupe_window:
+            stats["dedupe"] = self.dedupe_window.get_stats()
+        return stats
+
+    def get_since_ids(self):
+        """Returns the checkpointed tweet IDs of the followed users."""
+
+        if not self.checkpoints:
+            return {}
+
+        since_ids = self.checkpoints.get_all()
+        return {user_id: tweet_id for user_id, tweet_id in since_ids.items()
+                if user_id in self.follow_ids}
+
+    def start_catch_up(self, backfill):
+        """Starts catching up on the tweets missed since the checkpoints in
+        the background. Live data is held back until that's done, up to the
+        hold size.
+        """
+
+        since_ids = self.get_since_ids()
+        if not since_ids:
+            return
+
+        with self.hold_lock:
+            self.held = deque()
+            self.held_dropped = 0
+            self.held_dropped_ids = set()
+        with self.boundary_lock:
+            self.boundary_ids.clear()
+            self.boundary_seen.clear()
+        catch_up = Thread(target=self.catch_up, args=[backfill, since_ids])
+        catch_up.daemon = True
+        catch_up.start()
+
+    def catch_up(self, backfill, since_ids):
+        """Puts the tweets missed since the checkpoints on the pipeline in ID
+        order, followed by the live data held back in the meantime. The
+        checkpoints stay where they are until the catch-up is done, and the
+        ones of users whose tweets couldn't all be fetched or held back stay
+        there until the next catch-up.
+        """
+
+        self.logs.info("Catching up since: %s", since_ids)
+        self.checkpoints.freeze(since_ids)
+        failed_user_ids = set()
+        count = 0
+        try:
+            for tweet in backfill(since_ids,
+                                  failed_user_ids=failed_user_ids):
+                if self.stop_event.is_set():
+                    break
+
+                # The tweet at each checkpoint was already processed.
+                user_id = tweet["user"]["id_str"]
+                if tweet["id"] <= since_ids.get(user_id, 0):
+                    continue
+
+                with self.boundary_lock:
+                    self.add_boundary(tweet["id_str"])
+                self.pipeline.put(dumps(tweet, ensure_ascii=False))
+                count += 1
+        except Exception:
+            self.logs.catch()
+            failed_user_ids.update(since_ids)
+        finally:
+            with self.hold_lock:
+                held = self.held
+                for data in held:
+                    if not self.stop_event.is_set():
+                        self.pipeline.put(data)
+                self.held = None
+                dropped = self.held_dropped
+                failed_user_ids.update(self.held_dropped_ids)
+
+        self.checkpoints.thaw(user_id for user_id in since_ids
+                              if user_id not in failed_user_ids)
+        if failed_user_ids:
+            self.logs.error("Failed to catch up on users: %s",
+                            sorted(failed_user_ids))
+        self.logs.info("Caught up on %d tweets with %d held back and %d "
+                       "dropped.", count, len(held), dropped)
+
+    def add_boundary(self, tweet_id):
+        """Remembers a caught-up tweet which may also be streamed live. Only
+        the newest ones up to the hold size are kept, since only tweets
+        streamed while catching up can be caught up on too, and the caught-up
+        tweets come in ID order. Must be called with the lock held.
+        """
+
+        self.boundary_ids[tweet_id] = True
+        if len(self.boundary_ids) > self.hold_size:
+            old_id, _ = self.boundary_ids.popitem(last=False)
+            self.boundary_seen.discard(old_id)
+
+    def is_duplicate(self, tweet_id):
+        """Checks whether a tweet was both caught up on and streamed live, and
+        the other copy was seen first. Tweets are forgotten once both copies
+        were seen.
+        """
+
+        with self.boundary_lock:
+            if tweet_id not in self.boundary_ids:
+                return False
+            if tweet_id in self.boundary_seen:
+                del self.boundary_ids[tweet_id]
+                self.boundary_seen.discard(tweet_id)
+                return True
+            self.boundary_seen.add(tweet_id)
+            return False
+
+    def is_seen(self, data):
+        """Checks the dedupe window for a decoded tweet. Retweets count as
+        their original tweet.
+        """
+
+        if not self.dedupe_window:
+            return False
+
+        tweet_id = data.get("retweeted_status", {}).get("id_str",
+                                                        data.get("id_str"))
+        return tweet_id is not None and self.dedupe_window.check(tweet_id)
 
     def on_error(self, status):
         """Handles any API errors."""
 
-        self.logs.error("Twitter error: %s" % status)
+        self.logs.error("Twitter error: %s", status)
         self.error_status = status
         self.stop_queue()
         return False
@@ -320,35 +595,91 @@ class TwitterListener(StreamListener):
         return self.error_status
 
     def on_data(self, data):
-        """Puts a task to process the new data on the queue."""
+        """Puts a task to process the new data on the pipeline."""
 
         # Stop streaming if requested.
         if self.stop_event.is_set():
             return False
 
-        # Put the task on the queue and keep streaming.
-        self.queue.put(data)
+        # Skip data which doesn't need to be decoded, like deletes and
+        # retweets, but keep a record of any notices from the API.
+        kind, keep = self.stream_filter.check(data)
+        if not keep:
+            if kind in ["limit", "notice"]:
+                self.logs.warn("Skipping %s message: %s", kind, data)
+            return True
+
+        # Hold back live data while catching up on missed tweets.
+        with self.hold_lock:
+            if self.held is not None:
+                if len(self.held) >= self.hold_size:
+                    self.drop_held()
+                self.held.append(data)
+                return True
+
+        # Put the task on the pipeline and keep streaming.
+        self.pipeline.put(data)
         return True
 
+    def drop_held(self):
+        """Drops the oldest held back data to make room. Its author's
+        checkpoint is kept, so that the next catch-up fetches it again. Must
+        be called with the lock held.
+        """
+
+        data = self.held.popleft()
+        if not self.held_dropped:
+            self.logs.warn("Dropping live data held back while catching up.")
+        self.held_dropped += 1
+        author_id = get_author_id(data)
+        if author_id in self.follow_ids:
+            self.held_dropped_ids.add(author_id)
+
     def handle_data(self, logs, data):
-        """Sanity-checks and extracts the data before sending it to the
-        callback.
+        """Sanity-checks and extracts the data. Returns the tweet record for
+        the next stage, so that the raw data doesn't go any further.
         """
 
         try:
-            tweet = loads(data)
+            data = loads(data)
         except ValueError:
-            logs.error("Failed to decode JSON data: %s" % data)
-            return
+            logs.error("Failed to decode JSON data: %s", data)
+            return None
 
         try:
-            user_id_str = tweet["user"]["id_str"]
-            screen_name = tweet["user"]["screen_name"]
+            user_id_str = data["user"]["id_str"]
+            screen_name = data["user"]["screen_name"]
         except KeyError:
-            logs.error("Malformed tweet: %s" % tweet)
+            logs.error("Malformed tweet: %s", data)
+            return None
+
+        tweet_id_str = data.get("id_str")
+        if self.is_duplicate(tweet_id_str) or self.is_seen(data):
+            logs.info("Skipping duplicate tweet: %s", tweet_id_str)
+            return None
+
+        tweet = Tweet.from_data(data, logs)
+        logs.info("Examining tweet: %s", tweet)
+
+        if (self.checkpoints and tweet and tweet_id_str and
+                user_id_str in self.follow_ids):
+            self.checkpoints.begin(user_id_str, tweet_id_str)
+
+        return tweet
+
+    def handle_done(self, item):
+        """Ends the tracking of a tweet which left the pipeline, so that its
+        checkpoint can move.
+        """
+
+        if not self.checkpoints:
             return
 
-        logs.info("Examining tweet: %s" % tweet)
+        tweet = item[0] if isinstance(item, tuple) and item else item
+        if isinstance(tweet, Tweet):
+            self.checkpoints.end(tweet.id)
+
+    def handle_tweet(self, logs, tweet):
+        """Calls the callback with a decoded tweet."""
 
-        # Call the callback.
         self.callback(tweet)
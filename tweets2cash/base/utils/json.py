@@ -1,19 +1,181 @@
 # -*- coding: utf-8 -*-
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
 from django.utils.encoding import force_text
 
 from rest_framework.utils import encoders
 
 import json
+from math import isfinite
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import ujson
+except ImportError:
+    ujson = None
+
+# The JSON library to use: "auto" picks the fastest one installed.
+JSON_BACKEND = settings.JSON_BACKEND
+
+# The fast JSON libraries in order of preference for "auto".
+FAST_BACKENDS = ["orjson", "ujson"]
+
+
+class StdlibBackend:
+    """Encodes and decodes JSON with the json module of the standard
+    library.
+    """
+
+    name = "stdlib"
+
+    def loads(self, data):
+        if isinstance(data, bytes):
+            data = force_text(data)
+        return json.loads(data)
+
+    def dumps(self, data, ensure_ascii=True, encoder_class=encoders.JSONEncoder,
+              indent=None, allow_nan=True, separators=None):
+        return json.dumps(data, cls=encoder_class, ensure_ascii=ensure_ascii,
+                          indent=indent, allow_nan=allow_nan,
+                          separators=separators)
+
+    def dumpb(self, data, **kwargs):
+        return self.dumps(data, **kwargs).encode("utf-8")
+
+
+def has_non_finite(data):
+    """Checks whether data contains NaN or infinity floats."""
+
+    if isinstance(data, float):
+        return not isfinite(data)
+    if isinstance(data, dict):
+        return any(has_non_finite(value) for value in data.values())
+    if isinstance(data, (list, tuple)):
+        return any(has_non_finite(value) for value in data)
+    return False
+
+
+class OrjsonBackend:
+    """Encodes and decodes JSON with orjson. Values orjson doesn't handle
+    natively, like Decimals and lazy strings, and datetimes so that they keep
+    the format of the encoder class, go through the encoder class. Options
+    orjson doesn't support fall back to the standard library. orjson encodes
+    NaN and infinity as null, so with allow_nan=False they're rejected like
+    the standard library does.
+    """
+
+    name = "orjson"
+
+    def loads(self, data):
+        return orjson.loads(data)
+
+    def dumps(self, data, **kwargs):
+        return self.dumpb(data, **kwargs).decode("utf-8")
+
+    def dumpb(self, data, ensure_ascii=True,
+              encoder_class=encoders.JSONEncoder, indent=None, allow_nan=True,
+              separators=None):
+        if ensure_ascii or indent not in (None, 2) or separators:
+            return stdlib_backend.dumpb(
+                data, ensure_ascii=ensure_ascii,
+                encoder_class=encoder_class, indent=indent,
+                allow_nan=allow_nan, separators=separators)
+
+        option = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS
+        if indent:
+            option |= orjson.OPT_INDENT_2
+        ret = orjson.dumps(data, default=encoder_class().default,
+                           option=option)
+
+        # Only look for NaN and infinity if they could have become null.
+        if not allow_nan and b"null" in ret and has_non_finite(data):
+            raise ValueError(
+                "Out of range float values are not JSON compliant")
+        return ret
+
+
+class UjsonBackend:
+    """Encodes and decodes JSON with ujson. Values ujson doesn't handle
+    natively go through the encoder class. Custom separators and
+    allow_nan=False fall back to the standard library.
+    """
+
+    name = "ujson"
+
+    def loads(self, data):
+        return ujson.loads(data)
+
+    def dumps(self, data, ensure_ascii=True,
+              encoder_class=encoders.JSONEncoder, indent=None, allow_nan=True,
+              separators=None):
+        if separators or not allow_nan:
+            return stdlib_backend.dumps(
+                data, ensure_ascii=ensure_ascii,
+                encoder_class=encoder_class, indent=indent,
+                allow_nan=allow_nan, separators=separators)
+
+        return ujson.dumps(data, ensure_ascii=ensure_ascii, indent=indent or 0,
+                           escape_forward_slashes=False, allow_nan=allow_nan,
+                           default=encoder_class().default)
+
+    def dumpb(self, data, **kwargs):
+        return self.dumps(data, **kwargs).encode("utf-8")
+
+
+# The fallback for options the fast JSON libraries don't support.
+stdlib_backend = StdlibBackend()
+
+BACKENDS = {"orjson": (orjson, OrjsonBackend),
+            "ujson": (ujson, UjsonBackend),
+            "stdlib": (json, StdlibBackend)}
+
+
+def get_available_backends():
+    """Returns the names of the JSON backends which are installed."""
+
+    return [name for name, (module, _) in BACKENDS.items()
+            if module is not None]
+
+
+def get_backend(name=JSON_BACKEND):
+    """Returns a JSON backend by name. "auto" picks the fastest one
+    installed, or the standard library if there is none.
+    """
+
+    if name == "auto":
+        available = get_available_backends()
+        name = next((name for name in FAST_BACKENDS if name in available),
+                    "stdlib")
+
+    if name not in BACKENDS:
+        raise ImproperlyConfigured("Unknown JSON backend: %s" % name)
+
+    module, backend_class = BACKENDS[name]
+    if module is None:
+        raise ImproperlyConfigured("JSON backend not installed: %s" % name)
+
+    return backend_class()
+
+
+backend = get_backend()
 
 
 def dumps(data, ensure_ascii=True, encoder_class=encoders.JSONEncoder, indent=None):
-    return json.dumps(data, cls=encoder_class, ensure_ascii=ensure_ascii, indent=indent)
+    return backend.dumps(data, ensure_ascii=ensure_ascii,
+                         encoder_class=encoder_class, indent=indent)
+
+
+def dumpb(data, ensure_ascii=True, encoder_class=encoders.JSONEncoder, indent=None):
+    return backend.dumpb(data, ensure_ascii=ensure_ascii,
+                         encoder_class=encoder_class, indent=indent)
 
 
 def loads(data):
-    if isinstance(data, bytes):
-        data = force_text(data)
-    return json.loads(data)
+    return backend.loads(data)
 
 load = json.load
 